@@ -0,0 +1,311 @@
+"""
+Synthetic FOLLOWUP_DESC corpus + rule-engine benchmark harness.
+
+Generate realistic HIS_FOLLOWUP text (every rule family, realistic skew: the
+"Incident details accessed" / archive housekeeping lines dominate), then time the
+taggers in lines/sec and peak Python memory. Run it before a new rule ships:
+
+    corpus = make_corpus(1_000_000)
+    base = run_benchmarks(default_targets(globals()), sizes=(100_000, 1_000_000))
+    ... add / edit a rule ...
+    new = run_benchmarks(default_targets(globals()), sizes=(100_000, 1_000_000))
+    check_regression(base, new)          # rows whose lines/sec dropped > 10%
+
+The rule modules are notebook cells (regex.py / eda.py / e_fulletr.py), so targets are
+passed in as callables rather than imported here.
+
+Cold start of the rule cells (fresh interpreter per run):
+    bench_import("regex.py", registry="rule_registry.json")
+
+CLI:  python bench_tagging.py --lines 1000000 --out followup_1m.parquet
+      python bench_tagging.py --import-bench regex.py [--registry rule_registry.json]
+"""
+import argparse
+import gc
+import json
+import random
+import subprocess
+import sys
+import tracemalloc
+from time import perf_counter
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple
+
+import pandas as pd
+
+DESC_COL = "FOLLOWUP_DESC"
+SIZES = (100_000, 1_000_000, 10_000_000)
+
+# -------------------------
+# Template pieces
+# -------------------------
+STREETS = ["HEMLOCK ST", "OAKWOOD AV", "BROADWAY AV", "PECK RD", "WILSON AVE", "MAIN ST",
+           "3167 WILSON AVE.", "HEMLOCK ST.N/S 231' E/O PECK RD", "ELM ST & 5TH AV"]
+CREWS = ["9216", "4740", "LC", "SAP", "1182", "T-77"]
+CREW_STATES = ["Assigned", "Dispatched", "Working", "Completed", "En Route"]
+LOC_STATES = ["Assigned", "Unassigned", "Dispatched", "Working", "Completed", "Energized", "Cancelled"]
+INC_STATES = ["Assigned", "Dispatched", "Working", "Partially Completed", "Completed", "Energized"]
+REMARKS = ["REPLACED FUSE", "TREE ON LINE [PRI] CLEARED", "NO ACCESS, DOG IN YARD", "PATROLLED - NOTHING FOUND",
+           "CUT CLEAR / RE-ENERGIZED", "WAITING ON [TROUBLEMAN] 2ND CREW"]
+CAUSES = [("OPESOPOPR", "SOP\\OPERATOR/CREW\\OPEN FOR REPAIRS"), ("EQPFUSE", "EQUIPMENT\\FUSE"),
+          ("VEGTREE", "VEGETATION\\TREE")]
+OCCURS = [("STRCLR", "CLEAR\\STRUCTURE"), ("FUSREP", "FUSE\\REPLACED")]
+ARCH_OPS = ["Copy Repair", "Copy Occurence", "Copy Remark", "Copy Cause"]
+LINKINFO = ["Connected and Linked To CAD", "NCC and Linked To Cad", "Connected and NOT Linked To CAD"]
+NOISE = ["Incident printed", "Map viewed", "Customer callback scheduled", "Note: see attached"]
+
+
+def _dt(r: random.Random, ymd_first: bool = False) -> str:
+    m, d, h, mi, s = r.randint(1, 12), r.randint(1, 28), r.randint(0, 23), r.randint(0, 59), r.choice([0, 0, 30])
+    y = r.choice([2024, 2025])
+    if ymd_first:
+        return f"{y}/{m:02}/{d:02} {h:02}:{mi:02}:{s:02}"
+    return f"{m:02}/{d:02}/{y} {h:02}:{mi:02}:{s:02}"
+
+
+def _loc(r):  return r.randint(2_040_000_000, 2_049_999_999)
+def _inc(r):  return r.randint(131_000_000, 131_999_999)
+def _go(r):   return f"GO {r.randint(10_000, 123_125):06}-{r.randint(1, 999):05}"
+
+
+# (family, weight, generator) -- weights mimic the skew seen in HIS_FOLLOWUP
+TEMPLATES: List[Tuple[str, float, Callable[[random.Random], str]]] = [
+    # ETR SYSTEM / MANUAL
+    ("ETR_SYSTEM", 6, lambda r: f"SYSTEM ETR- Set ETR for @ {r.choice(STREETS)} To SYS ETR {_dt(r)}"),
+    ("ETR_SYSTEM", 3, lambda r: f"SYSTEM ETR- Change for @ {r.choice(STREETS)} From SYS-{_dt(r)} To SYS ETR {_dt(r)}"),
+    ("ETR_MANUAL", 3, lambda r: f"MANUAL ETR- Set ETR for @ {r.choice(STREETS)} From ETR {r.choice(['SYS', 'MAN'])} {_dt(r)} To MAN ETR {_dt(r)}"),
+    ("ETR_MANUAL", 1, lambda r: f"MANUAL ETR- Disable ETR Re-calculation for @ {r.choice(STREETS)}"),
+    ("ETR_MANUAL", 1, lambda r: f"MANUAL ETR- Remove ETR for @ {r.choice(STREETS)} ETR {r.choice(['SYS', 'MAN'])}-{_dt(r)}"),
+    ("ETR_PLANNED", 0.5, lambda r: f"Initial ETR for the Planned Job is {_dt(r, ymd_first=True)}"),
+    # Incident chatter (very repetitive)
+    ("INCIDENT", 14, lambda r: "Incident details accessed"),
+    ("INCIDENT", 2, lambda r: "Incident details accessed for the first time"),
+    ("INCIDENT", 8, lambda r: "Incident Analyzed"),
+    ("INCIDENT", 5, lambda r: f"Incident [{_inc(r)}] change status to : {r.choice(INC_STATES)}"),
+    ("INCIDENT", 1, lambda r: f"Change Incident Device main call to [{r.randint(100000, 999999)}]"),
+    ("INCIDENT", 2, lambda r: r.choice(["Archived incident", "Incident Archived", "ARCHIVED"])),
+    # Crew remarks / status
+    ("CREW_REMARK", 3, lambda r: f"Crew [{r.choice(CREWS)}] new remark recorded [{r.choice(REMARKS)}] from CAD"),
+    ("CREW_REMARK", 2, lambda r: f"Location [{_loc(r)}] Crew: [{r.choice(CREWS)}] Remark is set to [{r.choice(REMARKS)}]"),
+    ("CREW_REMARK", 1, lambda r: f"Incident [{_inc(r)}] Crew Remark [{r.choice(REMARKS)}] has been applied to all locations"),
+    ("CREW_STATUS", 5, lambda r: f"Crew [{r.choice(CREWS)}] status changed to [{r.choice(CREW_STATES)}] from CAD"),
+    ("CREW_STATUS", 1, lambda r: f"Crew [{r.choice(CREWS)}] unassigned from CAD"),
+    # Calls / codes
+    ("CALL", 3, lambda r: f"Call reported at {_dt(r, ymd_first=True)} for Transformer [{r.randint(1000000, 9999999)}] P{r.randint(1000000, 9999999)} with AMI ESC METER"),
+    ("CALL", 1, lambda r: f"SCADA Call reported at [{r.randint(1000, 99999):05}] {r.randint(1000, 99999):05} with OPEN OPEN SW/CREATE INC"),
+    ("CALL", 1, lambda r: f"Call remark has been changed to [{r.choice(REMARKS)}]"),
+    ("CAD_CODE", 2, lambda r: "New cause code recorded [{}][{}] from CAD".format(*r.choice(CAUSES))),
+    ("CAD_CODE", 1, lambda r: "New occurrence recorded [{}][{}] from CAD".format(*r.choice(OCCURS))),
+    # Memo ops
+    ("MEMO", 2, lambda r: f"Added new memo with id {r.randint(1, 999999)}"),
+    ("MEMO", 1, lambda r: f"Changed memo with incident id no {_inc(r)}, outage code updated"),
+    ("MEMO", 1, lambda r: f"[MultiEdit] Changed end datetime of memo number {r.randint(1, 999999)}"),
+    ("MEMO", 0.5, lambda r: f"Deleted memo number {r.randint(1, 999999)}"),
+    # Archive ops (housekeeping, very repetitive)
+    ("ARCHIVE", 6, lambda r: f"Archive: [{r.choice(ARCH_OPS)}] to {r.randint(1, 4)} {r.choice(['crew locations', 'locations'])} [{r.choice(LINKINFO)}] without data."),
+    ("ARCHIVE", 3, lambda r: f"Archived downstream info ({r.randint(1, 12)} transformers) for incident device P{r.randint(1000000, 9999999)}-B"),
+    ("ARCHIVE", 2, lambda r: f"Archived premise info for ({r.choice(['NCC', 'ITC'])}) for incident device P{r.randint(1000000, 9999999)}"),
+    # Location status / dates / codes
+    ("LOCATION_STATUS", 6, lambda r: f"Location [{_loc(r)}] with Priority Score [{r.choice(['', f'{r.uniform(1, 40):.2f}'])}] changed status to : {r.choice(LOC_STATES)}"),
+    ("LOCATION_DATE", 3, lambda r: f"Location [{_loc(r)}] Energized Date has been set to [{_dt(r)}]"),
+    ("LOCATION_DATE", 2, lambda r: f"His Location [{_loc(r)}] {r.choice(['Energized', 'Initial', 'Estimated Restore'])} Date has been Changed from [{_dt(r)}] to [{_dt(r)}]"),
+    ("LOCATION_CODE", 1, lambda r: "His Location [{}] Cause has been set to [{}]".format(_loc(r), r.choice(CAUSES)[1])),
+    # GO lifecycle
+    ("GO", 2, lambda r: f"Job [{_go(r)}] created for Location [{_loc(r)}]"),
+    ("GO", 2, lambda r: f"Job [{_go(r)}] updated"),
+    ("GO", 0.5, lambda r: f"Complex Job [{_go(r)}] created for Incident"),
+    # Untagged noise (coverage gaps)
+    ("NOISE", 2, lambda r: r.choice(NOISE)),
+]
+
+
+def make_corpus(n: int, seed: int = 0, templates=TEMPLATES) -> pd.DataFrame:
+    """n synthetic HIS_FOLLOWUP rows: FOLLOWUP_ID, INCIDENT_ID, family, FOLLOWUP_DESC."""
+    r = random.Random(seed)
+    fams = [t[0] for t in templates]
+    gens = [t[2] for t in templates]
+    picks = r.choices(range(len(templates)), weights=[t[1] for t in templates], k=n)
+    # ~40 followups per incident, like single-location incidents in HIS_FOLLOWUP
+    inc0 = 131_000_000
+    return pd.DataFrame({
+        "FOLLOWUP_ID": pd.RangeIndex(1, n + 1),
+        "INCIDENT_ID": [inc0 + i // 40 for i in range(n)],
+        "family": pd.Categorical([fams[k] for k in picks]),
+        DESC_COL: [gens[k](r) for k in picks],
+    })
+
+
+def iter_corpus(n: int, chunksize: int = 100_000, seed: int = 0) -> Iterable[pd.DataFrame]:
+    """Same corpus in chunks (keeps 10M-line generation out of memory all at once)."""
+    for i, start in enumerate(range(0, n, chunksize)):
+        chunk = make_corpus(min(chunksize, n - start), seed=seed + i)
+        chunk["FOLLOWUP_ID"] += start
+        chunk["INCIDENT_ID"] += start // 40
+        yield chunk
+
+
+# -------------------------
+# Harness
+# -------------------------
+def default_targets(ns: Dict[str, Any]) -> Dict[str, Callable[[pd.DataFrame], Any]]:
+    """Pick whatever taggers are defined in a notebook namespace (pass globals())."""
+    t: Dict[str, Callable[[pd.DataFrame], Any]] = {}
+    if "tag_dataframe_narrow" in ns:
+        t["tag_dataframe_narrow"] = lambda df: ns["tag_dataframe_narrow"](df, memo=False)
+    if "tag_events" in ns:
+        t["tag_events"] = lambda df: ns["tag_events"](df[[DESC_COL]].copy(), memo=False)
+    if "classify_event" in ns:
+        t["classify_event"] = lambda df: [ns["classify_event"](s) for s in df[DESC_COL]]
+    if "tag_etr_event" in ns:
+        t["tag_etr_event"] = lambda df: [ns["tag_etr_event"](s) for s in df[DESC_COL]]
+    if "tag_all" in ns and "taxonomies" in ns:
+        t["tag_all"] = lambda df: ns["tag_all"](df[[DESC_COL]], ns["taxonomies"])
+    return t
+
+
+def reset_caches(ns: Dict[str, Any]) -> None:
+    """Cold start: drop dispatcher / memo caches so every run pays full price."""
+    for name in ("_compile_rules_cached", "classify_event_cached"):
+        fn = ns.get(name)
+        if fn is not None and hasattr(fn, "cache_clear"):
+            fn.cache_clear()
+
+
+def bench_one(name: str, fn: Callable[[pd.DataFrame], Any], df: pd.DataFrame,
+              memory: bool = True, setup: Optional[Callable[[], None]] = None) -> Dict[str, Any]:
+    """Time fn(df) (untraced), then optionally re-run under tracemalloc for peak memory."""
+    if setup: setup()
+    gc.collect()
+    t0 = perf_counter()
+    fn(df)
+    secs = perf_counter() - t0
+
+    peak_mb = None
+    if memory:
+        if setup: setup()
+        gc.collect()
+        tracemalloc.start()
+        try:
+            fn(df)
+            _, peak = tracemalloc.get_traced_memory()
+        finally:
+            tracemalloc.stop()
+        peak_mb = peak / 2**20
+    return {"target": name, "n_lines": len(df), "seconds": secs,
+            "lines_per_sec": (len(df) / secs) if secs > 0 else float("inf"), "peak_mb": peak_mb}
+
+
+def run_benchmarks(targets: Dict[str, Callable[[pd.DataFrame], Any]],
+                   sizes: Iterable[int] = SIZES, seed: int = 0, memory: bool = True,
+                   setup: Optional[Callable[[], None]] = None, verbose: bool = True) -> pd.DataFrame:
+    rows = []
+    for n in sizes:
+        df = make_corpus(n, seed=seed)
+        if verbose: print(f"[bench] corpus {n:,} lines ({df[DESC_COL].nunique():,} distinct)")
+        for name, fn in targets.items():
+            res = bench_one(name, fn, df, memory=memory, setup=setup)
+            if verbose:
+                mem = f", peak {res['peak_mb']:.0f} MB" if res["peak_mb"] is not None else ""
+                print(f"[bench]   {name:<22} {res['lines_per_sec']:>12,.0f} lines/s{mem}")
+            rows.append(res)
+        del df
+        gc.collect()
+    return pd.DataFrame(rows)
+
+
+def check_regression(base: pd.DataFrame, new: pd.DataFrame, tolerance: float = 0.10) -> pd.DataFrame:
+    """Rows where lines/sec dropped (or peak memory grew) by more than `tolerance`."""
+    m = base.merge(new, on=["target", "n_lines"], suffixes=("_base", "_new"))
+    m["speed_ratio"] = m["lines_per_sec_new"] / m["lines_per_sec_base"]
+    m["mem_ratio"] = m["peak_mb_new"] / m["peak_mb_base"]
+    bad = (m["speed_ratio"] < 1 - tolerance) | (m["mem_ratio"] > 1 + tolerance)
+    return m.loc[bad, ["target", "n_lines", "lines_per_sec_base", "lines_per_sec_new", "speed_ratio",
+                       "peak_mb_base", "peak_mb_new", "mem_ratio"]]
+
+
+# -------------------------
+# Import / cold-start benchmark
+# -------------------------
+ENGINE_MARKER = "import re, json"   # regex.py: rule cells above this line, engine cell from here
+
+# Runs in a fresh interpreter: third-party imports, then the cells in notebook order (engine,
+# then rules) from pre-compiled code objects (like a .pyc import), then the first tag.
+_IMPORT_PROBE = r"""
+import json, sys
+from time import perf_counter
+t0 = perf_counter()
+import numpy, pandas
+try:
+    import pyarrow, pyarrow.compute, pyarrow.dataset, pyarrow.parquet
+except ImportError:
+    pass
+t1 = perf_counter()
+path, registry, marker = sys.argv[1], sys.argv[2], sys.argv[3]
+src = open(path).read()
+i = src.index(marker)
+engine = compile(src[i:], "engine", "exec")
+cells = compile(src[:i].replace("from ..engine import Rule", "pass"), "rules", "exec")
+ns = {"__name__": "regex_cells"}
+t2 = perf_counter()
+exec(engine, ns)
+exec(cells, ns)
+t3 = perf_counter()
+if registry:
+    ns["load_rule_registry"](registry, ns["rules"])
+t4 = perf_counter()
+ns["tag_dataframe_narrow"](pandas.DataFrame({"FOLLOWUP_DESC": ["Crew [9216] status changed to [Working] from CAD"]}))
+t5 = perf_counter()
+lazy = dict(ns.get("LAZY_STATS", {}))           # before the compile-everything loop below
+eager = 0.0
+if "LazyPattern" in ns:
+    t6 = perf_counter()
+    for v in list(ns.values()):
+        if isinstance(v, ns["LazyPattern"]):
+            v.compiled()
+    eager = perf_counter() - t6
+print(json.dumps({"third_party_s": t1 - t0, "cells_s": t3 - t2, "registry_s": t4 - t3, "first_tag_s": t5 - t4,
+                  "patterns": lazy.get("created"), "compiled_at_first_tag": lazy.get("compiled"),
+                  "compile_rest_s": eager}))
+"""
+
+
+def bench_import(path: str = "regex.py", registry: Optional[str] = None, runs: int = 5,
+                 verbose: bool = True) -> pd.DataFrame:
+    """Cold-start timings of the rule cells, one fresh interpreter per run.
+
+    cells_s = engine + rule cells (pattern compilation is what lazy_compile defers),
+    first_tag_s = the first tag_dataframe_narrow call (dispatcher + rule analysis),
+    compile_rest_s = what compiling the still-lazy patterns would have added.
+    """
+    rows = []
+    for _ in range(runs):
+        out = subprocess.run([sys.executable, "-c", _IMPORT_PROBE, path, registry or "", ENGINE_MARKER],
+                             capture_output=True, text=True, check=True)
+        rows.append(json.loads(out.stdout.strip().splitlines()[-1]))
+    res = pd.DataFrame(rows)
+    if verbose:
+        med = res.median(numeric_only=True)
+        print(f"[bench] {path}{' + ' + registry if registry else ''}: cells {med['cells_s'] * 1000:.0f} ms, "
+              f"first tag {med['first_tag_s'] * 1000:.0f} ms, (third-party imports {med['third_party_s'] * 1000:.0f} ms)")
+    return res
+
+
+# ---------- Example usage (notebook, after running regex.py / eda.py / e_fulletr.py cells) ----------
+# targets = default_targets(globals())
+# report = run_benchmarks(targets, sizes=(100_000, 1_000_000), setup=lambda: reset_caches(globals()))
+# report.to_parquet("bench_baseline.parquet")
+
+if __name__ == "__main__":
+    ap = argparse.ArgumentParser(description="Write a synthetic FOLLOWUP_DESC corpus to Parquet.")
+    ap.add_argument("--lines", type=int, default=SIZES[0])
+    ap.add_argument("--seed", type=int, default=0)
+    ap.add_argument("--out", default=None, help="Parquet path (default: followup_<lines>.parquet)")
+    ap.add_argument("--import-bench", default=None, metavar="REGEX_PY", help="cold-start benchmark of the rule cells instead")
+    ap.add_argument("--registry", default=None, help="rule registry to load in --import-bench")
+    ap.add_argument("--runs", type=int, default=5)
+    args = ap.parse_args()
+    if args.import_bench:
+        print(bench_import(args.import_bench, args.registry, args.runs, verbose=True).to_string())
+        sys.exit(0)
+    out = args.out or f"followup_{args.lines}.parquet"
+    make_corpus(args.lines, seed=args.seed).to_parquet(out, index=False)
+    print(f"[info] wrote {out}: {args.lines:,} rows")
@@ -1,8 +1,16 @@
 from __future__ import annotations
 
 import re
-from dataclasses import dataclass, asdict
-from typing import Optional, Dict, Any, List
+from dataclasses import dataclass
+from typing import Optional, Dict, Any, List, Sequence
+
+import numpy as np
+import pandas as pd
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:                                # timeline store only
+    pa = pq = None
 
 # -------------------------
 # Normalization
@@ -60,7 +68,7 @@ class ETRTag:
     confidence: float = 0.9
 
     def asdict(self) -> Dict[str, Any]:
-        d = asdict(self)
+        d = dict(self.__dict__)   # flat scalar fields: dataclasses.asdict's deepcopy is the hot spot
         for k, v in list(d.items()):
             if isinstance(v, str):
                 d[k] = v.strip()
@@ -175,22 +183,152 @@ def tag_etr_event(text: str) -> Optional[Dict[str, Any]]:
         m = spec["regex"].match(s)
         if not m:
             continue
-
-        gd = {k: (m.group(k) if k in m.re.groupindex else None) for k in spec.get("fields", [])}
-
-        tag = ETRTag(
-            source=gd.get("source"),
-            action=spec["action"],
-            location=gd.get("location"),
-            from_kind=gd.get("from_kind"),
-            from_dt=gd.get("from_dt"),
-            from_is_null=bool(gd.get("from_null")),
-            to_kind=gd.get("to_kind"),
-            to_dt=gd.get("to_dt"),
-            pattern_name=spec["name"],
-            raw_match=m.group(0),
-            confidence=0.95 if spec["priority"] >= 90 else 0.9,
-        )
-        return tag.asdict()
+        return _tag_from_match(spec, m)
 
     return None
+
+def _tag_from_match(spec: Dict[str, Any], m: re.Match) -> Dict[str, Any]:
+    gd = {k: (m.group(k) if k in m.re.groupindex else None) for k in spec.get("fields", [])}
+
+    tag = ETRTag(
+        source=gd.get("source"),
+        action=spec["action"],
+        location=gd.get("location"),
+        from_kind=gd.get("from_kind"),
+        from_dt=gd.get("from_dt"),
+        from_is_null=bool(gd.get("from_null")),
+        to_kind=gd.get("to_kind"),
+        to_dt=gd.get("to_dt"),
+        pattern_name=spec["name"],
+        raw_match=m.group(0),
+        confidence=0.95 if spec["priority"] >= 90 else 0.9,
+    )
+    return tag.asdict()
+
+def etr_finish(s: str, i: Optional[int], m: Optional[re.Match]) -> Dict[str, Any]:
+    """Adapter for regex.py tag_all (anchored=True, normalize=normalize): winner -> tag dict, {} if none."""
+    return _tag_from_match(PATTERNS[i], m) if m else {}
+
+# -------------------------
+# ETR revision timeline
+# -------------------------
+# One row per ETR event, ordered by (INCIDENT_ID, location, event time): revision index,
+# the ETR in force before/after the event, delta minutes and the SYS/MAN source switch.
+# tag_etr_event runs once per distinct text; the rest is column arithmetic per group.
+ETR_DT_FORMATS = ("%m/%d/%Y %H:%M:%S", "%Y/%m/%d %H:%M:%S")   # the two DT_CORE shapes
+NO_LOC = ""            # planned-job / null-activation lines have no location: incident-level series
+_TAG_COLS = ["action", "source", "location", "from_kind", "from_dt", "from_is_null", "to_kind", "to_dt", "pattern_name"]
+_ACTION_SRC = {"manual_remove_etr": "MAN", "etr_set_null_activation_time": "SYS", "planned_job_initial_etr": "SYS"}   # no SYS/MAN in the text
+
+def _etr_dt(s: pd.Series) -> pd.Series:
+    out = pd.to_datetime(s, format=ETR_DT_FORMATS[0], errors="coerce")
+    for fmt in ETR_DT_FORMATS[1:]:
+        miss = out.isna() & s.notna()
+        if miss.any():
+            out[miss] = pd.to_datetime(s[miss], format=fmt, errors="coerce")
+    return out
+
+def etr_events(df: pd.DataFrame, text_col: str = "FOLLOWUP_DESC", time_col: str = "FOLLOWUP_DATETIME",
+               keep: Sequence[str] = ("INCIDENT_ID", "FOLLOWUP_ID")) -> pd.DataFrame:
+    """ETR rows of a followup frame with the tag_etr_event fields as columns (tagged once per distinct text)."""
+    codes, uniq = pd.factorize(df[text_col].fillna("").astype(str), sort=False)
+    maybe = pd.Series(uniq).str.contains("ETR", case=False, regex=False).to_numpy()   # every pattern has it
+    tags = [tag_etr_event(s) if ok else None for s, ok in zip(uniq, maybe)]
+    hit = np.fromiter((t is not None for t in tags), bool, len(tags))
+    rows = hit[codes]
+    tagged = pd.DataFrame.from_records([t for t in tags if t is not None], columns=_TAG_COLS)
+    pos = (np.cumsum(hit) - 1)[codes[rows]]
+    base = df.loc[rows, [c for c in (*keep, time_col) if c in df.columns]].reset_index(drop=True)
+    return pd.concat([base, tagged.iloc[pos].reset_index(drop=True)], axis=1)
+
+def build_etr_timeline(events: pd.DataFrame, incident_col: str = "INCIDENT_ID",
+                       time_col: str = "FOLLOWUP_DATETIME", id_col: str = "FOLLOWUP_ID") -> pd.DataFrame:
+    """Per incident/location ETR revisions from etr_events output.
+
+    etr_after is the ETR in force after the event (remove -> NaT, disable_recalc keeps the
+    previous one), etr_before the one before it; is_revision marks events that changed it.
+    """
+    ev = events.copy()
+    ev["location"] = ev["location"].fillna(NO_LOC)
+    ev["event_time"] = pd.to_datetime(ev[time_col], errors="coerce")
+    ev["etr_from"] = _etr_dt(ev["from_dt"])
+    ev["etr_to"] = _etr_dt(ev["to_dt"])
+    ev["etr_src"] = (ev["to_kind"].fillna(ev["source"].str[:3])
+                     .fillna(ev["pattern_name"].map(_ACTION_SRC)))
+    order = [incident_col, "location", "event_time"] + ([id_col] if id_col in ev.columns else [])
+    ev = ev.sort_values(order, kind="stable").reset_index(drop=True)
+    keys = [incident_col, "location"]
+    g = ev.groupby(keys, sort=False, dropna=False)
+
+    ev["revision"] = g.cumcount().astype("int32")
+    # last ETR-setting event at or before each row (disable_recalc carries the previous one)
+    sets = pd.Series(np.where(ev["action"].eq("disable_recalc"), np.nan, np.arange(len(ev))), index=ev.index)
+    src_row = sets.groupby([ev[k] for k in keys], sort=False, dropna=False).ffill()
+    after = ev["etr_to"].to_numpy()[src_row.fillna(0).astype(np.int64).to_numpy()]
+    ev["etr_after"] = pd.Series(after, index=ev.index).where(src_row.notna())
+    ev["etr_before"] = ev.groupby(keys, sort=False, dropna=False)["etr_after"].shift()
+    ev["is_revision"] = ~((ev["etr_after"] == ev["etr_before"]) | (ev["etr_after"].isna() & ev["etr_before"].isna()))
+    ev["delta_min"] = (ev["etr_after"] - ev["etr_before"]).dt.total_seconds() / 60
+    ev["lead_min"] = (ev["etr_after"] - ev["event_time"]).dt.total_seconds() / 60
+    ev["prev_src"] = ev.groupby(keys, sort=False, dropna=False)["etr_src"].shift()
+    ev["source_switch"] = ev["etr_src"].notna() & ev["prev_src"].notna() & ev["etr_src"].ne(ev["prev_src"])
+
+    cols = [incident_col, "location", "revision", "event_time", id_col, "action", "pattern_name",
+            "etr_src", "prev_src", "source_switch", "etr_from", "etr_before", "etr_after",
+            "delta_min", "lead_min", "is_revision"]
+    return ev[[c for c in cols if c in ev.columns]]
+
+def etr_churn(timeline: pd.DataFrame, restore: Optional[pd.DataFrame] = None,
+              incident_col: str = "INCIDENT_ID", restore_col: str = "restore_time") -> pd.DataFrame:
+    """Per incident/location churn; with restore (incident_col[, location], restore_col) also ETR error.
+
+    first/final_etr_error_min = first ETR / ETR in force at restore minus the restore time (late > 0).
+    """
+    keys = [incident_col, "location"]
+    timeline = timeline.sort_values(keys + ["revision"], kind="stable")
+    g = timeline.assign(abs_delta=timeline["delta_min"].abs()).groupby(keys, sort=False, dropna=False)
+    out = g.agg(n_events=("revision", "size"),
+                n_revisions=("is_revision", "sum"),
+                n_source_switches=("source_switch", "sum"),
+                first_event=("event_time", "min"),
+                last_event=("event_time", "max"),
+                first_etr=("etr_after", "first"),
+                abs_delta_min=("abs_delta", "sum"))
+    # ETR in force = etr_after of the real last row (groupby "last" would skip a remove's NaT)
+    last = timeline.drop_duplicates(keys, keep="last")[keys + ["etr_after"]]
+    out = out.reset_index().merge(last.rename(columns={"etr_after": "final_etr"}), on=keys, how="left")
+    out.insert(out.columns.get_loc("first_etr") + 1, "final_etr", out.pop("final_etr"))
+    if restore is None:
+        return out
+    on = [c for c in keys if c in restore.columns]
+    tl = timeline.merge(restore[on + [restore_col]], on=on, how="inner")
+    tl = tl[tl["event_time"] <= tl[restore_col]]
+    at = (tl.drop_duplicates(keys, keep="last")[keys + ["etr_after", restore_col]]
+            .rename(columns={"etr_after": "etr_at_restore"}))
+    out = out.merge(at, on=keys, how="left")
+    out["first_etr_error_min"] = (out["first_etr"] - out[restore_col]).dt.total_seconds() / 60
+    out["final_etr_error_min"] = (out["etr_at_restore"] - out[restore_col]).dt.total_seconds() / 60
+    return out
+
+# Parquet has no secondary index: the file is sorted by (INCIDENT_ID, location) and written in
+# modest row groups, so min/max statistics on INCIDENT_ID let a filtered read skip row groups.
+def write_etr_timeline(timeline: pd.DataFrame, path: str, incident_col: str = "INCIDENT_ID",
+                       row_group_size: int = 64_000) -> None:
+    tl = timeline.sort_values([incident_col, "location", "revision"], kind="stable")
+    table = pa.Table.from_pandas(tl, preserve_index=False)
+    sort = [pq.SortingColumn(table.schema.get_field_index(c)) for c in (incident_col, "location", "revision")]
+    pq.write_table(table, path, row_group_size=row_group_size, sorting_columns=sort,
+                   use_dictionary=["location", "action", "pattern_name", "etr_src", "prev_src"],
+                   write_statistics=True)
+    print(f"[info] ETR timeline: {len(tl):,} events, {tl[incident_col].nunique():,} incidents -> {path}")
+
+def read_etr_timeline(path: str, incidents: Optional[Sequence[int]] = None,
+                      incident_col: str = "INCIDENT_ID", columns: Optional[List[str]] = None) -> pd.DataFrame:
+    filters = [(incident_col, "in", list(incidents))] if incidents is not None else None
+    return pq.read_table(path, columns=columns, filters=filters).to_pandas()
+
+# Example:
+# ev = etr_events(followups)                        # INCIDENT_ID, FOLLOWUP_ID, FOLLOWUP_DATETIME, FOLLOWUP_DESC
+# tl = build_etr_timeline(ev)
+# write_etr_timeline(tl, "etr_timeline.parquet")
+# churn = etr_churn(read_etr_timeline("etr_timeline.parquet"), restore=summary[["INCIDENT_ID", "restore_time"]])
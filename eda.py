@@ -1,5 +1,8 @@
 import re
+from functools import lru_cache
 from typing import Optional, Dict, Tuple
+import numpy as np
+import pandas as pd
 
 FLAGS = re.I  # case-insensitive
 
@@ -93,26 +96,58 @@ def classify_event(text: Optional[str]) -> Tuple[str, Dict[str, Optional[str]]]:
     for rx, base in PATTERN_SETS:
         m = rx.search(s)
         if m:
-            info = dict(base)  # copy
-            # attach optional groups if present
-            for k in ("etr_ts", "cause", "call_ts", "asset"):
-                if k in m.re.groupindex:
-                    info[k] = m.group(k)
+            info = _event_info(base, m)
             return info["cat"], info
     return "OTHER", {"cat": "OTHER", "sub": None}
 
+def _event_info(base: Dict[str, Optional[str]], m: re.Match) -> Dict[str, Optional[str]]:
+    info = dict(base)  # copy
+    # attach optional groups if present
+    for k in ("etr_ts", "cause", "call_ts", "asset"):
+        if k in m.re.groupindex:
+            info[k] = m.group(k)
+    return info
+
+# event_meta keys lifted to their own columns by tag_events
+LIFTED = {"event_sub": "sub", "etr_source": "source", "etr_ts_txt": "etr_ts", "cause_code": "cause",
+          "ami_call_ts": "call_ts", "ami_asset": "asset"}
+
+def eda_finish(s: str, i: Optional[int], m: Optional[re.Match]) -> Dict[str, object]:
+    """Adapter for regex.py tag_all: winning PATTERN_SETS index -> the tag_events columns."""
+    info = _event_info(PATTERN_SETS[i][1], m) if m else {"cat": "OTHER", "sub": None}
+    row = {"event_cat": info["cat"], "event_meta": info}
+    row.update({col: info.get(k) for col, k in LIFTED.items()})
+    return row
+
+# ---------- Memoized classifier ----------
+# FOLLOWUP_DESC is extremely repetitive, so keep a bounded LRU of text -> (label, extras).
+# Cached extras dicts are shared between rows: treat them as read-only.
+classify_event_cached = lru_cache(maxsize=200_000)(classify_event)
+
+def classify_cache_stats() -> Dict[str, Optional[float]]:
+    ci = classify_event_cached.cache_info()
+    seen = ci.hits + ci.misses
+    return {"hits": ci.hits, "misses": ci.misses, "size": ci.currsize, "maxsize": ci.maxsize,
+            "hit_rate": (ci.hits / seen) if seen else None}
+
+def _broadcast_codes(values, codes):
+    arr = np.empty(len(values), dtype=object)
+    for i, v in enumerate(values):
+        arr[i] = v
+    return arr.take(codes)
+
 # ---------- Vectorized tagging helper ----------
-def tag_events(df, col="FOLLOWUP_DESC"):
-    out = df[col].apply(lambda x: classify_event(x))
-    df["event_cat"] = out.map(lambda t: t[0])
-    df["event_meta"] = out.map(lambda t: t[1])  # dict per row (keep for debugging)
+def tag_events(df, col="FOLLOWUP_DESC", memo=True):
+    # Classify each DISTINCT value once, then broadcast back through the factorize codes
+    codes, uniques = pd.factorize(df[col], use_na_sentinel=False)
+    classify = classify_event_cached if memo else classify_event
+    out = [classify(x) for x in uniques]
+    metas = [t[1] for t in out]
+    df["event_cat"] = _broadcast_codes([t[0] for t in out], codes)
+    df["event_meta"] = _broadcast_codes(metas, codes)  # dict per row (keep for debugging)
     # Lift common fields to columns for ease of use
-    df["event_sub"]   = df["event_meta"].map(lambda d: d.get("sub"))
-    df["etr_source"]  = df["event_meta"].map(lambda d: d.get("source"))
-    df["etr_ts_txt"]  = df["event_meta"].map(lambda d: d.get("etr_ts"))
-    df["cause_code"]  = df["event_meta"].map(lambda d: d.get("cause"))
-    df["ami_call_ts"] = df["event_meta"].map(lambda d: d.get("call_ts"))
-    df["ami_asset"]   = df["event_meta"].map(lambda d: d.get("asset"))
+    for col, k in LIFTED.items():
+        df[col] = _broadcast_codes([d.get(k) for d in metas], codes)
     return df
 
 
@@ -221,7 +256,8 @@ def fetch_single_incident_followups(
     incident_date_col: str = 'CREATE_DATE',  # change if your incident date col is different
     followup_cols: Optional[Iterable[str]] = None,  # columns to pull from HIS_FOLLOWUP
     chunksize: int = 100_000,
-    parquet_dir: Optional[str] = None        # folder to write chunked Parquet; if None, returns an iterator
+    parquet_dir: Optional[str] = None,       # folder to write chunked Parquet; if None, returns an iterator
+    order_by: Optional[Iterable[str]] = None # e.g. INCIDENT_ID, FOLLOWUP_DATETIME, INSERTED_DATE for segment_phases_stream
 ):
     """
     Stream HIS_FOLLOWUP rows for incidents in [start_date, end_date]
@@ -260,9 +296,12 @@ def fetch_single_incident_followups(
     JOIN single_incidents AS s
       ON s."INCIDENT_ID" = h."INCIDENT_ID"
     """
+    count_sql = sql
+    if order_by:
+        sql += f"    ORDER BY {', '.join(order_by)}\n"
 
     # Quick server-side sanity count (fast; no fetch of big rows)
-    cnt = cc.sql(f"SELECT COUNT(*) AS N FROM ({sql}) q").collect().iloc[0,0]
+    cnt = cc.sql(f"SELECT COUNT(*) AS N FROM ({count_sql}) q").collect().iloc[0,0]
     print(f"[info] rows to fetch: {cnt:,}")
 
     # Stream rows
@@ -288,6 +327,16 @@ def fetch_single_incident_followups(
 #         parquet_dir="his_followup_single") :
 #     pass  # files written; iterate again later to read/concat
 #
+# # Tag + write partitioned Parquet chunk by chunk (no concat): see stream_tag_to_parquet in parquet_cleaner.py
+#
+# # Segment multi-year history in constant memory (chunks must come ordered by incident):
+# chunks = fetch_single_incident_followups(
+#     cc, "2022-01-01", "2025-10-10",
+#     followup_cols=['h."INCIDENT_ID"', 'h."FOLLOWUP_DATETIME"', 'h."INSERTED_DATE"', 'h."FOLLOWUP_DESC"', 'h."SYSTEM_OPID"'],
+#     order_by=['h."INCIDENT_ID"', 'h."FOLLOWUP_DATETIME"', 'h."INSERTED_DATE"'])
+# for labeled, summary in segment_phases_stream(chunks, cfg):   # segment_phases.py
+#     summary.to_parquet(...)
+#
 # # Or if you want DataFrame chunks directly (no files):
 # for df_chunk in fetch_single_incident_followups(cc, "2024-10-10", "2025-10-10", parquet_dir=None):
 #     # process df_chunk
@@ -9,10 +9,7 @@ def _sessions_count(times: pd.Series, gap_hours: int) -> int:
     """How many sessions in a sorted datetime Series with a given inactivity gap."""
     if times.empty:
         return 0
-    if len(times) == 1:
-        return 1
-    diffs = times.sort_values().diff()
-    return int((diffs > pd.Timedelta(hours=gap_hours)).sum() + 1)
+    return len(sessionize(np.zeros(len(times)), times, pd.Timedelta(hours=gap_hours)))
 
 def enrich_incident_summary(
     events_labeled: pd.DataFrame,
@@ -164,26 +161,19 @@ def enrich_incident_summary(
     out["C2_steps_per_hr"] = density(out["n_C2_steps"], out.get("dur_c2_min", np.nan))
 
     # ---------- Sessions & late flags from events (post-B phases by construction) ----------
-    def session_meta(g, label, gap_hours, window_days):
-        s = g.loc[g["_phase"]==label, cfg.time_col].sort_values()
-        sessions = _sessions_count(s, gap_hours)
-        if s.empty:
-            return pd.Series({"sessions":0,"late":False})
-        first = s.iloc[0]
-        win_end = first + pd.Timedelta(days=window_days)
-        late = (s.iloc[-1] > win_end)  # anything past the window = late
-        return pd.Series({"sessions":sessions,"late":bool(late)})
-
-    sess = (
-        events_labeled
-        .groupby(cfg.incident_col, sort=False)
-        .apply(lambda g: pd.concat([
-            session_meta(g, "C1_DOC_POSTHIST", getattr(cfg, "c1_session_gap_hours", 2), getattr(cfg, "c1_window_days", 3)).add_prefix("c1_"),
-            session_meta(g, "C2_RA_QC",       getattr(cfg, "c2_session_gap_hours", 6), getattr(cfg, "c2_window_days", 14)).add_prefix("c2_"),
-        ]))
-        .reset_index()
-        .rename(columns={cfg.incident_col:"incident_id"})
-    )
+    # One sessionize pass per label over all incidents; late = last event past first + window.
+    sess = pd.DataFrame({"incident_id": events_labeled[cfg.incident_col].dropna().unique()})
+    for prefix, label, gap_hours, window_days in [
+        ("c1_", "C1_DOC_POSTHIST", getattr(cfg, "c1_session_gap_hours", 2), getattr(cfg, "c1_window_days", 3)),
+        ("c2_", "C2_RA_QC",        getattr(cfg, "c2_session_gap_hours", 6), getattr(cfg, "c2_window_days", 14)),
+    ]:
+        rows = events_labeled[events_labeled["_phase"] == label]
+        st = sessionize(rows[cfg.incident_col], rows[cfg.time_col], pd.Timedelta(hours=gap_hours))
+        first = st[st["session"] == 0].set_index("key")              # session 0 / last session per incident
+        last = st.drop_duplicates("key", keep="last").set_index("key")  # (NaT kept: no skipna "last")
+        late = last["end"] > first["start"] + pd.Timedelta(days=window_days)
+        sess[prefix + "sessions"] = sess["incident_id"].map(last["session"] + 1).fillna(0).astype(int)
+        sess[prefix + "late"] = sess["incident_id"].map(late).fillna(False).astype(bool)
     out = out.merge(sess, on="incident_id", how="left")
 
     # ---------- Optional: change-impact flags if event tags exist ----------
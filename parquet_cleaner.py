@@ -41,9 +41,46 @@ def sanitize_for_parquet(df: pd.DataFrame) -> pd.DataFrame:
 
     return out
 
+def add_date_key(df: pd.DataFrame, time_col: str = "FOLLOWUP_DATETIME") -> pd.DataFrame:
+    ts = pd.to_datetime(df[time_col], errors="coerce")
+    df["date_key"] = (ts.dt.year * 10000 + ts.dt.month * 100 + ts.dt.day).astype("Int32")
+    return df
+
+# ---------- streaming: tag + write one chunk at a time ----------
+def stream_tag_to_parquet(chunks, base_dir: str, tag, time_col: str = "FOLLOWUP_TIME",
+                          drop_cols=None, partitioning=("date_key",)) -> dict:
+    """
+    Tag each DataFrame chunk as it arrives (e.g. from fetch_single_incident_followups)
+    and append it to the partitioned dataset at base_dir, then drop it.
+    Peak memory ~ one chunk (+ its tags), whatever the date range.
+
+    tag: DataFrame -> DataFrame (eda.tag_events, regex.tag_dataframe_narrow, ...)
+    Each chunk gets its own file name (chunk00000-*.parquet), so chunks never overwrite each other;
+    re-running into the same base_dir rewrites the same names.
+    """
+    n_chunks = n_rows = 0
+    for i, chunk in enumerate(chunks):
+        tagged = add_date_key(tag(chunk), time_col)
+        if drop_cols:
+            tagged = tagged.drop(columns=list(drop_cols), errors="ignore")
+        table = pa.Table.from_pandas(sanitize_for_parquet(tagged), preserve_index=False)
+        ds.write_dataset(
+            table,
+            base_dir=base_dir,
+            format="parquet",
+            partitioning=list(partitioning),
+            basename_template=f"chunk{i:05d}-{{i}}.parquet",
+            existing_data_behavior="overwrite_or_ignore"
+        )
+        n_chunks += 1
+        n_rows += len(chunk)
+        print(f"[info] chunk {i}: tagged + wrote {len(chunk):,} rows (total {n_rows:,})")
+        del chunk, tagged, table   # release before pulling the next chunk
+    return {"chunks": n_chunks, "rows": n_rows}
+
 # ---------- prepare & write ----------
 events = sanitize_for_parquet(a)  # or your events DataFrame
-events["date_key"] = events["FOLLOWUP_DATETIME"].dt.strftime("%Y%m%d").astype("Int32")
+events = add_date_key(events)
 
 # (Optional) Drop very large text you don't need in this table (saves space)
 # events = events.drop(columns=["FOLLOWUP_DESC","event_meta"], errors="ignore")
@@ -56,3 +93,7 @@ ds.write_dataset(
     partitioning=["date_key"],             # creates date_key=YYYYMMDD/...
     existing_data_behavior="overwrite_or_ignore"
 )
+
+# ---------- streaming instead of concat -> tag -> write ----------
+# chunks = fetch_single_incident_followups(cc, "2024-10-10", "2025-10-10", parquet_dir=None)
+# stats = stream_tag_to_parquet(chunks, "EventLogsLabeled_parquet/", tag=tag_events)
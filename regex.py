@@ -6,7 +6,7 @@
 import re
 
 # Detect both wordings
-CREW_REMARK_DETECT = re.compile(
+CREW_REMARK_DETECT = lazy_compile(
     r'(?i)^\s*Crew\s*\[\s*[^\]]+\s*\]\s*(?:new\s+remark\s+recorded|remark\s+changed)\b'
 )
 
@@ -15,7 +15,7 @@ CREW_REMARK_DETECT = re.compile(
 #   - (?s) DOTALL: allow any characters, even newlines, inside the remark
 #   - Greedy '.*' ensures we stop at the LAST ']' on the line, so inner [...] are fine
 #   - Tail "from <SRC>" is optional and case-insensitive; trailing spaces are OK
-CREW_REMARK_EXTRACT = re.compile(
+CREW_REMARK_EXTRACT = lazy_compile(
     r'''(?isx)
     ^\s*Crew\s*\[\s*(?P<crew>[^\]]+)\s*\]\s*
     (?:new\s+remark\s+recorded|remark\s+changed)
@@ -37,11 +37,11 @@ def crew_remark_handler(m):
 
 
 # -------- Incident Crew Remark applied to all locations --------
-INC_CREW_REMARK_ALL_DETECT = re.compile(
+INC_CREW_REMARK_ALL_DETECT = lazy_compile(
     r'(?i)^\s*Incident\s*\[\s*\d+\s*\]\s*Crew\s+Remark\b'
 )
 
-INC_CREW_REMARK_ALL_EXTRACT = re.compile(
+INC_CREW_REMARK_ALL_EXTRACT = lazy_compile(
     r'''(?ix)
     ^\s*Incident\s*\[\s*(?P<incident_id>\d+)\s*\]\s*
     Crew\s+Remark\s*
@@ -61,19 +61,20 @@ def inc_crew_remark_all_handler(m):
     }
 
 rules.append(
-    Rule("Incident Crew Remark (All Locations)", 43, INC_CREW_REMARK_ALL_DETECT, INC_CREW_REMARK_ALL_EXTRACT, inc_crew_remark_all_handler)
+    Rule("Incident Crew Remark (All Locations)", 43, INC_CREW_REMARK_ALL_DETECT, INC_CREW_REMARK_ALL_EXTRACT, inc_crew_remark_all_handler,
+         schema={**BASE_SCHEMA, "scope": "category", "incident_id": "Int64", "remark": "string"})
 )
 
 
 
 # Detect: Crew[...] (new remark recorded | remark changed) ...
-CREW_REMARK_DETECT = re.compile(
+CREW_REMARK_DETECT = lazy_compile(
     r'(?i)^\s*Crew\s*\[\s*[^\]]+\s*\]\s*(?:new\s+remark\s+recorded|remark\s+changed)\b'
 )
 
 # Extract:
 #  - bracketed remark can contain internal [ ... ] ; we capture up to the FINAL ']' before (from CAD)? end
-CREW_REMARK_EXTRACT = re.compile(
+CREW_REMARK_EXTRACT = lazy_compile(
     r'''(?ix)
     ^\s*Crew\s*\[\s*(?P<crew>[^\]]+)\s*\]\s*
     (?:new\s+remark\s+recorded|remark\s+changed)
@@ -88,10 +89,10 @@ CREW_REMARK_EXTRACT = re.compile(
 
 
 # Detect unchanged
-LOC_CREW_REMARK_DETECT = re.compile(r'(?i)^\s*Location\s*\[\s*\d+\s*\]\s*Crew\s*:')
+LOC_CREW_REMARK_DETECT = lazy_compile(r'(?i)^\s*Location\s*\[\s*\d+\s*\]\s*Crew\s*:')
 
 # Extract with look-ahead for the set-to value
-LOC_CREW_REMARK_EXTRACT = re.compile(
+LOC_CREW_REMARK_EXTRACT = lazy_compile(
     r'''(?ix)
     ^\s*Location\s*\[\s*(?P<loc_id>\d+)\s*\]\s*
     Crew\s*:\s*\[\s*(?P<crew_ref>[^\]]+)\s*\]\s*
@@ -123,7 +124,8 @@ def loc_crew_remark_handler(m):
         "remark": (m.group("remark") or "").strip() or None
     }
 rules.append(
-    Rule("Location Crew Remark", 44, LOC_CREW_REMARK_DETECT, LOC_CREW_REMARK_EXTRACT, loc_crew_remark_handler)
+    Rule("Location Crew Remark", 44, LOC_CREW_REMARK_DETECT, LOC_CREW_REMARK_EXTRACT, loc_crew_remark_handler,
+         schema={**BASE_SCHEMA, "scope": "category", "location_id": "Int64", "crew_ref": "string", "remark": "string"})
 )
 
 
@@ -133,12 +135,12 @@ import pandas as pd
 from typing import Dict, Any
 
 # High priority: field change > status chatter
-LOC_DATE_DETECT = re.compile(
+LOC_DATE_DETECT = lazy_compile(
     r'(?i)^\s*(?:His\s+)?Location\s*\[\s*\d+\s*\]\s*'
     r'(?:Energized|Initial|Estimated\s+Restore)\s+Date\s+has\s+been\b'
 )
 
-LOC_DATE_EXTRACT = re.compile(
+LOC_DATE_EXTRACT = lazy_compile(
     r'''(?ix)
     ^\s*
     (?:His\s+)?Location
@@ -188,7 +190,7 @@ def loc_date_handler(m: re.Match) -> Dict[str, Any]:
 
     # (A) SET
     if m.group("set_val") is not None:
-        new_ts = _coerce_dt_maybe(m.group("set_val"))
+        new_ts = defer_dt(m.group("set_val"))
         return {
             "cat": "LOCATION_DATE",
             "action": "SET",
@@ -199,20 +201,15 @@ def loc_date_handler(m: re.Match) -> Dict[str, Any]:
 
     # (B) CHANGE
     if m.group("from_val") is not None or m.group("to_val") is not None:
-        old_ts = _coerce_dt_maybe(m.group("from_val"))
-        new_ts = _coerce_dt_maybe(m.group("to_val"))
-        delta, flag = _delta_flag(old_ts, new_ts)
-        meta = {
+        return {
             "cat": "LOCATION_DATE",
             "action": "CHANGED",
             "field": field,
             "location_id": loc_id,
-            "old_ts": old_ts,
-            "new_ts": new_ts,
-            "delta_min": delta,            # + later, - earlier
+            "old_ts": defer_dt(m.group("from_val")),
+            "new_ts": defer_dt(m.group("to_val")),
+            "delta_min": None,             # + later, - earlier (loc_date_finalize)
         }
-        if flag: meta["_flags"] = flag
-        return meta
 
     # (C) REMOVED
     return {
@@ -222,9 +219,17 @@ def loc_date_handler(m: re.Match) -> Dict[str, Any]:
         "location_id": loc_id,
     }
 
+def loc_date_finalize(meta: Dict[str, Any]) -> None:
+    if meta.get("action") == "CHANGED":
+        meta["delta_min"], flag = _delta_flag(meta.get("old_ts"), meta.get("new_ts"))
+        if flag: meta["_flags"] = flag
+
 # Register BEFORE Location Status (e.g., 75 < 80)
 rules.append(
-    Rule("Location Date Field", 75, LOC_DATE_DETECT, LOC_DATE_EXTRACT, loc_date_handler)
+    Rule("Location Date Field", 75, LOC_DATE_DETECT, LOC_DATE_EXTRACT, loc_date_handler,
+         finalize=loc_date_finalize,
+         schema={**BASE_SCHEMA, "action": "category", "field": "category", "location_id": "Int64",
+                 "old_ts": "datetime64[ns]", "new_ts": "datetime64[ns]", "delta_min": "Float64"})
 )
 
 
@@ -234,11 +239,11 @@ rules.append(
 import re
 from typing import Dict, Any
 
-CAD_CODE_DETECT = re.compile(
+CAD_CODE_DETECT = lazy_compile(
     r'(?i)^\s*(?:New\s+(?:cause\s+code|occurrence)\s+recorded|Cause\s+code\s+removed)\b'
 )
 
-CAD_CODE_EXTRACT = re.compile(
+CAD_CODE_EXTRACT = lazy_compile(
     r'''(?ix)
     ^\s*
     (?:
@@ -288,18 +293,19 @@ def cad_code_handler(m: re.Match) -> Dict[str, Any]:
 
 # Priority: put near other signal/call-level events (e.g., 60–70)
 rules.append(
-    Rule("CAD Code Recorded/Removed", 66, CAD_CODE_DETECT, CAD_CODE_EXTRACT, cad_code_handler)
+    Rule("CAD Code Recorded/Removed", 66, CAD_CODE_DETECT, CAD_CODE_EXTRACT, cad_code_handler,
+         schema={**BASE_SCHEMA, "source": "category", "code": "category", "desc": "string"})
 )
 
 
 
 
 # -------- Location-level Cause / Occurrence set/removed --------
-LOC_CODE_DETECT = re.compile(
+LOC_CODE_DETECT = lazy_compile(
     r'(?i)^\s*His\s+Location\s*\[\s*\d+\s*\]\s*(?:Cause|Occurn)\s+has\s+been\s+(?:set\s+to|removed)\b'
 )
 
-LOC_CODE_EXTRACT = re.compile(
+LOC_CODE_EXTRACT = lazy_compile(
     r'''(?ix)
     ^\s*His\s+Location
     \s*\[\s*(?P<loc_id>\d+)\s*\]\s*
@@ -331,7 +337,8 @@ def loc_code_handler(m: re.Match) -> Dict[str, Any]:
 
 # Priority: these are field changes; put high (e.g., 76), just below Energized Date (75)
 rules.append(
-    Rule("Location Code Set/Removed", 76, LOC_CODE_DETECT, LOC_CODE_EXTRACT, loc_code_handler)
+    Rule("Location Code Set/Removed", 76, LOC_CODE_DETECT, LOC_CODE_EXTRACT, loc_code_handler,
+         schema={**BASE_SCHEMA, "location_id": "Int64", "value": "string"})
 )
 
 
@@ -343,9 +350,9 @@ rules.append(
 import re
 from typing import Dict, Any
 
-INC_DETAILS_DETECT = re.compile(r'(?i)^\s*Incident\s+details\s+accessed\b')
+INC_DETAILS_DETECT = lazy_compile(r'(?i)^\s*Incident\s+details\s+accessed\b')
 
-INC_DETAILS_EXTRACT = re.compile(
+INC_DETAILS_EXTRACT = lazy_compile(
     r'''(?ix)
     ^\s*Incident\s+details\s+accessed
     (?:\s+for\s+the\s+first\s+time)?      # optional "for the first time"
@@ -362,15 +369,16 @@ def inc_details_handler(m: re.Match) -> Dict[str, Any]:
     }
 
 rules.append(
-    Rule("Incident Details Accessed", 31, INC_DETAILS_DETECT, INC_DETAILS_EXTRACT, inc_details_handler)
+    Rule("Incident Details Accessed", 31, INC_DETAILS_DETECT, INC_DETAILS_EXTRACT, inc_details_handler,
+         schema={**BASE_SCHEMA, "first_time": "boolean"})
 )
 
 
 
 # --- Incident Analyzed (optional device set) ---
-INC_ANALYZED_DETECT = re.compile(r'(?i)^\s*Incident\s+Analyzed\b')
+INC_ANALYZED_DETECT = lazy_compile(r'(?i)^\s*Incident\s+Analyzed\b')
 
-INC_ANALYZED_EXTRACT = re.compile(
+INC_ANALYZED_EXTRACT = lazy_compile(
     r'''(?ix)
     ^\s*Incident\s+Analyzed\.?                # "Incident Analyzed" with optional period
     (?:\s*                                     # optional trailing device assignment clause
@@ -393,16 +401,17 @@ def inc_analyzed_handler(m: re.Match) -> Dict[str, Any]:
     }
 
 rules.append(
-    Rule("Incident Analyzed", 32, INC_ANALYZED_DETECT, INC_ANALYZED_EXTRACT, inc_analyzed_handler)
+    Rule("Incident Analyzed", 32, INC_ANALYZED_DETECT, INC_ANALYZED_EXTRACT, inc_analyzed_handler,
+         schema={**BASE_SCHEMA, "device_id": "string", "device_label": "string"})
 )
 
 
 # --- Incident Device main call changed ---
-INC_MAINCALL_DETECT = re.compile(
+INC_MAINCALL_DETECT = lazy_compile(
     r'(?i)^\s*Change\s+Incident\s+Device\s+main\s+call\s+to\b'
 )
 
-INC_MAINCALL_EXTRACT = re.compile(
+INC_MAINCALL_EXTRACT = lazy_compile(
     r'''(?ix)
     ^\s*Change\s+Incident\s+Device\s+main\s+call\s+to\s*
     \[\s*(?P<dev_id>[^\]]+)\s*\]
@@ -418,7 +427,8 @@ def inc_maincall_handler(m: re.Match) -> Dict[str, Any]:
     }
 
 rules.append(
-    Rule("Incident Device Main Call Changed", 33, INC_MAINCALL_DETECT, INC_MAINCALL_EXTRACT, inc_maincall_handler)
+    Rule("Incident Device Main Call Changed", 33, INC_MAINCALL_DETECT, INC_MAINCALL_EXTRACT, inc_maincall_handler,
+         schema={**BASE_SCHEMA, "device_id": "string"})
 )
 
 
@@ -430,7 +440,7 @@ import pandas as pd
 from typing import Dict, Any
 
 # High priority: actual field change
-LOC_ENERGIZED_DETECT = re.compile(
+LOC_ENERGIZED_DETECT = lazy_compile(
     r'(?i)^\s*(?:His\s+)?Location\s*\[\s*\d+\s*\]\s*Energized\s+Date\s+has\s+been\b'
 )
 
@@ -438,7 +448,7 @@ LOC_ENERGIZED_DETECT = re.compile(
 #  A) "... set to [ <any text, possibly empty> ]"
 #  B) "... Change from [ <any> ] to [ <any> ]"
 #  C) "... removed"
-LOC_ENERGIZED_EXTRACT = re.compile(
+LOC_ENERGIZED_EXTRACT = lazy_compile(
     r'''(?ix)
     ^\s*
     (?:His\s+)?Location
@@ -488,7 +498,7 @@ def loc_energized_handler(m: re.Match) -> Dict[str, Any]:
 
     if set_val is not None:
         # (A) SET
-        new_ts = _coerce_dt_maybe(set_val)
+        new_ts = defer_dt(set_val)
         return {
             "cat": "LOCATION",
             "kind": "ENERGIZED_DATE_SET",
@@ -498,20 +508,14 @@ def loc_energized_handler(m: re.Match) -> Dict[str, Any]:
 
     if from_val is not None or to_val is not None:
         # (B) CHANGE
-        from_ts = _coerce_dt_maybe(from_val)
-        to_ts   = _coerce_dt_maybe(to_val)
-        delta, flag = _etr_delta_and_flag(from_ts, to_ts)
-        meta = {
+        return {
             "cat": "LOCATION",
             "kind": "ENERGIZED_DATE_CHANGED",
             "location_id": loc_id,
-            "old_ts": from_ts,
-            "new_ts": to_ts,
-            "delta_min": delta,      # + => moved later, - => earlier
+            "old_ts": defer_dt(from_val),
+            "new_ts": defer_dt(to_val),
+            "delta_min": None,       # + => moved later, - => earlier (loc_energized_finalize)
         }
-        if flag:
-            meta["_flags"] = flag
-        return meta
 
     # (C) REMOVED
     return {
@@ -520,9 +524,18 @@ def loc_energized_handler(m: re.Match) -> Dict[str, Any]:
         "location_id": loc_id,
     }
 
+def loc_energized_finalize(meta: Dict[str, Any]) -> None:
+    if meta.get("kind") == "ENERGIZED_DATE_CHANGED":
+        meta["delta_min"], flag = _etr_delta_and_flag(meta.get("old_ts"), meta.get("new_ts"))
+        if flag:
+            meta["_flags"] = flag
+
 # Register BEFORE Location Status (e.g., 75 vs 80)
 rules.append(
-    Rule("Location Energized Date", 75, LOC_ENERGIZED_DETECT, LOC_ENERGIZED_EXTRACT, loc_energized_handler)
+    Rule("Location Energized Date", 75, LOC_ENERGIZED_DETECT, LOC_ENERGIZED_EXTRACT, loc_energized_handler,
+         finalize=loc_energized_finalize,
+         schema={**BASE_SCHEMA, "location_id": "Int64", "old_ts": "datetime64[ns]", "new_ts": "datetime64[ns]",
+                 "delta_min": "Float64"})
 )
 
 
@@ -538,11 +551,11 @@ import re
 from typing import Dict, Any
 # from ..engine import Rule   # if using package layout
 
-MEMO_DETECT = re.compile(
+MEMO_DETECT = lazy_compile(
     r'(?i)^\s*(?:\[MultiEdit\]\s*)?(?:Added|Changed|Deleted)\b.*\bmemo',  # cheap, robust gate
 )
 
-MEMO_EXTRACT = re.compile(
+MEMO_EXTRACT = lazy_compile(
     r'''(?ix)
     ^\s*
     (?P<multi>\[MultiEdit\]\s*)?                     # optional "[MultiEdit]" prefix
@@ -684,15 +697,17 @@ def memo_handler(m: re.Match) -> Dict[str, Any]:
 
 # Register (admin-ish; after Crew/Location/GO/Calls; before Archive housekeeping if you like)
 rules.append(
-    Rule("Memo Operation", 88, MEMO_DETECT, MEMO_EXTRACT, memo_handler)
+    Rule("Memo Operation", 88, MEMO_DETECT, MEMO_EXTRACT, memo_handler,
+         schema={**BASE_SCHEMA, "multi_edit": "boolean", "memo_id": "Int64", "incident_id": "Int64",
+                 "scope": "category", "ids_list_present": "boolean", "fields_changed": "object"})
 )
 
 
 
 
-ARCHIVE_OP_DETECT = re.compile(r'(?i)^\s*Archive:')
+ARCHIVE_OP_DETECT = lazy_compile(r'(?i)^\s*Archive:')
 
-ARCHIVE_OP_EXTRACT = re.compile(
+ARCHIVE_OP_EXTRACT = lazy_compile(
     r'''(?ix)
     ^\s*Archive:\s*
     \[\s*(?P<op>[^\]]+)\s*\]
@@ -745,9 +760,9 @@ def archive_op_handler(m):
 
 
 # --- Archive Operation (revised) ---
-ARCHIVE_OP_DETECT = re.compile(r'(?i)^\s*Archive:')
+ARCHIVE_OP_DETECT = lazy_compile(r'(?i)^\s*Archive:')
 
-ARCHIVE_OP_EXTRACT = re.compile(
+ARCHIVE_OP_EXTRACT = lazy_compile(
     r'''(?ix)
     ^\s*Archive:\s*
     \[\s*(?P<op>[^\]]+)\s*\]                 # e.g., "Copy Repair", "Duplicate Details for all locations"
@@ -797,11 +812,11 @@ def archive_op_handler(m):
 
 
 # --- Incident Archived (revised) ---
-INC_ARCHIVE_DETECT = re.compile(
+INC_ARCHIVE_DETECT = lazy_compile(
     r'(?i)^\s*(?:Incident\s+)?(?:Archived|ARCHIVED)(?:\s+incident)?\b'
 )
 
-INC_ARCHIVE_EXTRACT = re.compile(
+INC_ARCHIVE_EXTRACT = lazy_compile(
     r'''(?ix)
     ^\s*
     (?:Incident\s+)?                 # optional leading "Incident"
@@ -826,11 +841,11 @@ def inc_archive_handler(m):
 import re
 from typing import Dict, Any
 
-ARCH_INFO_DETECT = re.compile(
+ARCH_INFO_DETECT = lazy_compile(
     r'(?i)^\s*Archived\s+(?:downstream|premise)\s+info\b'
 )
 
-ARCH_INFO_EXTRACT = re.compile(
+ARCH_INFO_EXTRACT = lazy_compile(
     r'''(?ix)
     ^\s*Archived\s+
     (?P<what>downstream|premise)\s+info
@@ -870,18 +885,19 @@ def arch_info_handler(m: re.Match) -> Dict[str, Any]:
 
 # Register with similar priority to other archive ops, but separate from "Archive:" housekeeping.
 rules.append(
-    Rule("Archive Info (Device)", 92, ARCH_INFO_DETECT, ARCH_INFO_EXTRACT, arch_info_handler)
+    Rule("Archive Info (Device)", 92, ARCH_INFO_DETECT, ARCH_INFO_EXTRACT, arch_info_handler,
+         schema={**BASE_SCHEMA, "device_id": "string", "count": "Int64", "unit": "category", "source": "category"})
 )
 
 
 
 
 # -------- Archive Operation (Copy ...) --------
-ARCHIVE_OP_DETECT = re.compile(
+ARCHIVE_OP_DETECT = lazy_compile(
     r'(?i)^\s*Archive:'
 )
 
-ARCHIVE_OP_EXTRACT = re.compile(
+ARCHIVE_OP_EXTRACT = lazy_compile(
     r'''(?ix)
     ^\s*Archive:\s*
     \[\s*(?P<op>[^\]]+)\s*\]                # operation, e.g., "Copy Repair"
@@ -923,7 +939,10 @@ def archive_op_handler(m: re.Match) -> Dict[str, Any]:
 
 # Priority: after incident/location/crew states; these are admin/housekeeping entries.
 rules.append(
-    Rule("Archive Operation", 90, ARCHIVE_OP_DETECT, ARCHIVE_OP_EXTRACT, archive_op_handler)
+    Rule("Archive Operation", 90, ARCHIVE_OP_DETECT, ARCHIVE_OP_EXTRACT, archive_op_handler,
+         schema={**BASE_SCHEMA, "operation": "category", "count": "Int64", "target": "category",
+                 "connected": "boolean", "linked_to_cad": "boolean", "not_linked_to_cad": "boolean",
+                 "without_data": "boolean", "raw_linkinfo": "string", "raw_tail": "string"})
 )
 
 
@@ -932,11 +951,11 @@ rules.append(
 import re
 from typing import Dict, Any
 
-INC_ARCHIVE_DETECT = re.compile(
+INC_ARCHIVE_DETECT = lazy_compile(
     r'(?i)^\s*(?:Incident\s+)?(?:Archived|ARCHIVED)(?:\s+incident)?\b'
 )
 
-INC_ARCHIVE_EXTRACT = re.compile(
+INC_ARCHIVE_EXTRACT = lazy_compile(
     r'''(?ix)
     ^\s*
     (?:Incident\s+)?                    # optional leading "Incident"
@@ -956,7 +975,8 @@ def inc_archive_handler(m: re.Match) -> Dict[str, Any]:
 
 # Priority: close to other incident-level rules, after status changes.
 rules.append(
-    Rule("Incident Archived", 35, INC_ARCHIVE_DETECT, INC_ARCHIVE_EXTRACT, inc_archive_handler)
+    Rule("Incident Archived", 35, INC_ARCHIVE_DETECT, INC_ARCHIVE_EXTRACT, inc_archive_handler,
+         schema={**BASE_SCHEMA, "by_user": "string"})
 )
 
 
@@ -966,7 +986,7 @@ from typing import Dict, Any
 from ..engine import Rule  # adjust import if not in a package
 
 # Detect ONLY status-change lines; avoids "Energized Date has been set to ..."
-LOC_STATUS_DETECT = re.compile(
+LOC_STATUS_DETECT = lazy_compile(
     r'(?i)^\s*Location\s*\[\s*\d+\s*\].*?\bchanged\s+status\s+to\b'
 )
 
@@ -974,7 +994,7 @@ LOC_STATUS_DETECT = re.compile(
 # Location [2049692667] with Priority Score [] changed status to : Energized
 # Location [2049692756] with Priority Score [18.72] changed status to : Working
 # (Priority Score may be empty or absent)
-LOC_STATUS_EXTRACT = re.compile(
+LOC_STATUS_EXTRACT = lazy_compile(
     r'''(?ix)
     ^\s*Location\s*\[\s*(?P<loc_id>\d+)\s*\]\s*
     (?:with\s+Priority\s+Score\s*\[\s*(?P<ps>[^\]]*)\s*\]\s*)?
@@ -1022,7 +1042,9 @@ def loc_status_handler(m: re.Match) -> Dict[str, Any]:
 
 # Register AFTER your future "Location Energized Date Set" rule (which should be higher priority, e.g., 75)
 rules.append(
-    Rule("Location Status Change", 80, LOC_STATUS_DETECT, LOC_STATUS_EXTRACT, loc_status_handler)
+    Rule("Location Status Change", 80, LOC_STATUS_DETECT, LOC_STATUS_EXTRACT, loc_status_handler,
+         schema={**BASE_SCHEMA, "location_id": "Int64", "priority_score": "Float64", "state_raw": "string",
+                 "state": "category"})
 )
 
 
@@ -1031,11 +1053,11 @@ rules.append(
 import re
 from typing import Dict, Any
 
-CALL_REMARK_DETECT = re.compile(
+CALL_REMARK_DETECT = lazy_compile(
     r'(?i)^\s*Call\s+remark\s+has\s+been\s+changed\s+to\b'
 )
 
-CALL_REMARK_EXTRACT = re.compile(
+CALL_REMARK_EXTRACT = lazy_compile(
     r'''(?ix)
     ^\s*Call\s+remark\s+has\s+been\s+changed\s+to
     \s*\[\s*(?P<remark>[^\]]+)\s*\]\s*$
@@ -1051,20 +1073,22 @@ def call_remark_handler(m: re.Match) -> Dict[str, Any]:
 
 # Priority: before generic call-reported, no overlap with crew
 rules.append(
-    Rule("Call Remark Changed", 40, CALL_REMARK_DETECT, CALL_REMARK_EXTRACT, call_remark_handler)
+    Rule("Call Remark Changed", 40, CALL_REMARK_DETECT, CALL_REMARK_EXTRACT, call_remark_handler,
+         schema={**BASE_SCHEMA, "remark": "string"})
 )
 
 
 # -------- Call Reported --------
 
-CALL_REPORTED_DETECT = re.compile(
+CALL_REPORTED_DETECT = lazy_compile(
     r'(?i)^\s*(?:SCADA|ADMS)?\s*Call\s+reported\b'
 )
 
 # YYYY/MM/DD HH:MM:SS
 DTY = r'\d{4}/\d{2}/\d{2}\s+\d{2}:\d{2}:\d{2}'
+DTY_FMT = "%Y/%m/%d %H:%M:%S"
 
-CALL_REPORTED_EXTRACT = re.compile(
+CALL_REPORTED_EXTRACT = lazy_compile(
     rf'''(?ix)
     ^\s*
     (?:(?P<src>SCADA|ADMS)\s+)?          # optional source prefix
@@ -1109,7 +1133,7 @@ def call_reported_handler(m: re.Match) -> Dict[str, Any]:
             "kind": "REPORTED",
             "source": src,                        # usually None for these lines
             "form": "TRANSFORMER",
-            "reported_ts": pd.to_datetime(m.group("ts"), errors="coerce"),
+            "reported_ts": defer_dt(m.group("ts"), DTY_FMT),
             "asset_type": "TRANSFORMER",
             "asset_id": m.group("x_id").strip(),     # e.g., 5399616
             "asset_label": m.group("x_label").strip(),  # e.g., P5399616
@@ -1119,7 +1143,10 @@ def call_reported_handler(m: re.Match) -> Dict[str, Any]:
 
 # Priority: put around 60–65 (after Incident/Crew/Crew Remark, before GO if you prefer)
 rules.append(
-    Rule("Call Reported", 60, CALL_REPORTED_DETECT, CALL_REPORTED_EXTRACT, call_reported_handler)
+    Rule("Call Reported", 60, CALL_REPORTED_DETECT, CALL_REPORTED_EXTRACT, call_reported_handler,
+         schema={**BASE_SCHEMA, "source": "category", "form": "category", "reported_ts": "datetime64[ns]",
+                 "asset_type": "category", "asset_id": "string", "asset_label": "string", "channel": "category",
+                 "with_text": "string", "entity_id": "string", "entity_label": "string"})
 )
 
 
@@ -1128,7 +1155,7 @@ rules.append(
 import re
 from typing import Dict, Any
 
-CREW_REMARK_DETECT = re.compile(
+CREW_REMARK_DETECT = lazy_compile(
     r'(?i)^\s*Crew\s*\[\s*[^\]]+\s*\]\s*new\s+remark\s+recorded\b'
 )
 
@@ -1136,7 +1163,7 @@ CREW_REMARK_DETECT = re.compile(
 #   Crew [9216] new remark recorded [ ... ] from CAD
 #   Crew [9216] new remark recorded [ ... ]
 #   Crew [9216] new remark recorded ... from CAD   (rare no bracket)
-CREW_REMARK_EXTRACT = re.compile(
+CREW_REMARK_EXTRACT = lazy_compile(
     r'''(?ix)
     ^\s*Crew\s*\[\s*(?P<crew>[^\]]+)\s*\]\s*
     new\s+remark\s+recorded
@@ -1158,7 +1185,8 @@ def crew_remark_handler(m: re.Match) -> Dict[str, Any]:
 
 # Priority BEFORE Crew Status
 rules.append(
-    Rule("Crew Remark (CAD)", 45, CREW_REMARK_DETECT, CREW_REMARK_EXTRACT, crew_remark_handler)
+    Rule("Crew Remark (CAD)", 45, CREW_REMARK_DETECT, CREW_REMARK_EXTRACT, crew_remark_handler,
+         schema={**BASE_SCHEMA, "crew_ref": "string", "remark": "string", "source": "category"})
 )
 
 
@@ -1172,7 +1200,7 @@ rules.append(
 import re
 from ..engine import Rule  # if you’re inside rules/*.py; else adjust import
 
-GO_DETECT = re.compile(
+GO_DETECT = lazy_compile(
     r'(?i)^\s*(?:Complex\s+)?Job\s*\[\s*GO\b'   # cheap gate: Job[...] or Complex Job[...] with GO
 )
 
@@ -1180,7 +1208,7 @@ GO_DETECT = re.compile(
 #  - Job [GO 092825-00231] created for Location [2049692667]
 #  - Job [GO 092825-00231] updated
 #  - Complex Job [GO 092825-00259] created for Incident
-GO_EXTRACT = re.compile(
+GO_EXTRACT = lazy_compile(
     r'''(?ix)
     ^\s*
     (?P<prefix>Complex\s+)?Job
@@ -1239,7 +1267,9 @@ def job_handler(m: re.Match) -> dict:
 
 # Register (after Crew/Incident; before very generic rules)
 rules.append(
-    Rule("GO Job Lifecycle", 70, GO_DETECT, GO_EXTRACT, job_handler)
+    Rule("GO Job Lifecycle", 70, GO_DETECT, GO_EXTRACT, job_handler,
+         schema={**BASE_SCHEMA, "go_id": "string", "go_id_norm": "string", "target_type": "category",
+                 "target_id": "Int64", "is_complex": "boolean"})
 )
 
 
@@ -1247,7 +1277,7 @@ rules.append(
 # -------- Crew Status (from CAD) --------
 import re
 
-CREW_STATUS_DETECT = re.compile(
+CREW_STATUS_DETECT = lazy_compile(
     r'(?i)^\s*Crew\s*\[',  # any Crew[...] line; cheap gate
 )
 
@@ -1255,7 +1285,7 @@ CREW_STATUS_DETECT = re.compile(
 #  (A) "status changed to [State]"
 #  (B) "status [Assigned] assigned"
 #  (C) "unassigned"
-CREW_STATUS_EXTRACT = re.compile(
+CREW_STATUS_EXTRACT = lazy_compile(
     r'''(?ix)
     ^\s*Crew
     \s*\[\s*(?P<crew>[^\]]+)\s*\]\s*
@@ -1320,19 +1350,21 @@ def crew_status_handler(m: re.Match) -> dict:
 
 # Register with a sensible priority (after Incident Status)
 rules.append(
-    Rule("Crew Status (CAD)", 50, CREW_STATUS_DETECT, CREW_STATUS_EXTRACT, crew_status_handler)
+    Rule("Crew Status (CAD)", 50, CREW_STATUS_DETECT, CREW_STATUS_EXTRACT, crew_status_handler,
+         schema={**BASE_SCHEMA, "crew_ref": "string", "state_raw": "string", "state": "category",
+                 "source": "category"})
 )
 
 
 
 # New extractor for ETR and Hanler 
 
-SYSTEM_DETECT = re.compile(r'(?i)^\s*SYSTEM\s+ETR\b')
+SYSTEM_DETECT = lazy_compile(r'(?i)^\s*SYSTEM\s+ETR\b')
 
 # Datetime: MM/DD/YYYY HH:MM[:SS]
 DT = r'(\d{1,2}/\d{1,2}/\d{4}\s+\d{1,2}:\d{2}(?::\d{2})?)'
 
-SYSTEM_EXTRACT = re.compile(
+SYSTEM_EXTRACT = lazy_compile(
     rf'''(?ix)
     ^\s*SYSTEM\s+ETR-?\s*
     (?:
@@ -1368,19 +1400,11 @@ def sys_handler(m: re.Match) -> Dict[str, Any]:
         "kind": "SYSTEM",
         "loc": loc,
         "etr_from_type": (from_type.upper() if from_type else None),
-        "etr_from_ts": coerce_dt(from_dt_text) if from_dt_text else None,
+        "etr_from_ts": defer_dt(from_dt_text),
         "etr_to_type": to_type,   # always SYS in practice, but normalized anyway
-        "etr_to_ts": coerce_dt(to_dt_text),
+        "etr_to_ts": defer_dt(to_dt_text),
     }
-
-    # Optional sanity check: if both from/to present and to < from, flag it.
-    if meta["etr_from_ts"] is not None and meta["etr_to_ts"] is not None:
-        try:
-            if meta["etr_to_ts"] < meta["etr_from_ts"]:
-                meta["_flags"] = "TO_BEFORE_FROM"
-        except Exception:
-            meta["_flags"] = "DT_PARSE_ERR"
-
+    # to < from sanity check runs after date parsing: register with finalize=etr_finalize
     return meta
 
 
@@ -1388,11 +1412,11 @@ def sys_handler(m: re.Match) -> Dict[str, Any]:
 
 # --- Incident Status Change rule ---
 
-INC_STATUS_DETECT = re.compile(
+INC_STATUS_DETECT = lazy_compile(
     r'(?i)\bIncident\s*\[\s*\d+\s*\]\s*change\s*status\s*to\b'
 )
 
-INC_STATUS_EXTRACT = re.compile(
+INC_STATUS_EXTRACT = lazy_compile(
     r'''(?ix)
     \bIncident\s*\[\s*(?P<incident_id>\d+)\s*\]\s*
     change\s*status\s*to\s*[:\-]?\s*
@@ -1436,24 +1460,54 @@ def inc_status_handler(m: re.Match) -> dict:
 
 # Register rule (choose a priority that runs after ETR but before very generic rules)
 rules.append(
-    Rule("Incident Status Change", 30, INC_STATUS_DETECT, INC_STATUS_EXTRACT, inc_status_handler)
+    Rule("Incident Status Change", 30, INC_STATUS_DETECT, INC_STATUS_EXTRACT, inc_status_handler,
+         schema={**BASE_SCHEMA, "incident_id": "Int64", "state_raw": "string", "state": "category"})
 )
 
 
 
 
-import re, json
+import re, json, hashlib, inspect, pickle, signal, sqlite3, sys, threading, types
+import numpy as np
 import pandas as pd
-from dataclasses import dataclass
+from dataclasses import dataclass, field, replace as dc_replace
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime, timezone
+from functools import lru_cache
+from pathlib import Path
+from time import perf_counter, time
 from typing import Callable, Dict, Optional, Pattern, Any, List
+try:
+    from re import _parser as _sre_parse          # Python 3.11+
+except ImportError:
+    import sre_parse as _sre_parse
+try:
+    import pyarrow as pa
+    import pyarrow.compute as pc
+    import pyarrow.dataset as ds
+    import pyarrow.parquet as pq
+except ImportError:                                # prefilter=True / Parquet output only
+    pa = pc = ds = pq = None
 
 DESC_COL = "FOLLOWUP_DESC"
 
 # ---------- Shared ----------
 DT = r'(\d{1,2}/\d{1,2}/\d{4}\s+\d{1,2}:\d{2}(?::\d{2})?)'
+DT_FMT = "%m/%d/%Y %H:%M:%S"   # what DT matches in practice; other shapes fall back to inference
 def coerce_dt(s: Optional[str]):
     return pd.to_datetime(s, errors="coerce") if s else None
 
+@dataclass(frozen=True)
+class RawDT:
+    """Unparsed datetime from a handler; resolve_dates parses them column-wise, one to_datetime per fmt."""
+    text: str
+    fmt: Optional[str] = DT_FMT
+
+def defer_dt(s: Optional[str], fmt: Optional[str] = DT_FMT) -> Optional[RawDT]:
+    """Handler-side replacement for coerce_dt: '' / None -> None, else a RawDT."""
+    s = (s or "").strip()
+    return RawDT(s, fmt) if s else None
+
 @dataclass(frozen=True)
 class Rule:
     name: str
@@ -1461,27 +1515,766 @@ class Rule:
     detect: Pattern
     extract: Optional[Pattern] = None
     handler: Optional[Callable[[re.Match], Dict[str, Any]]] = None  # returns event_meta dict
-
-def apply_rules(text: str, rules: List[Rule]) -> Dict[str, Any]:
+    schema: Optional[Dict[str, str]] = field(default=None, compare=False)  # event_meta key -> dtype (typed meta_ columns)
+    finalize: Optional[Callable[[Dict[str, Any]], None]] = field(default=None, compare=False)  # edits meta once dates are parsed
+
+# Every handler sets cat/kind; rule schemas extend this: Rule(..., schema={**BASE_SCHEMA, "location_id": "Int64"})
+# dtypes: "category", "string", "Int64", "Float64", "boolean", "datetime64[ns]", "object" (lists etc.)
+BASE_SCHEMA = {"cat": "category", "kind": "category"}
+
+# Rule cells build ~60 VERBOSE patterns; compiling them all up front is most of the cells'
+# run time, and a short job may only touch a few. lazy_compile(...) is re.compile that waits
+# for the first search/match/groups; .pattern and .flags (all that rule analysis,
+# fingerprints and the dispatcher merge read) never compile. Bad patterns surface at first
+# use -- or up front in save_rule_registry, which compiles everything.
+_INLINE_FLAGS = {"a": re.ASCII, "i": re.IGNORECASE, "L": re.LOCALE, "m": re.MULTILINE,
+                 "s": re.DOTALL, "u": re.UNICODE, "x": re.VERBOSE}
+LAZY_STATS = {"created": 0, "compiled": 0}
+
+class LazyPattern:
+    def __init__(self, pattern: str, flags: int = 0):
+        self.pattern = pattern
+        self._given = flags
+        self._re: Optional[Pattern] = None
+        self._flags: Optional[int] = None
+        LAZY_STATS["created"] += 1
+
+    def compiled(self) -> Pattern:
+        if self._re is None:
+            self._re = re.compile(self.pattern, self._given)
+            for name in ("search", "match", "fullmatch", "finditer", "findall", "sub", "subn", "split"):
+                setattr(self, name, getattr(self._re, name))   # later calls skip __getattr__
+            LAZY_STATS["compiled"] += 1
+        return self._re
+
+    def __getattr__(self, name: str):
+        if name.startswith("__") or name in ("_re", "_flags"):   # copy/pickle probes, half-built instances
+            raise AttributeError(name)
+        return getattr(self.compiled(), name)
+
+    @property
+    def flags(self) -> int:
+        """Same value as re.compile(...).flags, without compiling."""
+        if self._re is not None:
+            return self._re.flags
+        if self._flags is None:
+            f = self._given
+            lead = re.match(r'\(\?([aiLmsux]+)\)', self.pattern)
+            for c in (lead.group(1) if lead else ""):
+                f |= _INLINE_FLAGS[c]
+            if not f & (re.ASCII | re.LOCALE):
+                f |= re.UNICODE
+            self._flags = int(f)           # compiled .flags is a plain int (fingerprints repr it)
+        return self._flags
+
+    def __reduce__(self):
+        return (LazyPattern, (self.pattern, self._given))
+
+    def __eq__(self, other) -> bool:
+        return (isinstance(other, (LazyPattern, re.Pattern))
+                and (self.pattern, self.flags) == (other.pattern, other.flags))
+
+    def __hash__(self) -> int:
+        return hash((self.pattern, self.flags))
+
+    def __repr__(self) -> str:
+        return f"lazy_compile({self.pattern!r}{', ' + str(self._given) if self._given else ''})"
+
+def lazy_compile(pattern: str, flags: int = 0) -> LazyPattern:
+    return LazyPattern(pattern, flags)
+
+def _run_rule(rule: Rule, s: str, profiler: Optional["RuleProfiler"] = None) -> Dict[str, Any]:
+    """Extract + handle a line whose detect already fired for `rule`."""
+    if not rule.extract:
+        return {"Tag": rule.name, "Flags": None, "event_meta": {}}
+    if profiler is None:
+        m = rule.extract.search(s)
+    else:
+        t0 = perf_counter()
+        m = rule.extract.search(s)
+        profiler.extract(rule, perf_counter() - t0, m is not None)
+    if not m:
+        return {"Tag": rule.name, "Flags": "PARSE_FAIL", "event_meta": {}}
+    return _handle_match(rule, m, profiler)
+
+def _handle_match(rule: Rule, m: re.Match, profiler: Optional["RuleProfiler"] = None) -> Dict[str, Any]:
+    flags = None
+    event_meta: Dict[str, Any] = {}
+    if rule.handler:
+        if profiler is None:
+            event_meta = rule.handler(m)
+        else:
+            t0 = perf_counter()
+            event_meta = rule.handler(m)
+            profiler.handler(rule, perf_counter() - t0)
+        # Handler can set its own flags inside meta; bubble up if present
+        flags = event_meta.pop("_flags", None)
+    return {"Tag": rule.name, "Flags": flags, "event_meta": event_meta}
+
+def apply_rules(text: str, rules: List[Rule], profiler: Optional["RuleProfiler"] = None) -> Dict[str, Any]:
+    """One line -> {Tag, Flags, event_meta} with datetimes parsed (tag_dataframe_narrow defers them)."""
+    return resolve_dates([_apply_rules_raw(text, rules, profiler)], rules)[0]
+
+def _apply_rules_raw(text: str, rules: List[Rule], profiler: Optional["RuleProfiler"] = None) -> Dict[str, Any]:
     s = (text or "").strip()
+    if profiler is not None:
+        return _apply_rules_profiled(s, rules, profiler)
     for rule in sorted(rules, key=lambda r: r.priority):
+        plan = rule_plan(rule)
+        if plan.first is not None and s[:1] not in plan.first:
+            continue                       # cheap literal prefilter: detect can't fire
+        if plan.fused is not None:         # one call: (?=detect) + optional extract
+            m = plan.fused.search(s)
+            if m is None:
+                continue
+            if m.group(_FUSED_MARK) is not None:
+                return _handle_match(rule, m)
+            return {"Tag": rule.name, "Flags": "PARSE_FAIL", "event_meta": {}}
         if rule.detect.search(s):
-            flags = None
-            event_meta: Dict[str, Any] = {}
-            if rule.extract:
-                m = rule.extract.search(s)
-                if not m:
-                    return {"Tag": rule.name, "Flags": "PARSE_FAIL", "event_meta": {}}
-                if rule.handler:
-                    event_meta = rule.handler(m)
-                    # Handler can set its own flags inside meta; bubble up if present
-                    flags = event_meta.pop("_flags", None)
-            return {"Tag": rule.name, "Flags": flags, "event_meta": event_meta}
+            return _run_rule(rule, s)
+    return {"Tag": None, "Flags": None, "event_meta": {}}
+
+# ---------- Deferred datetime parsing ----------
+# Handlers return RawDT (defer_dt) instead of calling to_datetime per line. resolve_dates
+# parses all of them per format in one vectorized call, then runs the winning rule's
+# finalize hook on those rows (deltas / TO_BEFORE_FROM style flags that need the parsed
+# values; a "_flags" key set there goes to Flags, as from a handler).
+def _parse_dt_texts(texts: List[str], fmt: Optional[str]) -> pd.Series:
+    if len(texts) == 1:   # scalar apply_rules: same value without the vectorized round trip
+        t, ts = texts[0], pd.NaT
+        if fmt is not None and not ("%S" in fmt and re.search(r':6[01](?!\d)', t)):
+            try:
+                ts = pd.Timestamp(datetime.strptime(t, fmt))
+            except ValueError:
+                pass
+        if pd.isna(ts):
+            ts = pd.to_datetime(t, format="mixed", errors="coerce")
+        return pd.Series([ts], dtype=object)
+    s = pd.Series(texts, dtype=object)
+    if fmt is None:
+        return pd.to_datetime(s, format="mixed", errors="coerce")
+    parsed = pd.to_datetime(s, format=fmt, errors="coerce")
+    miss = parsed.isna()
+    if "%S" in fmt:   # strptime's %S takes leap seconds (:60/:61) that inference rejects
+        miss |= s.str.contains(r':6[01](?!\d)', regex=True).to_numpy(dtype=bool)
+    if miss.any():   # other shapes (no seconds, extra spaces): per-element inference, like coerce_dt
+        parsed = parsed.astype(object)
+        parsed[miss] = pd.to_datetime(s[miss], format="mixed", errors="coerce").astype(object)
+    return parsed
+
+def resolve_dates(results: List[Dict[str, Any]], rule_list: List[Rule]) -> List[Dict[str, Any]]:
+    """Replace RawDT values in `results` with Timestamps (NaT if unparsable); returns a new list
+    (touched rows are copied, so memoized results are never mutated)."""
+    pending: Dict[Optional[str], List[tuple]] = {}
+    for i, r in enumerate(results):
+        for k, v in r["event_meta"].items():
+            if type(v) is RawDT:
+                pending.setdefault(v.fmt, []).append((i, k, v.text))
+    if not pending:
+        return results
+
+    out = list(results)
+    touched = sorted({i for items in pending.values() for i, _, _ in items})
+    for i in touched:
+        out[i] = {**out[i], "event_meta": dict(out[i]["event_meta"])}
+    for fmt, items in pending.items():
+        parsed = _parse_dt_texts([t for _, _, t in items], fmt)
+        for (i, k, _), ts in zip(items, parsed):
+            out[i]["event_meta"][k] = ts
+
+    finalizers = {r.name: r.finalize for r in rule_list if r.finalize}
+    if finalizers:
+        for i in touched:
+            fin = finalizers.get(out[i]["Tag"])
+            if fin:
+                meta = out[i]["event_meta"]
+                fin(meta)
+                flags = meta.pop("_flags", None)
+                if flags:
+                    out[i]["Flags"] = flags
+    return out
+
+# ---------- Per-rule profiling (opt-in) ----------
+class RuleProfiler:
+    """Counters + cumulative timings per Rule.name.
+
+    p = RuleProfiler(); apply_rules(text, rules, profiler=p)   # or tag_dataframe_narrow(df, profiler=p)
+    p.report()  -> one row per rule: detect calls/hits, extract ok, PARSE_FAIL, detect/extract/handler ms
+    """
+
+    def __init__(self):
+        self.stats: Dict[str, Dict[str, float]] = {}
+        self.priority: Dict[str, int] = {}
+        self.lines = 0
+
+    def _st(self, rule: Rule) -> Dict[str, float]:
+        st = self.stats.get(rule.name)
+        if st is None:
+            st = self.stats[rule.name] = {"detect_calls": 0, "detect_hits": 0, "extract_ok": 0, "parse_fail": 0,
+                                          "detect_s": 0.0, "extract_s": 0.0, "handler_s": 0.0}
+            self.priority[rule.name] = rule.priority
+        return st
+
+    def detect(self, rule: Rule, secs: float, hit: bool) -> None:
+        st = self._st(rule)
+        st["detect_calls"] += 1
+        st["detect_hits"] += hit
+        st["detect_s"] += secs
+
+    def extract(self, rule: Rule, secs: float, ok: bool) -> None:
+        st = self._st(rule)
+        st["extract_ok" if ok else "parse_fail"] += 1
+        st["extract_s"] += secs
+
+    def handler(self, rule: Rule, secs: float) -> None:
+        self._st(rule)["handler_s"] += secs
+
+    def report(self, tagged: Optional[pd.DataFrame] = None) -> pd.DataFrame:
+        """Per-rule DataFrame in priority order; pass the tagged frame to add row-level coverage."""
+        rep = pd.DataFrame.from_dict(self.stats, orient="index")
+        if rep.empty:
+            return rep
+        rep.index.name = "rule"
+        rep.insert(0, "priority", pd.Series(self.priority))
+        for c in ("detect", "extract", "handler"):
+            rep[f"{c}_ms"] = rep.pop(f"{c}_s") * 1000.0
+        rep["hit_rate"] = rep["detect_hits"] / rep["detect_calls"].where(rep["detect_calls"] > 0)
+        rep["parse_fail_rate"] = rep["parse_fail"] / rep["detect_hits"].where(rep["detect_hits"] > 0)
+        rep["avg_detect_us"] = rep["detect_ms"] * 1000.0 / rep["detect_calls"].where(rep["detect_calls"] > 0)
+        if tagged is not None and "Tag" in tagged:
+            rep["rows"] = tagged["Tag"].value_counts().reindex(rep.index).fillna(0).astype(int)
+            rep["row_share"] = rep["rows"] / len(tagged) if len(tagged) else np.nan
+        return rep.sort_values("priority", kind="stable").reset_index()
+
+    def reset(self) -> None:
+        self.__init__()
+
+def _apply_rules_profiled(s: str, rules: List[Rule], profiler: RuleProfiler) -> Dict[str, Any]:
+    profiler.lines += 1
+    for rule in sorted(rules, key=lambda r: r.priority):
+        t0 = perf_counter()
+        hit = rule.detect.search(s)
+        profiler.detect(rule, perf_counter() - t0, hit is not None)
+        if hit:
+            return _run_rule(rule, s, profiler)
     return {"Tag": None, "Flags": None, "event_meta": {}}
 
+# ---------- Compiled dispatcher (one detect scan per line) ----------
+# All DETECT patterns are folded (in priority order) into ONE alternation:
+#   (?:D_0)(?P<_r0>) | (?:D_1)(?P<_r1>) | ...
+# re tries alternatives left to right, so the first one that fires is exactly the
+# rule apply_rules would pick. Unanchored detects get a lazy (?s:.*?) lead so that
+# `match` behaves like `search`; the empty marker group tells us which rule won.
+_LEAD_FLAGS = re.compile(r'^\(\?[aiLmsux]+\)')
+_SCOPED_FLAGS = ((re.IGNORECASE, "i"), (re.MULTILINE, "m"), (re.DOTALL, "s"), (re.VERBOSE, "x"))
+
+def _scoped_pattern(p: Pattern) -> str:
+    """Rewrite a compiled pattern as a self-contained group carrying its own flags."""
+    body = _LEAD_FLAGS.sub("", p.pattern, count=1)
+    letters = "".join(c for f, c in _SCOPED_FLAGS if p.flags & f)
+    if p.flags & re.VERBOSE:
+        body += "\n"    # a trailing '# comment' must not swallow the closing ')'
+    return f"(?{letters}:{body})" if letters else f"(?:{body})"
+
+def _is_anchored(p: Pattern) -> bool:
+    return _LEAD_FLAGS.sub("", p.pattern, count=1).lstrip().startswith("^")
+
+# ---------- Template-shape cache ----------
+# Most lines differ only by incident/location IDs and DT stamps, e.g.
+#   "Location [2049692667] Energized Date has been set to [10/10/2024 05:15:00]"
+# shape_key masks every digit to '0' (length kept), so IDs, counts and timestamps collapse
+# into one shape. The winning rule is decided once per shape; extract still runs per line.
+# Exact as long as no DETECT tells digits apart (digit literals, partial [0-5] ranges,
+# backrefs) -- checked per rule by _digit_blind, otherwise the shape cache is switched off.
+_SHAPE_MASK = str.maketrans("0123456789", "0000000000")
+
+def shape_key(text: str) -> str:
+    return (text or "").strip().translate(_SHAPE_MASK)
+
+_DIGIT_BLIND: Dict[tuple, bool] = {}         # (pattern, flags) -> verdict; seeded by load_rule_registry
+
+def _digit_blind(p: Pattern) -> bool:
+    """True if `p` cannot distinguish one digit from another."""
+    key = (p.pattern, p.flags)
+    if key not in _DIGIT_BLIND:
+        try:
+            _DIGIT_BLIND[key] = _digit_blind_seq(_sre_parse.parse(p.pattern, p.flags))
+        except Exception:
+            _DIGIT_BLIND[key] = False
+    return _DIGIT_BLIND[key]
+
+def _digit_blind_seq(seq) -> bool:
+    for op, av in seq:
+        name = str(op)
+        if name in ("LITERAL", "NOT_LITERAL") and chr(av).isdigit():
+            return False
+        if name in ("GROUPREF", "GROUPREF_EXISTS"):
+            return False
+        if name in ("RANGE", "RANGE_UNI_IGNORE"):
+            lo, hi = av
+            if lo <= ord("9") and hi >= ord("0") and not (lo <= ord("0") and hi >= ord("9")):
+                return False
+        if name == "IN":
+            if not _digit_blind_seq(av):
+                return False
+        elif not all(_digit_blind_seq(sub) for sub in _subpatterns(av)):
+            return False
+    return True
+
+def _subpatterns(av):
+    if isinstance(av, _sre_parse.SubPattern):
+        yield av
+    elif isinstance(av, (tuple, list)):
+        for x in av:
+            yield from _subpatterns(x)
+
+# The first _DISPATCH_WARMUP lines go through the prefiltered per-rule loop, which compiles
+# only the (lazy) detects it reaches; after that the one-scan alternation is compiled. A
+# one-row call doesn't pay for compiling all detects plus the merged pattern.
+_DISPATCH_WARMUP = 256
+
+class RuleDispatcher:
+    """Rules pre-sorted once; `winner` finds the first detect that fires in a single scan."""
+
+    def __init__(self, rules: List[Rule], cache_size: int = 200_000,
+                 shapes: bool = True, max_shapes: int = 100_000):
+        self.rules: List[Rule] = sorted(rules, key=lambda r: r.priority)
+        # Shape cache: shape_key -> [winning rule (or None), lines seen]
+        self.shape_unsafe = [r.name for r in self.rules if not _digit_blind(r.detect)]
+        self.shapes = shapes and not self.shape_unsafe
+        self.max_shapes = max_shapes
+        self._shapes: Dict[str, list] = {}
+        self._shape_hits = self._shape_misses = 0
+        # Value-level memo: FOLLOWUP_DESC repeats millions of times. Lives on the dispatcher,
+        # so editing/adding a rule (-> new dispatcher) can never serve stale tags.
+        # NOTE: cached results are shared objects -- treat event_meta dicts as read-only.
+        self.apply_cached = lru_cache(maxsize=cache_size)(self.apply)
+        self._combined: Optional[Pattern] = None
+        self._combined_src: Optional[str] = None
+        self._warmup = _DISPATCH_WARMUP
+        self._first = {r: _rule_facts(r)[0] for r in self.rules}
+        # Capture groups/backrefs inside a detect would be renumbered by the merge -> keep the loop.
+        # Read from the pattern text: .groups would compile every (lazy) detect up front.
+        if not any(_scan_pattern(r.detect)[1] for r in self.rules):
+            self._combined_src = "|".join(
+                ("" if _is_anchored(r.detect) else "(?s:.*?)") + _scoped_pattern(r.detect) + f"(?P<_r{i}>)"
+                for i, r in enumerate(self.rules)
+            )
+
+    def winner(self, s: str) -> Optional[Rule]:
+        if self._combined_src is not None:
+            self._warmup -= 1
+            if self._warmup < 0:           # enough lines to pay for compiling the alternation
+                try:
+                    self._combined = re.compile(self._combined_src)
+                except re.error:
+                    self._combined = None
+                self._combined_src = None
+        if self._combined is None:
+            return next((r for r in self.rules
+                         if (self._first[r] is None or s[:1] in self._first[r]) and r.detect.search(s)), None)
+        m = self._combined.match(s)
+        return self.rules[int(m.lastgroup[2:])] if m else None
+
+    def shape_winner(self, s: str) -> Optional[Rule]:
+        key = s.translate(_SHAPE_MASK)
+        hit = self._shapes.get(key)
+        if hit is not None:
+            self._shape_hits += 1
+            hit[1] += 1
+            return hit[0]
+        self._shape_misses += 1
+        rule = self.winner(s)
+        if len(self._shapes) < self.max_shapes:
+            self._shapes[key] = [rule, 1]
+        return rule
+
+    def apply(self, text: str) -> Dict[str, Any]:
+        """Same contract as apply_rules(text, rules), but datetimes stay RawDT (see resolve_dates)."""
+        s = (text or "").strip()
+        rule = self.shape_winner(s) if self.shapes else self.winner(s)
+        if rule is None:
+            return {"Tag": None, "Flags": None, "event_meta": {}}
+        return _run_rule(rule, s)
+
+    def cache_stats(self) -> Dict[str, Any]:
+        ci = self.apply_cached.cache_info()
+        seen = ci.hits + ci.misses
+        return {"hits": ci.hits, "misses": ci.misses, "size": ci.currsize, "maxsize": ci.maxsize,
+                "hit_rate": (ci.hits / seen) if seen else None}
+
+    def shape_stats(self) -> Dict[str, Any]:
+        seen = self._shape_hits + self._shape_misses
+        return {"enabled": self.shapes, "unsafe_rules": self.shape_unsafe,
+                "shapes": len(self._shapes), "max_shapes": self.max_shapes,
+                "hits": self._shape_hits, "misses": self._shape_misses,
+                "hit_rate": (self._shape_hits / seen) if seen else None}
+
+    def shape_table(self) -> pd.DataFrame:
+        """One row per cached shape: shape_key, winning Tag, distinct lines that mapped to it."""
+        rows = [(k, (r.name if r else None), n) for k, (r, n) in self._shapes.items()]
+        return (pd.DataFrame(rows, columns=["shape_key", "Tag", "n_lines"])
+                  .sort_values("n_lines", ascending=False, ignore_index=True))
+
+@lru_cache(maxsize=8)
+def _compile_rules_cached(rules_t: tuple, shapes: bool) -> RuleDispatcher:
+    return RuleDispatcher(list(rules_t), shapes=shapes)
+
+def compile_rules(rules: List[Rule], shapes: bool = True) -> RuleDispatcher:
+    """Dispatcher for the current registry; rebuilt automatically when rules are added/changed."""
+    return _compile_rules_cached(tuple(rules), shapes)
+
+# ---------- Adaptive rule order ----------
+# Only the relative order of rules whose detects can BOTH fire on some line matters. Two
+# anchored detects are provably exclusive when their fixed-width prefixes disagree at some
+# position (e.g. ^\s*Crew\s*\[ vs ^\s*Call\s+reported); \s*/\s+ runs followed by
+# non-space characters on both sides are stepped over (both must eat the whole run).
+# Or when the sets of possible FIRST characters are disjoint -- that one looks through
+# optional groups and branches, e.g. ^\s*(?:SCADA|ADMS)?\s*Call -> {S, A, C}.
+# Anything else (unanchored, \d/\w/negated classes up front) counts as a conflict and
+# keeps its order.
+# learn_rule_order moves frequent rules forward within those constraints, so tags stay
+# identical while fewer detects run per line. Priorities are reassigned from the same
+# pool of numbers, so ruleset_version changes (retag_changed will re-tag; tags won't move).
+_WS_CHAR = re.compile(r"\s")
+
+def _charset(op, av, icase: bool) -> Optional[frozenset]:
+    """Chars a single-width node can match, or None if not a small explicit set."""
+    name = str(op)
+    if name in ("LITERAL", "LITERAL_IGNORE", "LITERAL_UNI_IGNORE"):
+        chars = {chr(av)}
+    elif name == "IN":
+        chars = set()
+        for iop, iav in av:
+            iname = str(iop)
+            if iname in ("LITERAL", "LITERAL_IGNORE", "LITERAL_UNI_IGNORE"):
+                chars.add(chr(iav))
+            elif iname in ("RANGE", "RANGE_UNI_IGNORE") and iav[1] - iav[0] <= 256:
+                chars.update(chr(c) for c in range(iav[0], iav[1] + 1))
+            else:                          # NEGATE, categories (\d, \s, \w: Unicode-wide)
+                return None
+    else:
+        return None
+    if icase:
+        folded = [_case_variants(c) for c in chars]
+        if any(f is None for f in folded):
+            return None
+        chars = set().union(*folded)
+    return frozenset(chars)
+
+# Non-ASCII chars re.IGNORECASE matches against an ASCII letter (I WITH DOT, DOTLESS I,
+# LONG S, KELVIN SIGN); the case-insensitive sets below stick to ASCII otherwise.
+_ASCII_FOLDS = {"i": "\u0130\u0131", "k": "\u212a", "s": "\u017f"}
+
+def _case_variants(c: str) -> Optional[set]:
+    """Every char re.IGNORECASE lets match c; None for non-ASCII c (not tabulated)."""
+    if not c.isascii():
+        return None
+    low = c.lower()
+    return {low, c.upper(), *_ASCII_FOLDS.get(low, "")}
+
+def _is_ws_class(sub: list) -> bool:
+    return len(sub) == 1 and str(sub[0][0]) == "IN" and [(str(o), str(a)) for o, a in sub[0][1]] == [("CATEGORY", "CATEGORY_SPACE")]
+
+def _detect_prefix(p: Pattern) -> Optional[list]:
+    """Fixed-width prefix of an anchored detect: charsets and ("ws", min, max) runs."""
+    try:
+        tree = list(_sre_parse.parse(p.pattern, p.flags))
+    except Exception:
+        return None
+    if not tree or str(tree[0][0]) != "AT" or str(tree[0][1]) not in ("AT_BEGINNING", "AT_BEGINNING_STRING"):
+        return None
+    icase = bool(p.flags & re.IGNORECASE)
+    out = []
+    for op, av in tree[1:]:
+        if str(op) in ("MAX_REPEAT", "MIN_REPEAT"):
+            lo, hi, sub = av
+            sub = list(sub)
+            if _is_ws_class(sub):
+                if not out and lo == 0:    # lines are stripped: a leading \s* matches ""
+                    continue
+                out.append(("ws", lo, hi))
+                continue
+            break
+        chars = _charset(op, av, icase)
+        if chars is None:
+            break
+        out.append(chars)
+    return out
+
+def _first_chars(seq, icase: bool) -> tuple:
+    """(chars the match can start with, can match empty) at the start of a stripped line.
+    chars None = unknown. Whitespace can't come first, so \s* is empty and \s+ impossible."""
+    acc = set()
+    for op, av in seq:
+        name = str(op)
+        chars = _charset(op, av, icase)
+        if chars is not None:
+            return frozenset(acc | chars), False
+        if name == "SUBPATTERN":
+            first, empty = _first_chars(av[-1], icase)
+        elif name == "BRANCH":
+            alts = [_first_chars(alt, icase) for alt in av[1]]
+            if any(f is None for f, _ in alts):
+                return None, False
+            first, empty = frozenset().union(*(f for f, _ in alts)), any(e for _, e in alts)
+        elif name in ("MAX_REPEAT", "MIN_REPEAT"):
+            lo, hi, sub = av
+            sub = list(sub)
+            if _is_ws_class(sub):
+                first, empty = frozenset(), True
+                if lo > 0:
+                    return frozenset(acc), False
+            else:
+                first, empty = _first_chars(sub, icase)
+                empty = empty or lo == 0
+        elif name == "AT" and str(av) in ("AT_BEGINNING", "AT_BEGINNING_STRING", "AT_BOUNDARY"):
+            continue
+        else:
+            return None, False
+        if first is None:
+            return None, False
+        acc |= first
+        if not empty:
+            return frozenset(acc), False
+    return frozenset(acc), True
+
+def _detect_sig(p: Pattern) -> tuple:
+    """(first chars or None, fixed-width prefix or None) of an anchored detect."""
+    pre = _detect_prefix(p)
+    if pre is None:
+        return None, None
+    first, empty = _first_chars(list(_sre_parse.parse(p.pattern, p.flags)), bool(p.flags & re.IGNORECASE))
+    return (None if empty else first), pre
+
+def _exclusive_sig(a: tuple, b: tuple) -> bool:
+    if a[0] is not None and b[0] is not None and not a[0] & b[0]:
+        return True
+    return _exclusive(a[1], b[1])
+
+def _exclusive(a: Optional[list], b: Optional[list]) -> bool:
+    if a is None or b is None:
+        return False
+    for i, (x, y) in enumerate(zip(a, b)):
+        if isinstance(x, frozenset) and isinstance(y, frozenset):
+            if not x & y:
+                return True
+            continue                       # both consumed exactly one char
+        # whitespace run on both sides, then a non-space char on both -> same split point
+        nxt = (a[i + 1] if i + 1 < len(a) else None, b[i + 1] if i + 1 < len(b) else None)
+        if (isinstance(x, tuple) and isinstance(y, tuple)
+                and all(isinstance(n, frozenset) and not any(_WS_CHAR.match(c) for c in n) for n in nxt)):
+            continue
+        return False
+    return False
+
+def rule_conflicts(rule_list: List[Rule]) -> set:
+    """Pairs of rule names whose detects may both fire (their relative order is fixed)."""
+    ordered = sorted(rule_list, key=lambda r: r.priority)
+    sig = [_detect_sig(r.detect) for r in ordered]
+    return {(ordered[i].name, ordered[j].name)
+            for i in range(len(ordered)) for j in range(i + 1, len(ordered))
+            if not _exclusive_sig(sig[i], sig[j])}
+
+def _constrained_order(rule_list: List[Rule], rank: Callable[[Rule], float]) -> List[Rule]:
+    """Topological order of the conflict graph, lowest rank first among the ready rules."""
+    ordered = sorted(rule_list, key=lambda r: r.priority)
+    sig = [_detect_sig(r.detect) for r in ordered]
+    blockers = [{i for i in range(j) if not _exclusive_sig(sig[i], sig[j])} for j in range(len(ordered))]
+    placed, out = set(), []
+    while len(out) < len(ordered):
+        ready = [j for j in range(len(ordered)) if j not in placed and blockers[j] <= placed]
+        j = min(ready, key=lambda j: (rank(ordered[j]), j))
+        placed.add(j)
+        out.append(ordered[j])
+    pool = sorted(r.priority for r in ordered)
+    return [dc_replace(r, priority=pr) for r, pr in zip(out, pool)]
+
+def learn_rule_order(rule_list: List[Rule], profiler: RuleProfiler) -> List[Rule]:
+    """Rules re-sequenced by detect hits from a profiling run (same tags, fewer detects)."""
+    hits = {n: st["detect_hits"] for n, st in profiler.stats.items()}
+    return _constrained_order(rule_list, lambda r: -hits.get(r.name, 0))
+
+def save_rule_order(path: str, rule_list: List[Rule]) -> None:
+    order = [r.name for r in sorted(rule_list, key=lambda r: r.priority)]
+    Path(path).write_text(json.dumps({"ruleset_version": ruleset_version(rule_list), "order": order}, indent=1))
+
+def load_rule_order(path: str, rule_list: List[Rule]) -> List[Rule]:
+    """Apply a saved order to the current rules. Safe after rule edits: conflicts are
+    re-checked, and rules the file doesn't know keep their place behind the known ones."""
+    saved = json.loads(Path(path).read_text())["order"]
+    pos = {n: i for i, n in enumerate(saved)}
+    return _constrained_order(rule_list, lambda r: pos.get(r.name, len(pos)))
+
+# ---------- Prefilter + fused detect/extract (per-rule loop) ----------
+# rule_plan(rule) is computed once per Rule, from the pattern strings only:
+#   first -- when an anchored detect starts with a literal (^\s*Crew...), the chars a
+#            stripped line must start with, so s[:1] not in first skips the regex entirely
+#            (the "startswith('Crew')" test). Anything else up front -> None.
+#   fused -- when detect and extract are both anchored at the line start (no top-level |,
+#            no MULTILINE) and the detect has no capture groups:
+#               ^(?=detect)(?:extract(?P<_fz>))?
+#            one call decides the rule AND yields the extract groups (numbering unchanged).
+#            Match with _fz unset -> detect fired, extract can't match: PARSE_FAIL.
+# The one-scan dispatcher path doesn't use this; the loop (dispatch=False, profiling-free)
+# and regex_with_his.apply_rules do.
+_FUSED_MARK = "_fz"
+
+@dataclass(frozen=True)
+class RulePlan:
+    first: Optional[frozenset]
+    fused: Optional[Pattern]
+
+def _scan_pattern(p: Pattern) -> tuple:
+    """(has a top-level |, has capture groups) from the pattern string."""
+    body, verbose = p.pattern, bool(p.flags & re.VERBOSE)
+    depth, alt, groups, i, in_class = 0, False, False, 0, False
+    while i < len(body):
+        c = body[i]
+        if c == "\\":
+            i += 2
+            continue
+        if in_class:
+            in_class = c != "]"
+        elif c == "[":
+            in_class = True
+            i += 1
+            if body[i:i + 1] == "^":
+                i += 1
+            if body[i:i + 1] == "]":       # leading ] is a literal
+                i += 1
+            continue
+        elif c == "#" and verbose:
+            j = body.find("\n", i)
+            i = len(body) if j < 0 else j
+            continue
+        elif c == "(":
+            depth += 1
+            if body[i + 1:i + 2] != "?" or body[i + 1:i + 4] == "?P<":
+                groups = True
+        elif c == ")":
+            depth -= 1
+        elif c == "|" and depth == 0:
+            alt = True
+        i += 1
+    return alt, groups
+
+def _anchored_body(p: Pattern) -> Optional[str]:
+    """Pattern text after the leading ^ (inline flags dropped), or None if not anchored."""
+    if p.flags & re.MULTILINE or _scan_pattern(p)[0]:
+        return None
+    body = _LEAD_FLAGS.sub("", p.pattern, count=1)
+    if p.flags & re.VERBOSE:
+        body = body.lstrip()
+    return body[1:] if body.startswith("^") else None
+
+_HEAD = re.compile(r'(?:\\s\*)?(?:\\([^\w\s])|([^\\.^$*+?{}\[\]|()\s]))(?![?*{])')
+_HEAD_X = re.compile(r'\s*(?:\\s\*\s*)?(?:\\([^\w\s])|([^\\.^$*+?{}\[\]|()\s#]))(?!\s*[?*{])')
+
+def _literal_first(p: Pattern) -> Optional[frozenset]:
+    """Chars a stripped line must start with for `p` to match: ^, an optional \s*, then a
+    plain or escaped-punctuation literal that no ?, * or {..} makes optional. Else None."""
+    body = _anchored_body(p)
+    if body is None or p.flags & re.LOCALE:
+        return None
+    m = (_HEAD_X if p.flags & re.VERBOSE else _HEAD).match(body)
+    if m is None:
+        return None
+    c = m.group(1) or m.group(2)
+    chars = _case_variants(c) if p.flags & re.IGNORECASE else {c}
+    return None if chars is None else frozenset(chars)
+
+def _fusable(rule: Rule) -> bool:
+    d, e = rule.detect, rule.extract
+    return (e is not None and not (d.flags | e.flags) & (re.ASCII | re.LOCALE)
+            and _anchored_body(d) is not None and _anchored_body(e) is not None
+            and not _scan_pattern(d)[1] and f"(?P<{_FUSED_MARK}>" not in e.pattern)
+
+def _fused_pattern(rule: Rule) -> Optional[Pattern]:
+    try:
+        return re.compile(f"^(?={_scoped_pattern(rule.detect)})"
+                          f"(?:{_scoped_pattern(rule.extract)}(?P<{_FUSED_MARK}>))?")
+    except re.error:
+        return None
+
+# id(rule) -> (rule, ...): identity lookups, no Rule hashing in the hot loop
+_FACTS: Dict[int, tuple] = {}                # (rule, first, fusable); seeded by load_rule_registry
+_PLANS: Dict[int, tuple] = {}                # (rule, plan)
+
+def _rule_facts(rule: Rule) -> tuple:
+    """(first chars, fusable) -- the pattern analysis, without compiling anything."""
+    hit = _FACTS.get(id(rule))
+    if hit is not None and hit[0] is rule:
+        return hit[1], hit[2]
+    first, fusable = _literal_first(rule.detect), _fusable(rule)
+    _FACTS[id(rule)] = (rule, first, fusable)
+    return first, fusable
+
+def rule_plan(rule: Rule) -> RulePlan:
+    hit = _PLANS.get(id(rule))
+    if hit is not None and hit[0] is rule:
+        return hit[1]
+    first, fusable = _rule_facts(rule)
+    plan = RulePlan(first, _fused_pattern(rule) if fusable else None)
+    _PLANS[id(rule)] = (rule, plan)
+    return plan
+
+# ---------- Prebuilt rule registry ----------
+# save_rule_registry compiles (= validates) every rule pattern and stores the per-rule
+# analysis above -- first chars, fusability, digit-blindness -- keyed by rule_fingerprint.
+# load_rule_registry reuses entries whose fingerprint still matches, so a fresh process skips
+# the pattern scans and the digit-blindness parse-tree walk; edited rules are re-analysed
+# on first use as usual. Tied to the Python minor version (re's parser).
+REGISTRY_FILE = "rule_registry.json"
+
+def _py_version() -> str:
+    return f"{sys.version_info[0]}.{sys.version_info[1]}"
+
+def save_rule_registry(path: str = REGISTRY_FILE, rule_list: Optional[List[Rule]] = None) -> Dict[str, Any]:
+    rule_list = rules if rule_list is None else rule_list
+    entries = {}
+    for r in rule_list:
+        for p in (r.detect, r.extract):
+            if p is None:
+                continue
+            try:
+                if isinstance(p, LazyPattern):
+                    p.compiled()
+            except re.error as e:
+                raise ValueError(f"rule {r.name!r}: bad pattern ({e})") from e
+        first, fusable = _rule_facts(r)
+        entries[rule_fingerprint(r)["fp"]] = {"name": r.name, "first": None if first is None else "".join(sorted(first)),
+                                              "fused": fusable, "digit_blind": _digit_blind(r.detect)}
+    reg = {"python": _py_version(), "ruleset_version": ruleset_version(rule_list), "rules": entries}
+    tmp = Path(path).with_suffix(".tmp")
+    tmp.write_text(json.dumps(reg, indent=1))
+    tmp.replace(path)
+    print(f"[info] rule registry: {len(entries)} rules validated -> {path}")
+    return reg
+
+def load_rule_registry(path: str = REGISTRY_FILE, rule_list: Optional[List[Rule]] = None) -> int:
+    """Seed the analysis caches from a saved registry; returns how many rules were reused."""
+    rule_list = rules if rule_list is None else rule_list
+    if not Path(path).exists():
+        return 0
+    reg = json.loads(Path(path).read_text())
+    if reg.get("python") != _py_version():
+        print(f"[warn] rule registry built for Python {reg.get('python')}, running {_py_version()} -> ignored")
+        return 0
+    used = 0
+    for r in rule_list:
+        e = reg["rules"].get(rule_fingerprint(r)["fp"])
+        if e is None or "fused" not in e:  # missing, or written by an older layout
+            continue
+        _FACTS[id(r)] = (r, None if e["first"] is None else frozenset(e["first"]), e["fused"])
+        _DIGIT_BLIND[(r.detect.pattern, r.detect.flags)] = e["digit_blind"]
+        used += 1
+    print(f"[info] rule registry: reused {used} of {len(rule_list)} rules")
+    return used
+
 # ---------- ETR rules ----------
-SYSTEM_DETECT = re.compile(r'(?i)^\s*SYSTEM\s+ETR\b')
-SYSTEM_EXTRACT = re.compile(
+SYSTEM_DETECT = lazy_compile(r'(?i)^\s*SYSTEM\s+ETR\b')
+SYSTEM_EXTRACT = lazy_compile(
     rf'''(?ix)
     ^\s*SYSTEM\s+ETR-?\s*Set\s+ETR\s+for\s+@\s*(?P<loc>.+?)\s+
     To\s+(?:(?P<to_type>SYS)\s+ETR|ETR\s+(?P<to_type_alt>SYS))\s*[:\-]?\s*
@@ -1497,11 +2290,11 @@ def sys_handler(m: re.Match) -> Dict[str, Any]:
         "etr_from_type": None,
         "etr_from_ts": None,
         "etr_to_type": to_type,
-        "etr_to_ts": coerce_dt(m.group("to_dt")),
+        "etr_to_ts": defer_dt(m.group("to_dt")),
     }
 
-MAN_DETECT = re.compile(r'(?i)^\s*MANUAL\s+ETR\b')
-MAN_EXTRACT = re.compile(
+MAN_DETECT = lazy_compile(r'(?i)^\s*MANUAL\s+ETR\b')
+MAN_EXTRACT = lazy_compile(
     rf'''(?ix)
     ^\s*MANUAL\s+ETR-?\s*Set\s+ETR\s+for\s+@\s*(?P<loc>.+?)\s+
     From\s+ETR\s+(?P<from_type>MAN|SYS)\s*[:\-]?\s*(?P<from_dt>{DT})\s+
@@ -1511,48 +2304,1128 @@ MAN_EXTRACT = re.compile(
 def man_handler(m: re.Match) -> Dict[str, Any]:
     from_type = (m.group("from_type") or "").upper()
     to_type = (m.group("to_type") or m.group("to_type_alt") or "MAN").upper()
-    from_dt = coerce_dt(m.group("from_dt"))
-    to_dt = coerce_dt(m.group("to_dt"))
-    flags = None
-    if pd.notna(from_dt) and pd.notna(to_dt) and to_dt < from_dt:
-        flags = "TO_BEFORE_FROM"
     return {
         "cat": "ETR",
         "kind": "MANUAL",
         "loc": m.group("loc"),
         "etr_from_type": from_type,
-        "etr_from_ts": from_dt,
+        "etr_from_ts": defer_dt(m.group("from_dt")),
         "etr_to_type": to_type,
-        "etr_to_ts": to_dt,
-        "_flags": flags,   # bubble up to Flags
+        "etr_to_ts": defer_dt(m.group("to_dt")),
     }
 
+def etr_finalize(meta: Dict[str, Any]) -> None:
+    """After date parsing: flag an ETR moved to before its previous value."""
+    from_dt, to_dt = meta.get("etr_from_ts"), meta.get("etr_to_ts")
+    if from_dt is not None and to_dt is not None and pd.notna(from_dt) and pd.notna(to_dt) and to_dt < from_dt:
+        meta["_flags"] = "TO_BEFORE_FROM"   # bubble up to Flags
+
+ETR_SCHEMA = {**BASE_SCHEMA, "loc": "string", "etr_from_type": "category", "etr_from_ts": "datetime64[ns]",
+              "etr_to_type": "category", "etr_to_ts": "datetime64[ns]"}
+
 rules: List[Rule] = [
-    Rule("SYSTEM ETR", 10, SYSTEM_DETECT, SYSTEM_EXTRACT, sys_handler),
-    Rule("MANUAL ETR", 20, MAN_DETECT, MAN_EXTRACT, man_handler),
+    Rule("SYSTEM ETR", 10, SYSTEM_DETECT, SYSTEM_EXTRACT, sys_handler, schema=ETR_SCHEMA, finalize=etr_finalize),
+    Rule("MANUAL ETR", 20, MAN_DETECT, MAN_EXTRACT, man_handler, schema=ETR_SCHEMA, finalize=etr_finalize),
     # Add more below (Incident Status, Calls, Crew, GO Created/Updated, etc.)
 ]
 
+# ---------- Process-pool tagging ----------
+# Each worker receives the rule registry ONCE (initializer) and builds its own dispatcher;
+# chunks of distinct strings go out, result lists come back in submission order, so the
+# output is identical to the serial path. Handlers are pickled by reference: fine with the
+# default 'fork' start method on Linux; with 'spawn' the rules must live in an importable module.
+_WORKER_TAG: Optional[Callable[[str], Dict[str, Any]]] = None
+
+def _init_tag_worker(rules_t: tuple, dispatch: bool, shapes: bool) -> None:
+    global _WORKER_TAG
+    if dispatch:
+        _WORKER_TAG = RuleDispatcher(list(rules_t), shapes=shapes).apply
+    else:
+        _WORKER_TAG = lambda s: _apply_rules_raw(s, list(rules_t))
+
+def _tag_chunk(chunk: List[str]) -> List[Dict[str, Any]]:
+    return [_WORKER_TAG(s) for s in chunk]
+
+def tag_values_parallel(values: List[str], rule_list: List[Rule], workers: int,
+                        chunksize: int = 20_000, dispatch: bool = True, shapes: bool = True) -> List[Dict[str, Any]]:
+    """apply_rules over `values` on a process pool; result i belongs to values[i]."""
+    chunks = [values[i:i + chunksize] for i in range(0, len(values), chunksize)]
+    results: List[Dict[str, Any]] = []
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_tag_worker,
+                             initargs=(tuple(rule_list), dispatch, shapes)) as ex:
+        for part in ex.map(_tag_chunk, chunks):
+            results.extend(part)
+    return results
+
+# ---------- Arrow prefilter (vectorized DETECT) ----------
+# Every DETECT runs once over the whole Arrow string column with pyarrow.compute
+# (RE2, outside the interpreter) -> rows x rules candidate bitmap. Python only touches rows
+# with at least one candidate, and only re-checks the candidate rules, in priority order.
+# RE2 is ASCII-minded (\s, \b, \d) and lacks VERBOSE/lookarounds, so the bitmap is only
+# trusted on plain printable-ASCII rows; other rows, and rules RE2 cannot compile, stay
+# candidates for every rule and are decided by `re` exactly as before.
+_ARROW_TRUSTED_TEXT = r'^[\x20-\x7e\t\n\r\x0c]*$'
+_RE2_FLAGS = ((re.IGNORECASE, "i"), (re.MULTILINE, "m"), (re.DOTALL, "s"))
+
+def arrow_candidates(values, rule_list: List[Rule]):
+    """(bitmap, ordered_rules): bitmap[i, j] is False only if ordered_rules[j] cannot fire on values[i]."""
+    if pa is None:
+        raise ImportError("prefilter=True needs pyarrow")
+    ordered = sorted(rule_list, key=lambda r: r.priority)
+    arr = values if isinstance(values, (pa.Array, pa.ChunkedArray)) else pa.array(list(values), type=pa.string())
+    arr = pc.fill_null(arr, "")
+    untrusted = ~pc.match_substring_regex(arr, _ARROW_TRUSTED_TEXT).to_numpy(zero_copy_only=False)
+    stripped = pc.utf8_trim_whitespace(arr)      # apply_rules strips before detecting
+
+    bits = np.ones((len(arr), len(ordered)), dtype=bool)
+    for j, r in enumerate(ordered):
+        if r.detect.flags & re.VERBOSE:
+            continue
+        letters = "".join(c for f, c in _RE2_FLAGS if r.detect.flags & f)
+        pattern = (f"(?{letters})" if letters else "") + _LEAD_FLAGS.sub("", r.detect.pattern, count=1)
+        try:
+            hit = pc.match_substring_regex(stripped, pattern)
+        except (pa.ArrowInvalid, pa.ArrowNotImplementedError):
+            continue
+        bits[:, j] = hit.to_numpy(zero_copy_only=False) | untrusted
+    return bits, ordered
+
+def tag_values_prefiltered(values, rule_list: List[Rule]) -> List[Dict[str, Any]]:
+    """apply_rules over `values` (list or Arrow string array) with the Arrow DETECT prefilter."""
+    bits, ordered = arrow_candidates(values, rule_list)
+    results: List[Dict[str, Any]] = [None] * len(bits)
+    cand_rows = np.flatnonzero(bits.any(axis=1))
+    if isinstance(values, (pa.Array, pa.ChunkedArray)):
+        texts = values.take(pa.array(cand_rows, type=pa.int64())).to_pylist()
+    else:
+        texts = [values[i] for i in cand_rows]
+    for i, text in zip(cand_rows, texts):
+        s = (text or "").strip()
+        for j in np.flatnonzero(bits[i]):
+            if ordered[j].detect.search(s):
+                results[i] = _run_rule(ordered[j], s)
+                break
+    for i, r in enumerate(results):
+        if r is None:
+            results[i] = {"Tag": None, "Flags": None, "event_meta": {}}
+    return results
+
+# ---------- Typed meta columns ----------
+# output="columns": one meta_<key> column per key any rule's schema declares (null where the
+# winning rule doesn't set it), typed per the schema. Keys a handler returns but no schema
+# declares still come out, as object columns. Columns are sparse in the building: each key's
+# typed array holds only the DISTINCT strings whose result sets it (that rule family's rows),
+# and one take() broadcasts it to every row with nulls elsewhere -- no per-row dicts, and no
+# per-key pass over strings that belong to other families.
+META_PREFIX = "meta_"
+
+def meta_schema(rule_list: List[Rule]) -> Dict[str, str]:
+    """Union of the rules' schemas (priority order); a key must have one dtype across rules."""
+    merged: Dict[str, str] = {}
+    for rule in sorted(rule_list, key=lambda r: r.priority):
+        for key, dtype in (rule.schema or {}).items():
+            if merged.setdefault(key, dtype) != dtype:
+                raise ValueError(f"event_meta key {key!r}: rule {rule.name!r} declares {dtype}, "
+                                 f"another rule declares {merged[key]}")
+    return merged
+
+def _object_array(values: list) -> np.ndarray:
+    arr = np.empty(len(values), dtype=object)
+    for i, v in enumerate(values):   # element-wise so list values stay intact
+        arr[i] = v
+    return arr
+
+def _typed_array(values: list, dtype: str):
+    if dtype.startswith("datetime64"):
+        ts = pd.to_datetime(pd.Series(values, dtype=object), errors="coerce")
+        if dtype == "datetime64[ns]":   # typo'd years (e.g. 2924) don't fit ns -> NaT
+            ts = ts.where(ts.between(pd.Timestamp.min, pd.Timestamp.max))
+        return ts.astype(dtype).array
+    if dtype == "category":
+        return pd.Categorical(values)
+    if dtype == "object":
+        return _object_array(values)
+    return pd.array(values, dtype=dtype)
+
+def _meta_columns(metas: List[Dict[str, Any]], codes: np.ndarray, index: pd.Index,
+                  schema: Dict[str, str]) -> Dict[str, pd.Series]:
+    cols = dict(schema)
+    where: Dict[str, List[int]] = {}       # key -> distinct strings whose result sets it
+    for i, meta in enumerate(metas):
+        for key in meta:
+            where.setdefault(key, []).append(i)
+            if key not in cols:
+                cols[key] = "object"
+    out = {}
+    for key, dtype in cols.items():
+        rows = where.get(key, [])
+        slot = np.full(len(metas), len(rows), dtype=np.intp)   # last value: the null every other row gets
+        slot[rows] = np.arange(len(rows))
+        values = _typed_array([metas[i][key] for i in rows] + [None], dtype) if rows else _null_array(dtype)
+        out[META_PREFIX + key] = pd.Series(values.take(slot.take(codes)), index=index)
+    return out
+
+@lru_cache(maxsize=None)
+def _null_array(dtype: str):
+    """[None] as a typed array (take() copies, so sharing it is safe)."""
+    return _typed_array([None], dtype)
+
+# ---------- Bounded-time matching (quarantine) ----------
+# Greedy/lazy patterns (CREW_REMARK_EXTRACT's DOTALL .*, MEMO_EXTRACT, e_fulletr LOC's
+# .+? + lookahead) can backtrack for seconds on a long pasted remark. With a Quarantine,
+# each distinct line gets budget_ms of wall time: a SIGALRM (setitimer) raises LineTimeout,
+# which CPython's regex engine honours mid-match, so the line is tagged
+# Flags="TIMEOUT" (Tag None) and recorded -- rule, stage, elapsed -- instead of stalling
+# the batch. Re-run quarantine.table() lines later with a bigger budget or a fixed pattern.
+# Signals need Unix + the main thread; elsewhere lines are only timed (not interrupted)
+# and slow ones still land in the table.
+class LineTimeout(Exception):
+    pass
+
+def _raise_timeout(signum, frame):
+    raise LineTimeout()
+
+class Quarantine:
+    """q = Quarantine(budget_ms=50); tag_dataframe_narrow(df, quarantine=q); q.table()"""
+
+    def __init__(self, budget_ms: float = 50.0):
+        self.budget_ms = budget_ms
+        self.rows: List[Dict[str, Any]] = []
+        self.lines = 0
+
+    def can_interrupt(self) -> bool:
+        return hasattr(signal, "setitimer") and threading.current_thread() is threading.main_thread()
+
+    def _record(self, text: str, rule: Optional[str], stage: str, secs: float, interrupted: bool) -> None:
+        self.rows.append({"rule": rule, "stage": stage, "elapsed_ms": secs * 1000.0,
+                          "interrupted": interrupted, "text_len": len(text), "text": text})
+
+    def map(self, fn: Callable[[str], Any], values, label: str = "", timeout_value: Any = None) -> list:
+        """[fn(v) for v in values] under the budget; timed-out values give timeout_value.
+        For taggers without a rule loop here, e.g. q.map(tag_etr_event, uniques, "etr")."""
+        out = []
+        self._start()
+        try:
+            for v in values:
+                where = [label or getattr(fn, "__name__", None), "call"]
+                ok, res = self._run(lambda: fn(v), str(v), where)
+                out.append(res if ok else timeout_value)
+        finally:
+            self._stop()
+        return out
+
+    def _start(self) -> None:
+        self._interrupt = self.can_interrupt()
+        if self._interrupt:
+            self._prev = signal.signal(signal.SIGALRM, _raise_timeout)
+        elif self.budget_ms:
+            print("[warn] Quarantine: no SIGALRM here (not Unix / not main thread) -> lines are timed, not interrupted")
+
+    def _stop(self) -> None:
+        if self._interrupt:
+            signal.setitimer(signal.ITIMER_REAL, 0)
+            signal.signal(signal.SIGALRM, self._prev)
+
+    def _run(self, call: Callable[[], Any], text: str, where: list) -> tuple:
+        """(finished, result); `where` = [rule, stage] is updated by the caller as it goes."""
+        self.lines += 1
+        budget = self.budget_ms / 1000.0
+        t0 = perf_counter()
+        try:
+            if self._interrupt:
+                signal.setitimer(signal.ITIMER_REAL, budget)
+            try:
+                res = call()
+            finally:
+                if self._interrupt:
+                    signal.setitimer(signal.ITIMER_REAL, 0)
+        except LineTimeout:
+            self._record(text, where[0], where[1], perf_counter() - t0, True)
+            return False, None
+        secs = perf_counter() - t0
+        if secs > budget:                  # no signals, or finished right at the deadline
+            self._record(text, where[0], where[1], secs, False)
+        return True, res
+
+    def table(self) -> pd.DataFrame:
+        return pd.DataFrame(self.rows, columns=["rule", "stage", "elapsed_ms", "interrupted", "text_len", "text"])
+
+    def reset(self) -> None:
+        self.__init__(self.budget_ms)
+
+_TIMEOUT = {"Tag": None, "Flags": "TIMEOUT", "event_meta": {}}
+
+def tag_values_guarded(values, rule_list: List[Rule], quarantine: Quarantine,
+                       dispatch: bool = True, shapes: bool = True) -> List[Dict[str, Any]]:
+    """apply_rules per value (datetimes deferred) under quarantine's per-line budget."""
+    d = compile_rules(rule_list, shapes=shapes) if dispatch else None
+    ordered = sorted(rule_list, key=lambda r: r.priority)
+
+    def tag(s: str, where: list) -> Dict[str, Any]:
+        if d is not None:
+            where[:] = [None, "detect"]    # one combined scan: no single rule to blame yet
+            rule = d.shape_winner(s) if d.shapes else d.winner(s)
+        else:
+            rule = None
+            for r in ordered:
+                where[:] = [r.name, "detect"]
+                if r.detect.search(s):
+                    rule = r
+                    break
+        if rule is None:
+            return {"Tag": None, "Flags": None, "event_meta": {}}
+        where[:] = [rule.name, "extract"]
+        return _run_rule(rule, s)
+
+    out = []
+    quarantine._start()
+    try:
+        for v in values:
+            s = (v or "").strip()
+            where = [None, "detect"]
+            ok, res = quarantine._run(lambda: tag(s, where), s, where)
+            out.append(res if ok else _TIMEOUT)
+    finally:
+        quarantine._stop()
+    return out
+
 # ---------- Tag a dataframe -> narrow schema ----------
-def tag_dataframe_narrow(df: pd.DataFrame, text_col: str = DESC_COL) -> pd.DataFrame:
+def _broadcast(values: list, codes: np.ndarray, index: pd.Index) -> pd.Series:
+    """Per-unique values -> per-row Series via factorize codes."""
+    return pd.Series(_object_array(values).take(codes), index=index)
+
+def tag_dataframe_narrow(df: pd.DataFrame, text_col: str = DESC_COL,
+                         dispatch: bool = True, memo: bool = True, shapes: bool = True,
+                         workers: int = 1, chunksize: int = 20_000, prefilter: bool = False,
+                         profiler: Optional[RuleProfiler] = None, output: str = "columns",
+                         cache: Optional["TagCache"] = None,
+                         quarantine: Optional[Quarantine] = None) -> pd.DataFrame:
+    if output not in ("columns", "dict", "both"):
+        raise ValueError(f"output must be 'columns', 'dict' or 'both', got {output!r}")
     out = df.copy()
-    results = out[text_col].astype(str).apply(lambda s: apply_rules(s, rules))
-    # results is a series of dicts with keys Tag/Flags/event_meta
-    out["Tag"] = results.map(lambda d: d["Tag"])
-    out["Flags"] = results.map(lambda d: d["Flags"])
-    out["event_meta"] = results.map(lambda d: d["event_meta"])
-    # (Optional) JSON mirror for Parquet/BI tools that dislike Python dicts:
-    out["event_meta_json"] = out["event_meta"].map(lambda d: json.dumps(d, default=str))
+    # dispatch=True -> compiled one-scan dispatcher; False -> original per-rule loop (same tags)
+    # memo=True     -> dispatcher's LRU also reuses tags across calls (see tag_cache_stats())
+    # shapes=True   -> winning rule decided once per digit-masked shape (see shape_stats())
+    # workers=N     -> distinct strings sharded over N processes in `chunksize` pieces
+    #                  (same output as serial; the cross-call memo is not used in this mode)
+    # prefilter=True -> DETECTs run vectorized in pyarrow first; Python only on candidate rows
+    # profiler=p     -> instrumented per-rule loop (overrides the fast paths; once per distinct string)
+    # output="columns" -> Tag/Flags categorical + typed meta_<key> columns from Rule.schema
+    # output="dict"    -> event_meta (dict per row) + event_meta_json; "both" -> all of the above
+    # cache=TagCache(...) -> results persisted on disk per ruleset_version; only unseen strings are tagged
+    # quarantine=Quarantine(budget_ms) -> per-line time budget; slow lines get Flags=TIMEOUT + a table row
+    #                  (serial: workers/prefilter are not used in this mode)
+    if profiler is not None:
+        tag_one = lambda s: _apply_rules_raw(s, rules, profiler)
+    elif dispatch:
+        d = compile_rules(rules, shapes=shapes)
+        tag_one = d.apply_cached if memo else d.apply
+    else:
+        tag_one = lambda s: _apply_rules_raw(s, rules)
+
+    # Tag each DISTINCT string once, then broadcast back through the factorize codes
+    codes, uniques = pd.factorize(out[text_col].fillna("").astype(str))
+    if cache is not None:
+        version = ruleset_version(rules)
+        results = cache.get_many(uniques, version)
+        todo = [i for i, r in enumerate(results) if r is None]
+        pending = [uniques[i] for i in todo]
+    else:
+        pending = list(uniques)
+    if profiler is not None:
+        fresh = [tag_one(u) for u in pending]
+    elif quarantine is not None:
+        fresh = tag_values_guarded(pending, rules, quarantine, dispatch, shapes)
+    elif prefilter:
+        fresh = tag_values_prefiltered(pending, rules)
+    elif workers > 1 and len(pending) > chunksize:
+        fresh = tag_values_parallel(pending, rules, workers, chunksize, dispatch, shapes)
+    else:
+        fresh = [tag_one(u) for u in pending]
+    fresh = resolve_dates(fresh, rules)   # all deferred datetimes, one to_datetime per format
+    if cache is not None:
+        done = [(t, r) for t, r in zip(pending, fresh) if r is not _TIMEOUT]   # retry timeouts next run
+        cache.put_many([t for t, _ in done], [r for _, r in done], version)
+        for i, r in zip(todo, fresh):
+            results[i] = r
+    else:
+        results = fresh
+    # results are dicts with keys Tag/Flags/event_meta
+    if output == "dict":
+        out["Tag"] = _broadcast([r["Tag"] for r in results], codes, out.index)
+        out["Flags"] = _broadcast([r["Flags"] for r in results], codes, out.index)
+    else:
+        out["Tag"] = pd.Series(pd.Categorical([r["Tag"] for r in results]).take(codes), index=out.index)
+        out["Flags"] = pd.Series(pd.Categorical([r["Flags"] for r in results]).take(codes), index=out.index)
+        meta = _meta_columns([r["event_meta"] for r in results], codes, out.index, meta_schema(rules))
+        out = pd.concat([out.drop(columns=[c for c in meta if c in out]), pd.DataFrame(meta, index=out.index)], axis=1)
+    if output != "columns":
+        out["event_meta"] = _broadcast([r["event_meta"] for r in results], codes, out.index)
+        # JSON mirror for Parquet/BI tools that dislike Python dicts:
+        out["event_meta_json"] = _broadcast([json.dumps(r["event_meta"], default=str) for r in results], codes, out.index)
     return out
 
-# ---------- Examples of working with the dict column ----------
+def tag_cache_stats() -> Dict[str, Any]:
+    """Hit/miss counters of the memo cache behind tag_dataframe_narrow (current rule set)."""
+    return compile_rules(rules).cache_stats()
+
+def shape_stats() -> Dict[str, Any]:
+    """How many distinct shapes the data had, and how often a shape decision was reused."""
+    return compile_rules(rules).shape_stats()
+
+# ---------- Unified tagging across taxonomies ----------
+# regex.py Rules, regex_with_his.py Rules, eda.classify_event (PATTERN_SETS) and
+# e_fulletr.tag_etr_event (PATTERNS) are all "first pattern that hits wins" over the same
+# FOLLOWUP_DESC. tag_all factorizes the column once, normalizes each distinct string once
+# per normalizer, and decides the anchored taxonomies' winners with one joint match:
+#   (?:(?=<taxonomy 0 alternation>)|)(?:(?=<taxonomy 1 alternation>)|)...
+# Each lookahead is the dispatcher alternation above (marker group per pattern); a
+# lookahead commits to its first succeeding alternative, i.e. the same winner as the loop.
+# Capture groups are dropped from the scan copy (the winner is re-matched for its groups);
+# a taxonomy whose patterns can't be rewritten (backrefs, conditionals) keeps its loop.
+def _strip_groups(pattern: str, verbose: bool) -> str:
+    """(...) and (?P<name>...) -> (?:...); escapes, [classes] and verbose # comments kept."""
+    out, i, n, in_class = [], 0, len(pattern), False
+    while i < n:
+        c = pattern[i]
+        if c == "\\":
+            out.append(pattern[i:i + 2]); i += 2; continue
+        if in_class:
+            in_class = c != "]"
+        elif c == "[":
+            in_class = True
+            out.append(c); i += 1
+            if pattern.startswith("^", i):
+                out.append("^"); i += 1
+            if pattern.startswith("]", i):      # leading ']' is a literal
+                out.append("]"); i += 1
+            continue
+        elif verbose and c == "#":
+            j = pattern.find("\n", i)
+            j = n if j < 0 else j
+            out.append(pattern[i:j]); i = j; continue
+        elif c == "(":
+            if pattern.startswith("(?P<", i):
+                out.append("(?:"); i = pattern.index(">", i) + 1; continue
+            if not pattern.startswith("(?", i):
+                out.append("(?:"); i += 1; continue
+        out.append(c); i += 1
+    return "".join(out)
+
+def _scan_copy(p: Pattern) -> Optional[Pattern]:
+    """Group-free copy of p for the joint scan, or None if it can't be made."""
+    if p.groups == 0:
+        return p
+    try:
+        q = re.compile(_strip_groups(p.pattern, bool(p.flags & re.VERBOSE)), p.flags)
+    except re.error:
+        return None
+    return q if q.groups == 0 else None
+
+_JOINT_MAX_UNANCHORED = 0.1   # share of unanchored patterns a taxonomy may have and still join the joint scan
+
+def _strip(text: Optional[str]) -> str:
+    return (text or "").strip()
+
+@dataclass
+class Taxonomy:
+    """One classifier over FOLLOWUP_DESC: `patterns` in evaluation order, first hit wins.
+
+    finish(s, i) -> per-distinct-string result for normalized text s and winner index i (None = no hit).
+    columns(results, codes, index) -> {column: per-row Series}; names get "<name>_" prepended.
+    """
+    name: str
+    patterns: List[Pattern]
+    finish: Callable[[str, Optional[int]], Any]
+    columns: Callable[[list, np.ndarray, pd.Index], Dict[str, pd.Series]]
+    normalize: Callable[[Optional[str]], str] = _strip
+    anchored: bool = False          # True: patterns are applied with .match (e_fulletr), else .search
+
+    def winner(self, s: str) -> Optional[int]:
+        scan = (lambda p: p.match(s)) if self.anchored else (lambda p: p.search(s))
+        return next((i for i, p in enumerate(self.patterns) if scan(p)), None)
+
+def rules_taxonomy(rule_list: List[Rule], name: str = "rx", fallthrough: bool = False,
+                   annotate: Optional[Callable[[str, Dict[str, Any]], None]] = None) -> Taxonomy:
+    """Rule registry -> Taxonomy with tag_dataframe_narrow's columns (Tag, Flags, typed meta_*).
+
+    fallthrough=True: a failed extract moves on to the next rule (regex_with_his.apply_rules);
+    annotate(s, meta) adds per-line keys, e.g. lambda s, m: m.setdefault("layer", tag_with_layer(s)[0]).
+    """
+    ordered = sorted(rule_list, key=lambda r: r.priority)
+
+    def finish(s: str, i: Optional[int]) -> Dict[str, Any]:
+        res = {"Tag": None, "Flags": None, "event_meta": {}}
+        while i is not None:
+            res = _run_rule(ordered[i], s)
+            if not (fallthrough and res["Flags"] == "PARSE_FAIL"):
+                break
+            res = {"Tag": None, "Flags": None, "event_meta": {}}
+            i = next((j for j in range(i + 1, len(ordered)) if ordered[j].detect.search(s)), None)
+        if annotate is not None:
+            res = {**res, "event_meta": dict(res["event_meta"])}
+            annotate(s, res["event_meta"])
+        return res
+
+    def columns(results, codes, index):
+        results = resolve_dates(results, ordered)
+        cols = {"Tag": pd.Series(pd.Categorical([r["Tag"] for r in results]).take(codes), index=index),
+                "Flags": pd.Series(pd.Categorical([r["Flags"] for r in results]).take(codes), index=index)}
+        cols.update(_meta_columns([r["event_meta"] for r in results], codes, index, meta_schema(ordered)))
+        return cols
+
+    return Taxonomy(name, [r.detect for r in ordered], finish, columns)
+
+def pattern_taxonomy(name: str, patterns: List[Pattern],
+                     finish: Callable[[str, Optional[int], Optional[re.Match]], Dict[str, Any]],
+                     normalize: Callable[[Optional[str]], str] = _strip, anchored: bool = False) -> Taxonomy:
+    """Plain pattern list -> Taxonomy. finish(s, i, m) gets the winner's own match (None if no hit)
+    and returns a flat dict; every key becomes a column (object dtype, None where absent)."""
+    def fin(s: str, i: Optional[int]) -> Dict[str, Any]:
+        if i is None:
+            return finish(s, None, None)
+        p = patterns[i]
+        return finish(s, i, p.match(s) if anchored else p.search(s))
+
+    def columns(results, codes, index):
+        keys: Dict[str, None] = {}
+        for r in results:
+            keys.update(dict.fromkeys(r))
+        return {k: _broadcast([r.get(k) for r in results], codes, index) for k in keys}
+
+    return Taxonomy(name, list(patterns), fin, columns, normalize, anchored)
+
+class UnifiedTagger:
+    """Winners for several taxonomies per line, grouped by normalizer.
+
+    Per group: one normalize call, one joint scan for the taxonomies whose patterns are
+    (nearly) all ^-anchored -- those alternatives fail at position 0 in a few steps, so one
+    match beats several calls. Mostly-unanchored taxonomies (eda) keep their own loop: a lazy
+    (?s:.*?) lead per alternative is slower than re.search's scanner. When every detect is
+    digit-blind the winners are also cached per template shape (see shape_key).
+    """
+
+    def __init__(self, taxonomies: List[Taxonomy], shapes: bool = True, max_shapes: int = 100_000):
+        self.taxonomies = list(taxonomies)
+        self.max_shapes = max_shapes
+        self.groups: List[Dict[str, Any]] = []
+        by_norm: Dict[Any, List[int]] = {}
+        for t, tax in enumerate(self.taxonomies):
+            by_norm.setdefault(tax.normalize, []).append(t)
+        for norm, members in by_norm.items():
+            parts, markers = [], {}
+            for t in members:
+                tax = self.taxonomies[t]
+                copies = [_scan_copy(p) for p in tax.patterns]
+                unanchored = sum(not (tax.anchored or _is_anchored(p)) for p in tax.patterns)
+                if not copies or any(q is None for q in copies) or unanchored > _JOINT_MAX_UNANCHORED * len(copies):
+                    continue
+                alts = [("" if tax.anchored or _is_anchored(q) else "(?s:.*?)") + _scoped_pattern(q) + f"(?P<_t{t}_{i}>)"
+                        for i, q in enumerate(copies)]
+                parts.append("(?:(?=" + "|".join(alts) + ")|)")
+                markers[t] = len(copies)
+            joint = None
+            if parts:
+                try:
+                    joint = re.compile("".join(parts))
+                except re.error:
+                    markers = {}
+            if joint is not None:
+                markers = {t: [joint.groupindex[f"_t{t}_{i}"] for i in range(n)] for t, n in markers.items()}
+            blind = shapes and all(_digit_blind(p) for t in members for p in self.taxonomies[t].patterns)
+            self.groups.append({"normalize": norm, "members": members, "joint": joint, "markers": markers,
+                                "shapes": {} if blind else None})
+
+    def _winners(self, g: Dict[str, Any], s: str) -> tuple:
+        regs = g["joint"].match(s).regs if g["joint"] is not None else None
+        wins = []
+        for t in g["members"]:
+            marks = g["markers"].get(t)
+            if marks is not None:
+                wins.append(next((k for k, n in enumerate(marks) if regs[n][0] >= 0), None))
+            else:
+                wins.append(self.taxonomies[t].winner(s))
+        return tuple(wins)
+
+    def tag(self, text: Optional[str]) -> List[Any]:
+        """One line -> [finish result per taxonomy], in taxonomy order."""
+        out: List[Any] = [None] * len(self.taxonomies)
+        for g in self.groups:
+            s = g["normalize"](text)
+            cache = g["shapes"]
+            if cache is None:
+                wins = self._winners(g, s)
+            else:
+                key = s.translate(_SHAPE_MASK)
+                wins = cache.get(key)
+                if wins is None:
+                    wins = self._winners(g, s)
+                    if len(cache) < self.max_shapes:
+                        cache[key] = wins
+            for t, i in zip(g["members"], wins):
+                out[t] = self.taxonomies[t].finish(s, i)
+        return out
+
+def tag_all(df: pd.DataFrame, taxonomies: List[Taxonomy], text_col: str = DESC_COL) -> pd.DataFrame:
+    """All taxonomies side by side: <name>_<column> per taxonomy, one pass over the distinct strings."""
+    out = df.copy()
+    tagger = UnifiedTagger(taxonomies)
+    codes, uniques = pd.factorize(out[text_col].fillna("").astype(str))
+    per_unique = [tagger.tag(u) for u in uniques]
+    cols: Dict[str, pd.Series] = {}
+    for t, tax in enumerate(tagger.taxonomies):
+        for c, ser in tax.columns([r[t] for r in per_unique], codes, out.index).items():
+            cols[f"{tax.name}_{c}"] = ser
+    return pd.concat([out.drop(columns=[c for c in cols if c in out]), pd.DataFrame(cols, index=out.index)], axis=1)
+
+# ---------- Incremental tagging (FOLLOWUP_ID watermark) ----------
+# Tagged rows are appended to a Parquet dataset together with the ruleset_version that
+# produced them; <base_dir>/_watermark.json holds the highest FOLLOWUP_ID written. A nightly
+# run only tags rows past that mark, so it scales with new rows, not with history.
+# Files are named after the FOLLOWUP_ID range they hold and the watermark is moved only
+# after they are written: a crashed run just rewrites the same files next time.
+ID_COL = "FOLLOWUP_ID"
+WATERMARK_FILE = "_watermark.json"
+
+# ---------- Rule fingerprints / ruleset version ----------
+# detect_fp: detect pattern + flags. fp: everything that shapes the rule's output -- name,
+# detect, extract, and the SOURCE of handler/finalize plus the module-level helpers and
+# constants they reference (recursively), so editing _canon_loc_state re-tags Location
+# Status rows too. Engine code (_run_rule, resolve_dates) is not covered: a full rebuild
+# is the way after engine changes.
+RULESETS_FILE = "_rulesets.json"
+
+def _sha(*parts) -> str:
+    h = hashlib.sha1()
+    for part in parts:
+        h.update(repr(part).encode())
+        h.update(b"\x1f")
+    return h.hexdigest()[:16]
+
+def _pattern_id(p: Optional[Pattern]):
+    return None if p is None else (p.pattern, p.flags)
+
+def _code_names(code: types.CodeType):
+    yield from code.co_names
+    for c in code.co_consts:              # lambdas / comprehensions / nested defs
+        if isinstance(c, types.CodeType):
+            yield from _code_names(c)
+
+def _callable_source(fn: Optional[Callable], seen: Optional[set] = None) -> list:
+    """Source of fn + of the functions/constants it reaches through its module globals."""
+    if fn is None:
+        return [None]
+    seen = set() if seen is None else seen
+    if id(fn) in seen:
+        return []
+    seen.add(id(fn))
+    code = getattr(fn, "__code__", None)
+    if code is None:
+        return [repr(fn)]
+    try:
+        parts = [inspect.getsource(fn)]
+    except (OSError, TypeError):          # no source (exec'd cell) -> bytecode
+        parts = [code.co_code, repr(code.co_consts)]
+    glb = getattr(fn, "__globals__", {})
+    for name in sorted(set(_code_names(code))):
+        obj = glb.get(name)
+        if isinstance(obj, types.FunctionType):
+            parts += _callable_source(obj, seen)
+        elif isinstance(obj, (re.Pattern, LazyPattern)):
+            parts.append((name, _pattern_id(obj)))
+        elif isinstance(obj, (dict, list, tuple, set, frozenset, str, int, float)):
+            parts.append((name, repr(obj)))
+    return parts
+
+def rule_fingerprint(rule: Rule) -> Dict[str, Any]:
+    detect_fp = _sha(_pattern_id(rule.detect))
+    fp = _sha(rule.name, detect_fp, _pattern_id(rule.extract),
+              _callable_source(rule.handler), _callable_source(rule.finalize))
+    return {"name": rule.name, "priority": rule.priority, "detect_fp": detect_fp, "fp": fp}
+
+def ruleset_manifest(rule_list: List[Rule]) -> List[Dict[str, Any]]:
+    """Fingerprints in evaluation order (what a stored tag was evaluated against)."""
+    return [rule_fingerprint(r) for r in sorted(rule_list, key=lambda r: r.priority)]
+
+def ruleset_version(rule_list: List[Rule]) -> str:
+    """Short hash of the ordered rule fingerprints."""
+    return _sha([(e["name"], e["fp"]) for e in ruleset_manifest(rule_list)])[:12]
+
+def stale_tags(old: List[Dict[str, Any]], new: List[Dict[str, Any]]) -> tuple:
+    """(Tags whose rows must be re-tagged, whether untagged rows must be).
+
+    A line won by old[k] only ever ran the detects of old[:k] (none fired) and old[k] itself.
+    If new[:k] has the same rules in the same order with the same detects, and new[k] is
+    old[k] unchanged, the line gets the same result -> nothing to do.
+    """
+    p = 0
+    while p < min(len(old), len(new)) and (old[p]["name"], old[p]["detect_fp"]) == (new[p]["name"], new[p]["detect_fp"]):
+        p += 1
+    safe = {old[k]["name"] for k in range(p) if old[k]["fp"] == new[k]["fp"]}
+    stale = {e["name"] for e in old} - safe
+    return stale, p < len(new)
+
+def _read_rulesets(base_dir: str) -> Dict[str, List[Dict[str, Any]]]:
+    path = Path(base_dir) / RULESETS_FILE
+    return json.loads(path.read_text()) if path.exists() else {}
+
+def _record_ruleset(base_dir: str, version: str, manifest: List[Dict[str, Any]]) -> None:
+    known = _read_rulesets(base_dir)
+    if version in known:
+        return
+    known[version] = manifest
+    path = Path(base_dir) / RULESETS_FILE
+    tmp = path.with_suffix(".tmp")
+    tmp.write_text(json.dumps(known, indent=1))
+    tmp.replace(path)
+
+def read_watermark(base_dir: str) -> Optional[Dict[str, Any]]:
+    """{"followup_id", "ruleset_version", "rows", "updated_utc"} or None for a new dataset.
+    Falls back to scanning FOLLOWUP_ID in the dataset if the sidecar file is missing."""
+    path = Path(base_dir) / WATERMARK_FILE
+    if path.exists():
+        return json.loads(path.read_text())
+    if not Path(base_dir).exists() or ds is None:
+        return None
+    data = ds.dataset(base_dir, format="parquet")
+    if not data.files:
+        return None
+    ids = data.to_table(columns=[ID_COL]).column(ID_COL)
+    if len(ids) == 0:
+        return None
+    return {"followup_id": int(pc.max(ids).as_py()), "ruleset_version": None, "rows": len(ids), "updated_utc": None}
+
+def _write_watermark(base_dir: str, wm: Dict[str, Any]) -> None:
+    path = Path(base_dir) / WATERMARK_FILE
+    tmp = path.with_suffix(".tmp")
+    tmp.write_text(json.dumps(wm, indent=2))
+    tmp.replace(path)
+
+def _json_cell(v):
+    if v is None or (pd.api.types.is_scalar(v) and pd.isna(v)):   # NaN / pd.NA / NaT from a concat or a read
+        return None
+    return v if isinstance(v, str) else json.dumps(v, default=str)
+
+def _parquet_ready(df: pd.DataFrame) -> pd.DataFrame:
+    """Object columns (lists, mixed, all-null) -> JSON/str so every file gets the same Arrow types."""
+    out = df.drop(columns=["event_meta"], errors="ignore")
+    for c in out.columns:
+        if out[c].dtype == object:
+            out[c] = out[c].map(_json_cell).astype("string")
+    return out
+
+def tag_incremental(df: pd.DataFrame, base_dir: str, id_col: str = ID_COL,
+                    partitioning: Optional[List[str]] = None, **tag_kwargs) -> pd.DataFrame:
+    """Tag only rows with id_col past the watermark, append them to the Parquet dataset at
+    base_dir and advance the watermark. Returns the newly tagged rows (empty if none).
+    tag_kwargs go to tag_dataframe_narrow (dispatch/memo/workers/...)."""
+    if ds is None:
+        raise ImportError("tag_incremental needs pyarrow")
+    wm = read_watermark(base_dir)
+    manifest = ruleset_manifest(rules)
+    version = ruleset_version(rules)
+    if wm is not None and wm.get("ruleset_version") not in (None, version):
+        print(f"[warn] ruleset changed since the watermark ({wm['ruleset_version']} -> {version}); "
+              f"only new rows get the new version (retag_changed brings old rows up to date)")
+    new = df[df[id_col] > wm["followup_id"]] if wm is not None else df
+    if new.empty:
+        print(f"[info] nothing past FOLLOWUP_ID {wm['followup_id'] if wm else None}")
+        return new.iloc[0:0]
+
+    tagged = tag_dataframe_narrow(new, **tag_kwargs)
+    tagged["ruleset_version"] = version
+    lo, hi = int(new[id_col].min()), int(new[id_col].max())
+    Path(base_dir).mkdir(parents=True, exist_ok=True)
+    ds.write_dataset(
+        pa.Table.from_pandas(_parquet_ready(tagged), preserve_index=False),
+        base_dir=base_dir,
+        format="parquet",
+        partitioning=partitioning,
+        partitioning_flavor="hive" if partitioning else None,
+        basename_template=f"tagged-{lo}-{hi}-{{i}}.parquet",
+        existing_data_behavior="overwrite_or_ignore",
+    )
+    _record_ruleset(base_dir, version, manifest)
+    _write_watermark(base_dir, {
+        "followup_id": hi,
+        "ruleset_version": version,
+        "rows": (wm["rows"] if wm else 0) + len(tagged),
+        "updated_utc": datetime.now(timezone.utc).isoformat(),
+    })
+    print(f"[info] tagged {len(tagged):,} rows (FOLLOWUP_ID {lo}..{hi}), ruleset {version}")
+    return tagged
+
+# ---------- Selective re-tag after rule edits ----------
+_TAG_OUTPUT_COLS = ("Tag", "Flags", "event_meta", "event_meta_json", "ruleset_version")
+
+def _cast_like(new: pa.Table, schema: "pa.Schema") -> pa.Table:
+    """`new` with the Arrow types `schema` has for the same columns (string vs large_string,
+    dictionary value types drift with the pandas version); dictionary widths stay new's."""
+    fields = []
+    for f in new.schema:
+        t = schema.field(f.name).type if f.name in schema.names else f.type
+        if pa.types.is_dictionary(t) and pa.types.is_dictionary(f.type):
+            t = pa.dictionary(f.type.index_type, t.value_type)
+        fields.append(pa.field(f.name, t))
+    return new.cast(pa.schema(fields, metadata=new.schema.metadata))
+
+def _changed_columns(old: pa.Table, new: pa.Table, keep: np.ndarray) -> List[str]:
+    """Columns of `old` whose values/types differ in `new` on the `keep` rows (ruleset_version aside)."""
+    mask = pa.array(keep)
+    out = []
+    for c in old.column_names:
+        if c == "ruleset_version":
+            continue
+        a, b = old.column(c).filter(mask), new.column(c).filter(mask) if c in new.column_names else None
+        if b is not None and pa.types.is_dictionary(a.type) and pa.types.is_dictionary(b.type):
+            a, b = a.cast(a.type.value_type), b.cast(b.type.value_type)   # category sets may grow
+        if b is None or not a.equals(b):
+            out.append(c)
+    return out
+
+def retag_changed(base_dir: str, **tag_kwargs) -> Dict[str, int]:
+    """Bring a tag_incremental dataset up to the current rules, touching only stale rows.
+
+    Per data file: rows whose stored ruleset_version makes them stale (stale_tags) are
+    re-tagged from their input columns; files with stale rows are rewritten with every row
+    on the current version (the others are provably unchanged). Files without stale rows
+    are left alone. Rows of a version missing from _rulesets.json count as stale.
+    """
+    if ds is None:
+        raise ImportError("retag_changed needs pyarrow")
+    known = _read_rulesets(base_dir)
+    manifest = ruleset_manifest(rules)
+    version = ruleset_version(rules)
+    plans = {v: stale_tags(m, manifest) for v, m in known.items() if v != version}
+    schema = meta_schema(rules)
+    stats = {"files": 0, "files_rewritten": 0, "rows": 0, "rows_retagged": 0}
+
+    for path in ds.dataset(base_dir, format="parquet").files:
+        stats["files"] += 1
+        table = pq.read_table(path)
+        df = table.to_pandas()
+        stats["rows"] += len(df)
+        stale = np.zeros(len(df), dtype=bool)
+        for v in pd.unique(df["ruleset_version"]):
+            in_v = (df["ruleset_version"] == v).to_numpy()
+            if v == version:
+                continue
+            if v not in plans:
+                stale |= in_v
+                continue
+            tags, untagged = plans[v]
+            hit = df["Tag"].isin(tags).to_numpy() | (untagged & df["Tag"].isna().to_numpy())
+            stale |= in_v & hit
+        if not stale.any():
+            continue
+
+        inputs = [c for c in df.columns if c not in _TAG_OUTPUT_COLS and not c.startswith(META_PREFIX)]
+        fresh = tag_dataframe_narrow(df.loc[stale, inputs], **tag_kwargs)
+        merged = pd.concat([df.loc[~stale].drop(columns=["event_meta"], errors="ignore"), fresh]).loc[df.index]
+        for c in merged.columns:
+            key = c[len(META_PREFIX):]
+            if c.startswith(META_PREFIX) and key in schema:   # keys new to the kept rows are NaN there
+                vals = merged[c].astype(object)
+                merged[c] = pd.Series(_typed_array(vals.where(vals.notna(), None).tolist(), schema[key]),
+                                      index=merged.index)
+            elif c in df.columns and isinstance(df[c].dtype, pd.CategoricalDtype):
+                merged[c] = merged[c].astype("category")   # concat drops differing categories
+        merged["ruleset_version"] = version
+        out = _cast_like(pa.Table.from_pandas(_parquet_ready(merged), preserve_index=False), table.schema)
+        changed = _changed_columns(table, out, ~stale)
+        if changed:
+            raise RuntimeError(f"{path}: rewrite would change rows that were not re-tagged ({changed})")
+        tmp = Path(path).with_suffix(".tmp")
+        pq.write_table(out, tmp)
+        tmp.replace(path)
+        stats["files_rewritten"] += 1
+        stats["rows_retagged"] += int(stale.sum())
+
+    _record_ruleset(base_dir, version, manifest)
+    wm = read_watermark(base_dir)
+    if wm is not None:
+        _write_watermark(base_dir, {**wm, "ruleset_version": version,
+                                    "updated_utc": datetime.now(timezone.utc).isoformat()})
+    print(f"[info] re-tagged {stats['rows_retagged']:,} of {stats['rows']:,} rows "
+          f"({stats['files_rewritten']} of {stats['files']} files) -> ruleset {version}")
+    return stats
+
+# ---------- Persistent tag cache (SQLite) ----------
+# Survives notebook restarts: (blake2b(text), namespace) -> pickled result dict. The
+# namespace is the ruleset_version, so a rule edit simply stops hitting the old entries;
+# they age out through eviction. Eviction is LRU on a coarse "last used" second, run when
+# the live database size passes max_mb. Pickle: the file is a local cache, not an exchange
+# format -- don't load one you didn't write.
+class TagCache:
+    _CHUNK = 500                           # keys per IN (...) query (SQLite variable limit)
+    TOUCH_S = 3600                         # LRU resolution: "used" is refreshed at most hourly
+
+    def __init__(self, path: str = "tag_cache.sqlite", max_mb: float = 2048, evict_frac: float = 0.25):
+        self.path = str(path)
+        self.max_mb = max_mb
+        self.evict_frac = evict_frac
+        self.hits = self.misses = 0
+        self.con = sqlite3.connect(self.path)
+        self.con.execute("PRAGMA journal_mode=WAL")
+        self.con.execute("PRAGMA synchronous=NORMAL")
+        self.con.execute("CREATE TABLE IF NOT EXISTS tags (ns TEXT, key BLOB, value BLOB, used INTEGER, "
+                         "PRIMARY KEY (ns, key)) WITHOUT ROWID")
+        self.con.execute("CREATE INDEX IF NOT EXISTS tags_used ON tags (used)")
+
+    @staticmethod
+    def key(text: str) -> bytes:
+        return hashlib.blake2b(text.encode("utf-8", "surrogatepass"), digest_size=16).digest()
+
+    def get_many(self, texts, namespace: str) -> List[Optional[Dict[str, Any]]]:
+        """Results in the order of texts; None where not cached."""
+        keys = [self.key(t) for t in texts]
+        found: Dict[bytes, bytes] = {}
+        now = int(time())
+        stale = []                         # hits not touched within TOUCH_S -> refresh "used"
+        for i in range(0, len(keys), self._CHUNK):
+            chunk = keys[i:i + self._CHUNK]
+            q = f"SELECT key, value, used FROM tags WHERE ns = ? AND key IN ({','.join('?' * len(chunk))})"
+            for k, v, used in self.con.execute(q, [namespace, *chunk]):
+                found[k] = v
+                if used < now - self.TOUCH_S:
+                    stale.append(k)
+        for i in range(0, len(stale), self._CHUNK):
+            chunk = stale[i:i + self._CHUNK]
+            self.con.execute(f"UPDATE tags SET used = ? WHERE ns = ? AND key IN ({','.join('?' * len(chunk))})",
+                             [now, namespace, *chunk])
+        if stale:
+            self.con.commit()
+        self.hits += len(found)
+        self.misses += len(keys) - len(found)
+        return [pickle.loads(found[k]) if k in found else None for k in keys]
+
+    def put_many(self, texts, results, namespace: str) -> None:
+        now = int(time())
+        self.con.executemany("INSERT OR REPLACE INTO tags VALUES (?, ?, ?, ?)",
+                             [(namespace, self.key(t), pickle.dumps(r, pickle.HIGHEST_PROTOCOL), now)
+                              for t, r in zip(texts, results)])
+        self.con.commit()
+        if self.size_mb() > self.max_mb:
+            self.evict()
+
+    def size_mb(self) -> float:
+        """Live (non-free) database pages, in MB."""
+        pages = self.con.execute("PRAGMA page_count").fetchone()[0]
+        free = self.con.execute("PRAGMA freelist_count").fetchone()[0]
+        size = self.con.execute("PRAGMA page_size").fetchone()[0]
+        return (pages - free) * size / 2**20
+
+    def evict(self) -> int:
+        """Drop least recently used entries, evict_frac at a time, until under max_mb."""
+        removed = 0
+        while self.size_mb() > self.max_mb:
+            n = max(1, int(self.con.execute("SELECT COUNT(*) FROM tags").fetchone()[0] * self.evict_frac))
+            cur = self.con.execute("DELETE FROM tags WHERE (ns, key) IN "
+                                   "(SELECT ns, key FROM tags ORDER BY used LIMIT ?)", (n,))
+            self.con.commit()
+            if cur.rowcount <= 0:
+                break
+            removed += cur.rowcount
+        if removed:
+            print(f"[info] tag cache: evicted {removed:,} entries, {self.size_mb():.1f} MB live")
+        return removed
+
+    def stats(self) -> Dict[str, Any]:
+        rows = self.con.execute("SELECT ns, COUNT(*) FROM tags GROUP BY ns").fetchall()
+        return {"hits": self.hits, "misses": self.misses, "size_mb": round(self.size_mb(), 1),
+                "entries": dict(rows)}
+
+    def clear(self) -> None:
+        self.con.execute("DELETE FROM tags")
+        self.con.commit()
+        self.con.execute("VACUUM")
+
+    def close(self) -> None:
+        self.con.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+# ---------- Template mining (untagged lines) ----------
+# Drain-style: lines are whitespace-tokenized; a fixed-depth tree keyed by token count and
+# the first few tokens leads to a short list of templates, the line joins the most similar
+# one (>= sim) or starts a new one; mismatching positions in a merged template become <*>.
+# Tokens with a digit are masked to <*> up front (IDs, times, counts). Per line the work is
+# bounded by depth + templates in one leaf, so a run is linear in the number of lines. Each
+# chunk is deduplicated first and a masked-token memo skips the tree for repeated shapes.
+WILDCARD = "<*>"
+_DIGIT_TOKEN = re.compile(r"\S*\d\S*").sub
+
+class TemplateMiner:
+    def __init__(self, depth: int = 4, sim: float = 0.5, max_children: int = 100,
+                 n_examples: int = 5, max_memo: int = 1_000_000):
+        self.depth = max(depth, 3)
+        self.sim = sim
+        self.max_children = max_children
+        self.n_examples = n_examples
+        self.max_memo = max_memo
+        self.root: Dict[int, dict] = {}
+        self.templates: List[list] = []    # template tokens, per template id
+        self.counts: List[int] = []
+        self.examples: List[list] = []     # up to n_examples (id, text) pairs
+        self._memo: Dict[tuple, int] = {}  # masked tokens -> template id
+        self.lines = 0
+
+    @staticmethod
+    def tokens(text: str) -> tuple:
+        return tuple(_DIGIT_TOKEN(WILDCARD, text or "").split())
+
+    def _leaf(self, toks: tuple) -> list:
+        node = self.root.setdefault(len(toks), {"children": {}, "ids": []})
+        for t in toks[:self.depth - 2]:
+            kids = node["children"]
+            if t not in kids:
+                if len(kids) + (WILDCARD not in kids) >= self.max_children:   # last slot is kept for <*>
+                    t = WILDCARD
+                kids.setdefault(t, {"children": {}, "ids": []})
+            node = kids[t]
+        return node["ids"]
+
+    def _match(self, ids: list, toks: tuple) -> Optional[int]:
+        best, best_key = None, (-1.0, -1)
+        for tid in ids:
+            tpl = self.templates[tid]
+            same = sum(1 for a, b in zip(tpl, toks) if a == b and a != WILDCARD)
+            key = (same / len(toks) if toks else 1.0, -sum(1 for a in tpl if a == WILDCARD))
+            if key > best_key:
+                best, best_key = tid, key
+        return best if best is not None and best_key[0] >= self.sim else None
+
+    def add(self, text: str, line_id=None, count: int = 1) -> int:
+        """Feed one line (count = how many identical lines it stands for); returns the template id."""
+        toks = self.tokens(text)
+        tid = self._memo.get(toks)
+        if tid is None:
+            ids = self._leaf(toks)
+            tid = self._match(ids, toks)
+            if tid is None:
+                tid = len(self.templates)
+                self.templates.append(list(toks))
+                self.counts.append(0)
+                self.examples.append([])
+                ids.append(tid)
+            else:
+                tpl = self.templates[tid]
+                for i, (a, b) in enumerate(zip(tpl, toks)):
+                    if a != b:
+                        tpl[i] = WILDCARD
+            if len(self._memo) < self.max_memo:
+                self._memo[toks] = tid
+        self.counts[tid] += count
+        self.lines += count
+        if len(self.examples[tid]) < self.n_examples:
+            self.examples[tid].append((line_id, text))
+        return tid
+
+    def feed(self, df: pd.DataFrame, text_col: str = DESC_COL, id_col: Optional[str] = ID_COL,
+             untagged_only: bool = True) -> None:
+        """Feed one chunk; with untagged_only, rows with a Tag are skipped (needs the tagged frame)."""
+        if untagged_only and "Tag" in df.columns:
+            df = df[df["Tag"].isna()]
+        text = df[text_col].fillna("").astype(str)
+        codes, uniq = pd.factorize(text, sort=False)
+        counts = np.bincount(codes, minlength=len(uniq)).tolist()
+        if id_col and id_col in df.columns:
+            _, first = np.unique(codes, return_index=True)
+            ids = df[id_col].to_numpy()[first].tolist()
+        else:
+            ids = [None] * len(uniq)
+        for s, i, n in zip(uniq.tolist(), ids, counts):
+            self.add(s, i, n)
+
+    def table(self, top: Optional[int] = None) -> pd.DataFrame:
+        """Templates by volume: n_lines, share / cum_share of the mined lines, example IDs and text."""
+        rows = [(" ".join(t), n, [i for i, _ in ex if i is not None], ex[0][1] if ex else None)
+                for t, n, ex in zip(self.templates, self.counts, self.examples)]
+        out = (pd.DataFrame(rows, columns=["template", "n_lines", "example_ids", "example_text"])
+               .sort_values("n_lines", ascending=False, kind="stable").reset_index(drop=True))
+        out.insert(2, "share", out["n_lines"] / max(self.lines, 1))
+        out.insert(3, "cum_share", out["share"].cumsum())
+        return out.head(top) if top else out
+
+    def export(self, path: str, top: int = 200) -> pd.DataFrame:
+        """Write the top templates to .csv or Parquet (example_ids as a list column)."""
+        out = self.table(top)
+        if str(path).endswith(".csv"):
+            out.assign(example_ids=out["example_ids"].map(lambda v: " ".join(map(str, v)))).to_csv(path, index=False)
+        else:
+            out.to_parquet(path, index=False)
+        print(f"[info] template miner: {self.lines:,} lines -> {len(self.templates):,} templates, "
+              f"top {len(out)} ({out['share'].sum():.1%} of lines) -> {path}")
+        return out
+
+def mine_untagged(frames, text_col: str = DESC_COL, id_col: Optional[str] = ID_COL,
+                  top: Optional[int] = 200, miner: Optional[TemplateMiner] = None, **miner_kwargs) -> pd.DataFrame:
+    """Template table for the Tag=None rows of a tagged frame, or of an iterable of chunks."""
+    miner = miner or TemplateMiner(**miner_kwargs)
+    for chunk in ([frames] if isinstance(frames, pd.DataFrame) else frames):
+        miner.feed(chunk, text_col, id_col)
+    return miner.table(top)
+
+# ---------- Examples of working with the output ----------
 # Filter all ETR rows:
 # etr = df_tagged[df_tagged["Tag"].isin(["SYSTEM ETR", "MANUAL ETR"])]
 
-# Pull values from event_meta on the fly:
+# Typed columns are already there (default output="columns"):
+# etr[["meta_loc", "meta_etr_from_ts", "meta_etr_to_ts"]]
+# etr.dropna(axis=1, how="all")          # only the columns this family uses
+
+# Dict column (output="dict"): pull values from event_meta on the fly:
 # etr["etr_ts"] = etr["event_meta"].map(lambda d: d.get("etr_to_ts"))
 # etr["loc"] = etr["event_meta"].map(lambda d: d.get("loc"))
 
 # Later normalize a subset (wide form) if needed:
 # wide = pd.json_normalize(etr["event_meta"]).add_prefix("meta_")
 # etr_wide = pd.concat([etr.reset_index(drop=True), wide], axis=1)
+
+# All taxonomies in one pass (run the eda.py / e_fulletr.py / regex_with_his.py cells first):
+# taxonomies = [
+#     rules_taxonomy(rules, "rx"),
+#     rules_taxonomy(his_rules, "his", fallthrough=True,
+#                    annotate=lambda s, m: m.setdefault("layer", tag_with_layer(s)[0])),
+#     pattern_taxonomy("eda", [rx for rx, _ in PATTERN_SETS], eda_finish),
+#     pattern_taxonomy("etr", [p["regex"] for p in PATTERNS], etr_finish, normalize=normalize, anchored=True),
+# ]
+# wide = tag_all(df, taxonomies)      # rx_Tag, rx_meta_*, his_Tag, eda_event_cat, etr_action, ...
+
+# Nightly incremental run (push the watermark into the query so only new rows are pulled):
+# wm = read_watermark("EventLogsTagged_parquet/")
+# new = cc.sql(f'SELECT "FOLLOWUP_ID", "INCIDENT_ID", "FOLLOWUP_DESC", ... FROM "OMS"."HIS_FOLLOWUP" '
+#              f'WHERE "FOLLOWUP_ID" > {wm["followup_id"] if wm else 0}').collect()
+# tag_incremental(new, "EventLogsTagged_parquet/")
+
+# Persistent cache across sessions (only strings never seen under this ruleset get tagged):
+# tag_cache = TagCache(Path.home() / ".cache" / "followup_tags.sqlite")
+# df_tagged = tag_dataframe_narrow(df, cache=tag_cache); tag_cache.stats()
+
+# Learn a faster rule order from a profiling run (same tags), keep it for the next session:
+# p = RuleProfiler(); tag_dataframe_narrow(df.sample(200_000), profiler=p)
+# rules[:] = learn_rule_order(rules, p); save_rule_order("rule_order.json", rules)
+# ... next session: rules[:] = load_rule_order("rule_order.json", rules)
+
+# Short CLI jobs / Streamlit reloads: build once after rule edits, load at start-up
+# save_rule_registry("rule_registry.json")      # also validates every pattern
+# load_rule_registry("rule_registry.json")      # fresh process: skips the rule analysis
+
+# Nightly runs with a worst-case latency bound per distinct line:
+# q = Quarantine(budget_ms=50)
+# df_tagged = tag_dataframe_narrow(df, quarantine=q)
+# q.table().sort_values("elapsed_ms", ascending=False).head()   # Flags == "TIMEOUT" rows in df_tagged
+
+# Where to grow the rule set next: templates of the Tag=None rows, by volume
+# mine_untagged(df_tagged).head(20)
+# m = TemplateMiner()                                  # or stream the tagged Parquet chunk by chunk
+# for b in ds.dataset("EventLogsTagged_parquet/").to_batches(columns=["FOLLOWUP_ID", "FOLLOWUP_DESC", "Tag"]):
+#     m.feed(b.to_pandas())
+# m.export("uncovered_templates.csv", top=200)
+
+# After editing a rule (e.g. LOC_STATUS_EXTRACT) and rebuilding `rules`:
+# retag_changed("EventLogsTagged_parquet/")   # only Location Status rows are re-tagged
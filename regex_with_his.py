@@ -44,9 +44,8 @@ def loc_code_handler(m: re.Match) -> Dict[str, Any]:
     }
 
 # Keep high priority (before generic status lines)
-RULES.append(
-    Rule("Location Cause/Occur Set (HIS)", 16, LOC_CODE_DETECT, LOC_CODE_EXTRACT, loc_code_handler)
-)
+RULE_LOC_CAUSE_OCCUR = Rule("Location Cause/Occur Set (HIS)", 16, LOC_CODE_DETECT, LOC_CODE_EXTRACT, loc_code_handler)
+RULES.append(RULE_LOC_CAUSE_OCCUR)
 
 
 
@@ -70,12 +69,6 @@ LOC_CREATE_DT_EXTRACT = re.compile(
     '''
 )
 
-def _coerce_dt_maybe(s: str | None):
-    if not s: return None
-    s = s.strip()
-    if not s: return None
-    return pd.to_datetime(s, errors="coerce")
-
 def loc_creation_dt_handler(m: re.Match) -> Dict[str, Any]:
     return {
         "cat": "LOCATION_DATE",
@@ -83,13 +76,12 @@ def loc_creation_dt_handler(m: re.Match) -> Dict[str, Any]:
         "field": "CREATION",          # consistent with ENERGIZED/INITIAL/ESTIMATED_RESTORE
         "location_id": int(m.group("loc_id")),
         "old_ts": None,               # not provided in this log line
-        "new_ts": _coerce_dt_maybe(m.group("new_val")),
+        "new_ts": defer_dt(m.group("new_val")),
     }
 
 # Register early among HIS rules (just before other location date edits if you like)
-rules.append(
-    Rule("Location Creation Datetime (HIS)", 14, LOC_CREATE_DT_DETECT, LOC_CREATE_DT_EXTRACT, loc_creation_dt_handler)
-)
+RULE_LOC_CREATE_DT = Rule("Location Creation Datetime (HIS)", 14, LOC_CREATE_DT_DETECT, LOC_CREATE_DT_EXTRACT, loc_creation_dt_handler)
+rules.append(RULE_LOC_CREATE_DT)
 
 
 ### INCIDENT DEVICE INITIAL DATE SET 
@@ -111,19 +103,13 @@ DEV_DATE_SET_EXTRACT = re.compile(
     '''
 )
 
-def _coerce_dt_maybe(s: str | None):
-    if not s: return None
-    s = s.strip()
-    if not s: return None
-    return pd.to_datetime(s, errors="coerce")
-
 def dev_date_set_handler(m: re.Match) -> Dict[str, Any]:
     return {
         "cat": "DEVICE_DATE",
         "kind": "SET",
         "field": "INITIAL",
         "device_id": int(m.group("dev")),
-        "new_ts": _coerce_dt_maybe(m.group("new")),
+        "new_ts": defer_dt(m.group("new")),
     }
 
 
@@ -188,7 +174,7 @@ def man_remove_handler(m):
         "loc": m.group("loc").strip(),
         # Sometimes the tail is present: "ETR SYS-01/09/2025 03:30:00"
         "etr_ref_type": (m.group("ref_type") or "").upper() or None,
-        "etr_ref_ts": coerce_dt(m.group("ref_dt")) if m.group("ref_dt") else None,
+        "etr_ref_ts": defer_dt(m.group("ref_dt")),
     }
 
 
@@ -361,16 +347,19 @@ def loc_date_handler(m: re.Match) -> Dict[str, Any]:
     loc_id = int(m.group("loc_id"))
     field = _canon_field(m.group("field"))
     if m.group("set_val") is not None:
-        return {"cat":"LOCATION_DATE","action":"SET","field":field,"location_id":loc_id,"new_ts":_coerce_dt_maybe(m.group("set_val"))}
+        return {"cat":"LOCATION_DATE","action":"SET","field":field,"location_id":loc_id,"new_ts":defer_dt(m.group("set_val"))}
     if m.group("from_val") is not None or m.group("to_val") is not None:
-        old_ts = _coerce_dt_maybe(m.group("from_val")); new_ts = _coerce_dt_maybe(m.group("to_val"))
-        delta, flag = _delta_flag(old_ts, new_ts)
-        meta = {"cat":"LOCATION_DATE","action":"CHANGED","field":field,"location_id":loc_id,"old_ts":old_ts,"new_ts":new_ts,"delta_min":delta}
-        if flag: meta["_flags"]=flag
-        return meta
+        return {"cat":"LOCATION_DATE","action":"CHANGED","field":field,"location_id":loc_id,
+                "old_ts":defer_dt(m.group("from_val")),"new_ts":defer_dt(m.group("to_val")),"delta_min":None}
     return {"cat":"LOCATION_DATE","action":"REMOVED","field":field,"location_id":loc_id}
 
-RULE_LOC_DATE = Rule("Location Date Field (HIS)", 15, LOC_DATE_DETECT, LOC_DATE_EXTRACT, loc_date_handler)
+def his_loc_date_finalize(meta: Dict[str, Any]) -> None:
+    if meta.get("action") == "CHANGED":
+        meta["delta_min"], flag = _delta_flag(meta.get("old_ts"), meta.get("new_ts"))
+        if flag: meta["_flags"]=flag
+
+RULE_LOC_DATE = Rule("Location Date Field (HIS)", 15, LOC_DATE_DETECT, LOC_DATE_EXTRACT, loc_date_handler,
+                     finalize=his_loc_date_finalize)
 
 
 ## LOCATION - Cause / occurance set removed (updated) 
@@ -452,13 +441,15 @@ DEV_DATE_EXTRACT = re.compile(
     '''
 )
 def dev_date_handler(m: re.Match)->Dict[str,Any]:
-    old=_coerce_dt_maybe(m.group('old')); new=_coerce_dt_maybe(m.group('new'))
-    delta, flag = _delta_flag(old,new)
-    meta = {"cat":"DEVICE_DATE","kind":"CHANGED","field":"INITIAL","device_id":int(m.group('dev')),"old_ts":old,"new_ts":new,"delta_min":delta}
+    return {"cat":"DEVICE_DATE","kind":"CHANGED","field":"INITIAL","device_id":int(m.group('dev')),
+            "old_ts":defer_dt(m.group('old')),"new_ts":defer_dt(m.group('new')),"delta_min":None}
+
+def dev_date_finalize(meta: Dict[str, Any]) -> None:
+    meta["delta_min"], flag = _delta_flag(meta.get("old_ts"), meta.get("new_ts"))
     if flag: meta["_flags"]=flag
-    return meta
 
-RULE_DEV_DATE = Rule("Device Date Changed (HIS)", 20, DEV_DATE_DETECT, DEV_DATE_EXTRACT, dev_date_handler)
+RULE_DEV_DATE = Rule("Device Date Changed (HIS)", 20, DEV_DATE_DETECT, DEV_DATE_EXTRACT, dev_date_handler,
+                     finalize=dev_date_finalize)
 
 
 ## 6 History Incident routing (Routine/Non-routine/Combined)  (history routing NEW changed / moved to / combined)
@@ -521,11 +512,20 @@ def call_clue_handler(m: re.Match)->Dict[str,Any]:
 
 RULE_CALL_CLUE = Rule("Call Clue Code Changed (HIS)", 21, CALL_CLUE_DETECT, CALL_CLUE_EXTRACT, call_clue_handler)
 
+# Every HIS rule above, for apply_rules(text, his_rules) / rules_taxonomy(his_rules, "his", ...)
+his_rules = [
+    RULE_LOC_CAUSE_OCCUR, RULE_LOC_CREATE_DT, RULE_INC_CAUSE, RULE_ROUTING, RULE_COMBINED,
+    RULE_LOC_DATE, RULE_LOC_CODE, RULE_DEV_FLAG, RULE_DEV_DS, RULE_DEV_DATE, RULE_HIST_ROUTE,
+    RULE_INC_APPLY_ALL, RULE_CALL_CLUE,
+]
+
 
 
 
 
 #### EVENT META UPDATER
+from time import perf_counter
+
 HIS_PREFIX = re.compile(r'(?i)^\s*(his|history)\b')
 
 def tag_with_layer(text: str) -> tuple[str, str | None]:
@@ -533,19 +533,51 @@ def tag_with_layer(text: str) -> tuple[str, str | None]:
         return "HIS", None
     return "LIVE", None
 
-def apply_rules(text: str, rules: list[Rule]) -> dict:
+def apply_rules(text: str, rules: list[Rule], profiler: "RuleProfiler | None" = None) -> dict:
+    # profiler: optional RuleProfiler (regex.py) -> per-rule hits / extract fails / timings
+    # handlers defer datetimes (defer_dt); resolve_dates parses them + runs the finalize hooks
+    return resolve_dates([_apply_his_rules_raw(text, rules, profiler)], rules)[0]
+
+def _apply_his_rules_raw(text: str, rules: list[Rule], profiler: "RuleProfiler | None" = None) -> dict:
     s = (text or "").strip()
     layer, _ = tag_with_layer(s)          # <-- NEW
+    if profiler is not None:
+        profiler.lines += 1
     for rule in sorted(rules, key=lambda r: r.priority):
-        if rule.detect.search(s):
+        m = None
+        if profiler is None:
+            plan = rule_plan(rule)        # regex.py: first-char prefilter, fused detect+extract
+            if plan.first is not None and s[:1] not in plan.first:
+                continue
+            if plan.fused is not None:    # extract miss falls through anyway -> one call decides
+                hit = m = plan.fused.search(s)
+                if hit is not None and hit.group(_FUSED_MARK) is None:
+                    continue
+            else:
+                hit = rule.detect.search(s)
+        else:
+            t0 = perf_counter()
+            hit = rule.detect.search(s)
+            profiler.detect(rule, perf_counter() - t0, hit is not None)
+        if hit:
             flags = None
             meta = {}
             if rule.extract:
-                m = rule.extract.search(s)
+                if profiler is not None:
+                    t0 = perf_counter()
+                    m = rule.extract.search(s)
+                    profiler.extract(rule, perf_counter() - t0, m is not None)
+                elif m is None:
+                    m = rule.extract.search(s)
                 if not m:
-                    continue
+                    continue              # HIS layer: extract miss falls through (counted as parse_fail)
                 if rule.handler:
-                    meta = rule.handler(m)
+                    if profiler is None:
+                        meta = rule.handler(m)
+                    else:
+                        t0 = perf_counter()
+                        meta = rule.handler(m)
+                        profiler.handler(rule, perf_counter() - t0)
                     flags = meta.pop("_flags", None)
             meta.setdefault("layer", layer)  # <-- attach once
             return {"Tag": rule.name, "Flags": flags, "event_meta": meta}
@@ -1,5 +1,9 @@
+import json
+from concurrent.futures import ProcessPoolExecutor
 from dataclasses import dataclass
-from typing import Set, Tuple, Dict, List
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Set, Tuple, Dict, List, Optional, Any, Iterable, Iterator
 import pandas as pd, numpy as np, re
 
 # ==============================
@@ -66,6 +70,84 @@ def _first_index_at_or_after(ts: pd.Series, threshold) -> int:
     th = pd.Timestamp(threshold)
     return int(pd.Index(ts.values).searchsorted(th, side="left"))
 
+# ==============================
+# Sessionization (shared by segmentation and enrich)
+# ==============================
+# Gap-based sessions for many groups in one pass: events sorted by (key, label, time) with
+# NaT last; a session starts at each group's first event and wherever the gap to the previous
+# event exceeds `gap` (a NaT gap never splits, so NaT events join the last session).
+# Timestamps are handled as int64 ticks with _NAT as NaT.
+_NAT = np.iinfo(np.int64).min
+_MAXI = np.iinfo(np.int64).max
+
+def _ticks(td: np.timedelta64, unit: str) -> int:
+    return int(td.astype(f"timedelta64[{unit}]").astype(np.int64))
+
+def sessionize(keys, times, gap: pd.Timedelta,
+               labels: Optional[pd.Series] = None, window: Optional[pd.Timedelta] = None) -> pd.DataFrame:
+    """One row per session: key[, label], session (0-based per group), start, end, n_events.
+
+    With window, end_in_window = last event at or before the group's first event + window
+    (NaT when that first event is NaT). Rows with a missing key are dropped, like groupby.
+    """
+    kc, kv = pd.factorize(keys, sort=True)
+    lc, lv = pd.factorize(labels, sort=True) if labels is not None else (np.zeros(len(kc), np.int64), None)
+    ts = np.asarray(pd.to_datetime(times))
+    unit = np.datetime_data(ts.dtype)[0]
+    t = ts.view(np.int64)
+    keep = (kc >= 0) & (lc >= 0)
+    idx = np.flatnonzero(keep)
+    idx = idx[np.lexsort((np.where(t[idx] == _NAT, _MAXI, t[idx]), lc[idx], kc[idx]))]
+    k, l, tt = kc[idx], lc[idx], t[idx]
+    ok = tt != _NAT
+    new_g = np.r_[True, (k[1:] != k[:-1]) | (l[1:] != l[:-1])] if len(idx) else np.zeros(0, bool)
+    brk = np.r_[False, ok[1:] & ok[:-1] & (tt[1:] - tt[:-1] > _ticks(np.timedelta64(gap), unit))] & ~new_g \
+        if len(idx) else np.zeros(0, bool)
+    s_first = np.flatnonzero(new_g | brk)
+    s_last = np.r_[s_first[1:] - 1, len(idx) - 1] if len(s_first) else s_first
+    g_of_s = np.cumsum(new_g)[s_first] - 1                  # group ordinal of each session
+    g_first = np.flatnonzero(new_g)
+    out = {"key": kv.take(k[s_first])}
+    if labels is not None:
+        out["label"] = lv.take(l[s_first])
+    out["session"] = np.arange(len(s_first)) - np.searchsorted(s_first, g_first)[g_of_s]
+    out["start"] = tt[s_first].view(ts.dtype)
+    out["end"] = tt[s_last].view(ts.dtype)
+    out["n_events"] = s_last - s_first + 1
+    if window is not None:
+        t0 = tt[g_first]
+        lim = np.where(t0 != _NAT, t0 + _ticks(np.timedelta64(window), unit), _NAT)[np.cumsum(new_g) - 1]
+        inside = ok & (lim != _NAT) & (tt <= lim)
+        last_in = np.maximum.reduceat(np.where(inside, tt, _NAT), g_first) if len(g_first) else g_first
+        out["end_in_window"] = last_in[g_of_s].view(ts.dtype)
+    return pd.DataFrame(out)
+
+def session_minutes(sessions: pd.DataFrame, mode: str, window: Optional[pd.Timedelta] = None) -> pd.Series:
+    """Duration (minutes) per group of a sessionize table.
+
+    first_session: span of the first session; first_window: first event to end_in_window
+    (needs window); sum_sessions_in_window: spans of the sessions starting within window of
+    the first event. A group with one event is 0.0; spans touching NaT are NaN.
+    """
+    by = [c for c in ("key", "label") if c in sessions.columns]
+    new_g = sessions["session"].to_numpy() == 0
+    gno = np.cumsum(new_g) - 1
+    start = sessions["start"].to_numpy()
+    end = sessions["end"].to_numpy()
+    span = (end - start) / np.timedelta64(1, "m")            # NaT -> NaN
+    first = start[new_g][gno]
+    n = np.bincount(gno, weights=sessions["n_events"].to_numpy())
+    if mode == "first_window":
+        eiw = sessions["end_in_window"].to_numpy()[new_g]
+        val = (eiw - start[new_g]) / np.timedelta64(1, "m")
+    elif mode == "sum_sessions_in_window":
+        inw = ~np.isnat(start) & ~np.isnat(first) & (start <= first + np.timedelta64(window))
+        val = np.bincount(gno, weights=np.where(inw, span, 0.0), minlength=new_g.sum())
+    else:                                                    # "first_session" (and the fallback)
+        val = span[new_g]
+    return pd.Series(np.where(n == 1, 0.0, val), index=pd.MultiIndex.from_frame(sessions.loc[new_g, by])
+                     if len(by) > 1 else pd.Index(sessions.loc[new_g, by[0]]))
+
 def _phase_duration_minutes(ts: pd.Series,
                             phase: pd.Series,
                             start_idx_after_b: int,
@@ -74,53 +156,20 @@ def _phase_duration_minutes(ts: pd.Series,
                             window_days: int,
                             mode: str) -> float:
     """
-    Sessionized duration (minutes) for a phase label after B_end.
-    Splits sessions when gap between consecutive events > session_gap_hours.
-    Modes:
+    Sessionized duration (minutes) for a phase label after B_end (see session_minutes):
       - "first_session": span of the first session only
       - "first_window": span from first event to last event within window_days
       - "sum_sessions_in_window": sum of session spans whose start is within window_days
     Returns np.nan if no events with 'label' occur after B_end.
     """
     post = phase.iloc[start_idx_after_b:]
-    mask = (post == label)
+    mask = (post == label).to_numpy()
     if not mask.any():
         return np.nan
-
-    s = ts.iloc[start_idx_after_b:][mask].sort_values()
-    if len(s) == 1:
-        return 0.0
-
-    gap = pd.Timedelta(hours=session_gap_hours)
-    diffs = s.diff()
-    sess_id = (diffs > gap).cumsum()
-
-    first_t = s.iloc[0]
-    win_end = first_t + pd.Timedelta(days=window_days)
-
-    if mode == "first_session":
-        sid0 = sess_id.iloc[0]
-        block = s[sess_id == sid0]
-        return float((block.iloc[-1] - block.iloc[0]) / pd.Timedelta(minutes=1))
-
-    if mode == "first_window":
-        block = s[s <= win_end]
-        if block.empty:
-            block = s.iloc[[0]]
-        return float((block.iloc[-1] - block.iloc[0]) / pd.Timedelta(minutes=1))
-
-    if mode == "sum_sessions_in_window":
-        total = 0.0
-        for sid in sess_id.unique():
-            block = s[sess_id == sid]
-            if block.iloc[0] <= win_end:
-                total += float((block.iloc[-1] - block.iloc[0]) / pd.Timedelta(minutes=1))
-        return total
-
-    # fallback
-    sid0 = sess_id.iloc[0]
-    block = s[sess_id == sid0]
-    return float((block.iloc[-1] - block.iloc[0]) / pd.Timedelta(minutes=1))
+    s = ts.iloc[start_idx_after_b:][mask]
+    window = pd.Timedelta(days=window_days)
+    sess = sessionize(pd.Series(0, index=s.index), s, pd.Timedelta(hours=session_gap_hours), window=window)
+    return float(session_minutes(sess, mode, window).iloc[0])
 
 # ==============================
 # Core: per-incident segmentation
@@ -328,3 +377,377 @@ def _segment_single_incident(g: pd.DataFrame, cfg: PhaseConfig) -> Tuple[pd.Data
         n_c2=int((g["_phase"]=="C2_RA_QC").sum()),
     )
     return g, summary
+
+# ==============================
+# Vectorized engine (all incidents in one pass)
+# ==============================
+# Same rules as _segment_single_incident, on one frame sorted by (incident, time, insert):
+# CSR offsets per incident, and every per-row while loop becomes a "last/next row where X"
+# scan (running max / reversed running min) read back at the group's anchor row.
+# Timestamps are int64 ticks with _NAT as NaT; missing users count as "".
+PHASES = np.array(["A_LiveDispatch", "B_DOC_QC", "C1_DOC_POSTHIST", "C2_RA_QC"], dtype=object)
+
+def _group_offsets(keys: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """CSR offsets of the runs of equal keys in a sorted array: starts, ends (exclusive)."""
+    brk = np.flatnonzero(keys[1:] != keys[:-1]) + 1
+    return np.r_[0, brk], np.r_[brk, len(keys)]
+
+def _last_true(mask: np.ndarray) -> np.ndarray:
+    """Per row: last position <= row where mask, else -1 (callers check it is in the group)."""
+    return np.maximum.accumulate(np.where(mask, np.arange(len(mask)), -1))
+
+def _next_true(mask: np.ndarray) -> np.ndarray:
+    """Per row: first position >= row where mask, else len(mask)."""
+    n = len(mask)
+    return np.minimum.accumulate(np.where(mask, np.arange(n), n)[::-1])[::-1]
+
+def _label_durations(ts: np.ndarray, gid: np.ndarray, mask: np.ndarray, n_groups: int,
+                     gap_hours: int, window_days: int, mode: str) -> np.ndarray:
+    """_phase_duration_minutes for every incident at once (rows of one label)."""
+    window = pd.Timedelta(days=window_days)
+    sess = sessionize(gid[mask], ts[mask], pd.Timedelta(hours=gap_hours), window=window)
+    return session_minutes(sess, mode, window).reindex(range(n_groups)).to_numpy(dtype=float)
+
+def _maybe_int(values: np.ndarray, present: np.ndarray) -> np.ndarray:
+    """Like pd.DataFrame(rows) on int-or-None: int64 when all present, float64 with NaN otherwise."""
+    return values.astype(np.int64) if present.all() else np.where(present, values, np.nan)
+
+def _segment_vectorized(wk: pd.DataFrame, cfg: PhaseConfig) -> Tuple[pd.DataFrame, pd.DataFrame]:
+    """wk: flagged, sorted by (incident, time, insert), no missing incident ids, RangeIndex."""
+    n = len(wk)
+    starts, ends = _group_offsets(wk[cfg.incident_col].to_numpy())
+    G = len(starts)
+    gid = np.repeat(np.arange(G), ends - starts)
+    pos = np.arange(n)
+    ts = wk[cfg.time_col].to_numpy()
+    unit = np.datetime_data(ts.dtype)[0]
+    t = ts.view(np.int64)
+    ok = t != _NAT
+    per_min = _ticks(np.timedelta64(1, "m"), unit)
+
+    codes, uniq = pd.factorize(wk[cfg.user_col].fillna("").astype(str).str.upper())
+    uniq = pd.Index(uniq)
+    is_mgr = (uniq == cfg._mgr_upper)[codes]
+    is_ign = uniq.isin(cfg._ign_upper)[codes]
+    is_ra = uniq.isin(cfg._ra_upper)[codes]
+    blank = (uniq == "")[codes]
+    done = wk["_is_completed"].to_numpy(bool)
+
+    # --- last contiguous HISMGR block: [F, L] ---
+    run_start = is_mgr & ~np.r_[False, is_mgr[:-1] & (gid[1:] == gid[:-1])]
+    L = np.maximum.reduceat(np.where(is_mgr, pos, -1), starts)
+    F = np.maximum.reduceat(np.where(run_start, pos, -1), starts)
+    has = L >= 0
+    Fc, Lc = np.where(has, F, starts), np.where(has, L, starts)
+    t_af = np.where(has, t[Fc], _NAT)
+    t_al = np.where(has, t[Lc], _NAT)
+
+    # --- Completed anchor: last Completed <= t_archive_first, else earliest Completed ---
+    af_row = t_af[gid]
+    le = done & ok & (af_row != _NAT) & (t <= af_row)
+    tc_le = np.maximum.reduceat(np.where(le, t, _NAT), starts)
+    tc_min = np.minimum.reduceat(np.where(done & ok, t, _MAXI), starts)
+    tc = np.where(tc_le != _NAT, tc_le, np.where(tc_min != _MAXI, tc_min, _NAT))
+    tc = np.where(has, tc, _NAT)
+    ate = np.where(tc != _NAT, tc + _ticks(np.timedelta64(cfg.a_tail_minutes, "m"), unit), _NAT)
+
+    # --- DOC reviewer: last real user before F ---
+    lastc = _last_true(~blank & ~is_mgr & ~is_ign)
+    k = np.where(has & (Fc > starts), lastc[np.maximum(Fc - 1, 0)], -1)
+    hb = k >= starts
+    kc = np.where(hb, k, starts)
+    bu = np.where(hb, codes[kc], -1)
+
+    # --- walk back over the reviewer's run (ignorables allowed) down to the time bound ---
+    lb = np.where(t_af != _NAT, t_af - _ticks(np.timedelta64(cfg.b_lookback_hours, "h"), unit), _NAT)
+    lb = np.where((lb != _NAT) & (ate != _NAT), np.maximum(lb, ate), lb)
+    if cfg.enforce_same_day_for_b:
+        midnight = np.where(t_af != _NAT, t_af.view(ts.dtype).astype("datetime64[D]").astype(ts.dtype).view(np.int64), _NAT)
+        lb = np.where(lb != _NAT, np.maximum(lb, midnight), lb)
+    lb_row = lb[gid]
+    walk_ok = ((codes == bu[gid]) | is_ign) & ~(ok & (lb_row != _NAT) & (t < lb_row))
+    lastbad = _last_true(~walk_ok)
+    i = np.where(kc > starts, np.maximum(lastbad[np.maximum(kc - 1, 0)] + 1, starts), kc)
+    brs = _next_true(~is_ign)[i]                           # skip leading ignorables
+
+    # --- B start: first row at/after max(candidate, A-tail), never after F ---
+    tb = np.where(hb, t[np.where(hb, brs, starts)], t_af)
+    tb = np.where((tb != _NAT) & (ate != _NAT), np.maximum(tb, ate), tb)
+    tb_row = tb[gid]
+    cnt = np.add.reduceat(ok & (tb_row != _NAT) & (t < tb_row), starts)
+    bs = np.minimum(starts + cnt, Fc)
+
+    # --- B end: after the block, extended while the reviewer edits within the grace ---
+    blank_code = uniq.get_loc("") if "" in uniq else -2
+    b_code = np.where(hb, bu, blank_code)
+    al_row = t_al[gid]
+    ext = (codes == b_code[gid]) & ok & (al_row != _NAT) & \
+          (t <= al_row + _ticks(np.timedelta64(cfg.post_archive_grace_min, "m"), unit))
+    after = Lc + 1
+    be = np.where(after < ends, np.minimum(_next_true(~ext)[np.minimum(after, n - 1)], ends), ends)
+
+    # --- labels ---
+    has_row = has[gid]
+    lab = np.zeros(n, dtype=np.int8)
+    in_b = has_row & (pos >= bs[gid]) & (pos < be[gid])
+    post = has_row & (pos >= be[gid])
+    lab[in_b] = 1
+    lab[post] = np.where(is_ra[post], 3, 2)
+    events = wk.assign(_phase=PHASES[lab])
+
+    # --- summary ---
+    counts = np.bincount(gid * 4 + lab, minlength=4 * G).reshape(G, 4)
+    t_bs = np.where(has, t[np.where(has, bs, starts)], _NAT)
+    t_be = np.where(has, t[np.where(has, be - 1, starts)], _NAT)
+    c1_first = np.minimum.reduceat(np.where(lab == 2, pos, n), starts)
+    c2_first = np.minimum.reduceat(np.where(lab == 3, pos, n), starts)
+    t_c1 = np.where(c1_first < n, t[np.minimum(c1_first, n - 1)], _NAT)
+    t_c2 = np.where(c2_first < n, t[np.minimum(c2_first, n - 1)], _NAT)
+    dt = lambda v: v.view(ts.dtype)
+
+    summary = pd.DataFrame(dict(
+        incident_id=wk[cfg.incident_col].to_numpy()[starts],
+        has_archival_block=has,
+        doc_reviewer=np.where(hb, wk[cfg.user_col].astype(str).to_numpy()[kc], None),
+        b_start_idx=_maybe_int(bs - starts, has), b_end_idx=_maybe_int(be - starts, has),
+        t_completed=dt(tc), a_tail_end=dt(ate),
+        t_archive_first=dt(t_af), t_archive_last=dt(t_al),
+        t_b_start=dt(t_bs), t_b_end=dt(t_be),
+        t_c1_start=dt(t_c1), t_c2_start=dt(t_c2),
+        dur_doc_qc_min=np.where((t_bs != _NAT) & (t_be != _NAT), (t_be - t_bs) / per_min, np.nan),
+        dur_c1_min=_label_durations(ts, gid, lab == 2, G, cfg.c1_session_gap_hours,
+                                    cfg.c1_window_days, cfg.c1_duration_mode),
+        dur_c2_min=_label_durations(ts, gid, lab == 3, G, cfg.c2_session_gap_hours,
+                                    cfg.c2_window_days, cfg.c2_duration_mode),
+        n_events_total=ends - starts,
+        n_live=counts[:, 0], n_doc_qc=counts[:, 1], n_c1=counts[:, 2], n_c2=counts[:, 3],
+    ))
+    return events, summary
+
+# ==============================
+# Sharded segmentation (process pool)
+# ==============================
+# Incidents are hash-partitioned on INCIDENT_ID (every event of an incident lands in one
+# shard), each shard is segmented in a worker with the same PhaseConfig, and the results are
+# put back in incident order -- the output equals the single-process run. Shards are pickled
+# to the workers; fine with 'fork' on Linux, with 'spawn' this module must be importable.
+def _id_text(incidents: pd.Series) -> pd.Series:
+    """Incident ids as canonical text: 123, 123.0 and "123" all -> "123" (NA -> "")."""
+    incidents = pd.Series(incidents).reset_index(drop=True)
+    if pd.api.types.is_integer_dtype(incidents.dtype):
+        return incidents.astype(str).where(incidents.notna(), "")
+    num = pd.to_numeric(incidents, errors="coerce")
+    whole = (num.notna() & (num % 1 == 0)).to_numpy()
+    out = incidents.astype(str).str.strip()
+    out[whole] = num[whole].astype("int64").astype(str)
+    return out.where(incidents.notna(), "")
+
+def shard_ids(incidents: pd.Series, n_shards: int) -> np.ndarray:
+    """Stable shard number per row (same id -> same shard, in every process, whatever the
+    id column's dtype -- int64, float64 after a NaN, or str from a CSV)."""
+    h = pd.util.hash_pandas_object(_id_text(incidents), index=False).to_numpy()
+    return (h % np.uint64(n_shards)).astype(np.int64)
+
+def _segment_shard(args) -> Tuple[pd.DataFrame, pd.DataFrame]:
+    shard, cfg, engine = args
+    return segment_phases(shard, cfg, engine=engine)
+
+def _segment_sharded(events: pd.DataFrame, cfg: PhaseConfig, engine: str, workers: int):
+    sid = shard_ids(events[cfg.incident_col], workers)
+    shards = [events[sid == i] for i in range(workers)]
+    with ProcessPoolExecutor(max_workers=workers) as ex:
+        parts = list(ex.map(_segment_shard, [(sh, cfg, engine) for sh in shards if len(sh)]))
+    labeled = pd.concat([p[0] for p in parts], ignore_index=True)
+    summary = pd.concat([p[1] for p in parts if len(p[1])], ignore_index=True)
+    labeled = labeled.sort_values(cfg.incident_col, kind="stable").reset_index(drop=True)
+    if len(summary):
+        summary = summary.sort_values("incident_id", kind="stable").reset_index(drop=True)
+    return labeled, summary
+
+# ==============================
+# Driver
+# ==============================
+def segment_phases(events: pd.DataFrame, cfg: PhaseConfig, engine: str = "vectorized", workers: int = 1):
+    """Labeled events (+ _phase) and one summary row per incident.
+
+    engine="loop" runs _segment_single_incident per incident (the reference);
+    "vectorized" computes the same labels and summary for all incidents at once.
+    workers > 1 segments hash shards of incidents on a process pool (same output).
+    """
+    if workers > 1:
+        return _segment_sharded(events, cfg, engine, workers)
+    needed = [cfg.incident_col, cfg.time_col, cfg.insert_col, cfg.desc_col, cfg.user_col]
+    miss = [c for c in needed if c not in events.columns]
+    if miss: raise KeyError(f"Missing required columns: {miss}")
+
+    wk = _ensure_dt(events, [cfg.time_col, cfg.insert_col])
+    wk = wk.sort_values([cfg.incident_col, cfg.time_col, cfg.insert_col], kind="stable")
+    wk = _flag(wk, cfg)
+
+    if engine == "loop":
+        parts, rows = [], []
+        for _, gi in wk.groupby(cfg.incident_col, sort=False):
+            gx, sx = _segment_single_incident(gi, cfg)
+            parts.append(gx); rows.append(sx)
+        return pd.concat(parts, ignore_index=True), pd.DataFrame(rows)
+    if engine != "vectorized":
+        raise ValueError(f"engine must be 'vectorized' or 'loop', got {engine!r}")
+    wk = wk[wk[cfg.incident_col].notna()].reset_index(drop=True)   # groupby drops them too
+    if wk.empty:
+        return wk.assign(_phase=pd.Series(dtype=object)), pd.DataFrame()
+    return _segment_vectorized(wk, cfg)
+
+# ==============================
+# Incremental re-segmentation (persisted store)
+# ==============================
+# <store>/events/events-NNN.parquet and <store>/summary/summary-NNN.parquet hold the labeled
+# events and summary rows of hash bucket NNN (shard_ids on INCIDENT_ID); _watermark.json holds
+# the highest INSERTED_DATE segmented. A nightly run takes rows at/after the watermark, reads
+# the stored events of just the incidents they touch, re-segments those incidents in full and
+# rewrites only their buckets -- cost follows churn, not history. Rows at the watermark are
+# taken again and de-duplicated on key_col; the watermark moves only after the files are in.
+# Incident ids are stored as one dtype ("int64" if the first run's ids are all whole numbers,
+# else "str"), recorded in _watermark.json; later pulls are converted to it, so a float64 or
+# CSV-string id column still finds (and replaces) the stored rows of the same incident.
+SEG_WATERMARK_FILE = "_watermark.json"
+_DERIVED = ["_is_completed", "_phase"]
+
+def read_segment_watermark(store_dir: str) -> Optional[Dict[str, Any]]:
+    """{"inserted_date", "n_buckets", "id_dtype", "last_run", "updated_utc"} or None for a new store."""
+    path = Path(store_dir) / SEG_WATERMARK_FILE
+    return json.loads(path.read_text()) if path.exists() else None
+
+def _id_dtype(ids: pd.Series) -> str:
+    if pd.api.types.is_integer_dtype(ids.dtype):
+        return "int64"
+    num = pd.to_numeric(ids, errors="coerce")
+    return "int64" if (num.notna() & (num % 1 == 0)).all() else "str"
+
+def _as_id_dtype(ids: pd.Series, dtype: str) -> pd.Series:
+    """Non-null ids converted to the store's id dtype ("int64" or "str")."""
+    if dtype == "str":
+        return pd.Series(_id_text(ids).to_numpy(), index=ids.index, name=ids.name)
+    num = pd.to_numeric(ids, errors="coerce")
+    bad = (num.isna() | (num % 1 != 0)).to_numpy()
+    if bad.any():
+        raise ValueError(f"store has int64 incident ids; got {list(pd.unique(ids[bad]))[:5]}")
+    return num.astype("int64")
+
+def _bucket_path(store_dir: str, kind: str, b: int) -> Path:
+    return Path(store_dir) / kind / f"{kind}-{b:03d}.parquet"
+
+def _read_bucket(store_dir: str, kind: str, b: int) -> Optional[pd.DataFrame]:
+    path = _bucket_path(store_dir, kind, b)
+    return pd.read_parquet(path) if path.exists() else None
+
+def _write_bucket(store_dir: str, kind: str, b: int, df: pd.DataFrame) -> None:
+    path = _bucket_path(store_dir, kind, b)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp = path.with_suffix(".tmp")
+    df.to_parquet(tmp, index=False)
+    tmp.replace(path)
+
+def read_segment_store(store_dir: str) -> Tuple[pd.DataFrame, pd.DataFrame]:
+    """All labeled events and summary rows of a store (incident order within each bucket)."""
+    out = []
+    for kind in ("events", "summary"):
+        files = sorted((Path(store_dir) / kind).glob(f"{kind}-*.parquet"))
+        out.append(pd.concat([pd.read_parquet(f) for f in files], ignore_index=True) if files else pd.DataFrame())
+    return out[0], out[1]
+
+def segment_phases_incremental(events: pd.DataFrame, store_dir: str, cfg: PhaseConfig,
+                               engine: str = "vectorized", workers: int = 1, n_buckets: int = 64,
+                               key_col: Optional[str] = "FOLLOWUP_ID") -> pd.DataFrame:
+    """Re-segment the incidents that got rows since the watermark and upsert them into the store.
+
+    events may be the whole pull or just the recent rows; only rows with insert_col at/after
+    the watermark are used (all rows on the first run). Returns the touched incidents'
+    summary rows (empty if nothing new).
+    """
+    wm = read_segment_watermark(store_dir)
+    if wm is not None and wm["n_buckets"] != n_buckets:
+        print(f"[warn] store has {wm['n_buckets']} buckets; using that instead of {n_buckets}")
+        n_buckets = wm["n_buckets"]
+    ins = pd.to_datetime(events[cfg.insert_col], errors="coerce")
+    if wm is not None:
+        mark = pd.Timestamp(wm["inserted_date"])
+        new = events[(ins >= mark) if key_col in events.columns else (ins > mark)]
+    else:
+        new = events
+    new = new[new[cfg.incident_col].notna()]
+    if new.empty:
+        print(f"[info] nothing inserted since {wm['inserted_date'] if wm else None}")
+        return pd.DataFrame()
+    id_dtype = (wm or {}).get("id_dtype") or _id_dtype(new[cfg.incident_col])
+    new = new.assign(**{cfg.incident_col: _as_id_dtype(new[cfg.incident_col], id_dtype)})
+
+    touched = pd.Index(new[cfg.incident_col].unique())
+    buckets = np.unique(shard_ids(pd.Series(touched), n_buckets))
+    stored_ev, hist = {}, []
+    for b in buckets:
+        ev = _read_bucket(store_dir, "events", b)
+        if ev is not None:
+            ev = ev.assign(**{cfg.incident_col: _as_id_dtype(ev[cfg.incident_col], id_dtype)})
+            hit = ev[cfg.incident_col].isin(touched).to_numpy()
+            stored_ev[b] = ev[~hit]
+            hist.append(ev[hit].drop(columns=_DERIVED, errors="ignore"))
+    seg_in = pd.concat(hist + [new], ignore_index=True)
+    if key_col in seg_in.columns:
+        seg_in = seg_in.drop_duplicates(key_col, keep="last")
+    labeled, summary = segment_phases(seg_in, cfg, engine=engine, workers=workers)
+
+    ev_bucket = shard_ids(labeled[cfg.incident_col], n_buckets)
+    sum_bucket = shard_ids(summary["incident_id"], n_buckets)
+    for b in buckets:
+        ev = pd.concat([stored_ev.get(b, labeled.iloc[0:0]), labeled[ev_bucket == b]], ignore_index=True)
+        _write_bucket(store_dir, "events", b, ev.sort_values(cfg.incident_col, kind="stable"))
+        old = _read_bucket(store_dir, "summary", b)
+        sm = summary[sum_bucket == b]
+        if old is not None:
+            old = old.assign(incident_id=_as_id_dtype(old["incident_id"], id_dtype))
+            sm = pd.concat([old[~old["incident_id"].isin(touched)], sm], ignore_index=True)
+        _write_bucket(store_dir, "summary", b, sm.sort_values("incident_id", kind="stable"))
+
+    hi = ins[new.index].max()
+    if wm is not None and (pd.isna(hi) or hi < pd.Timestamp(wm["inserted_date"])):
+        hi = pd.Timestamp(wm["inserted_date"])
+    Path(store_dir).mkdir(parents=True, exist_ok=True)
+    path = Path(store_dir) / SEG_WATERMARK_FILE
+    tmp = path.with_suffix(".tmp")
+    tmp.write_text(json.dumps({
+        "inserted_date": None if pd.isna(hi) else pd.Timestamp(hi).isoformat(),
+        "n_buckets": n_buckets,
+        "id_dtype": id_dtype,
+        "last_run": {"rows": int(len(new)), "incidents": int(len(touched)), "buckets": int(len(buckets))},
+        "updated_utc": datetime.now(timezone.utc).isoformat(),
+    }, indent=2))
+    tmp.replace(path)
+    print(f"[info] re-segmented {len(touched):,} incidents ({len(new):,} new rows) in {len(buckets)} buckets")
+    return summary
+
+# ==============================
+# Streaming segmentation (incident-ordered chunks)
+# ==============================
+# Chunks arrive ordered by INCIDENT_ID (then time / insert, e.g. fetch_single_incident_followups
+# with order_by). Every incident but the last one in a chunk is complete and is segmented
+# right away; the last one is held back and joined with the next chunk. Memory is one chunk
+# plus the open incident, whatever the length of the history.
+def segment_phases_stream(chunks: Iterable[pd.DataFrame], cfg: PhaseConfig,
+                          engine: str = "vectorized") -> Iterator[Tuple[pd.DataFrame, pd.DataFrame]]:
+    """Yield (labeled events, summary) for the incidents completed by each chunk."""
+    carry: Optional[pd.DataFrame] = None
+    for chunk in chunks:
+        chunk = chunk[chunk[cfg.incident_col].notna()]
+        if chunk.empty:
+            continue
+        inc = chunk[cfg.incident_col]
+        if not inc.is_monotonic_increasing or (carry is not None and inc.iloc[0] < carry[cfg.incident_col].iloc[0]):
+            raise ValueError(f"chunks must be ordered by {cfg.incident_col} (ORDER BY it in the query)")
+        buf = chunk if carry is None else pd.concat([carry, chunk], ignore_index=True)
+        last = buf[cfg.incident_col].iloc[-1]
+        open_ = (buf[cfg.incident_col] == last).to_numpy()
+        carry = buf[open_]
+        if not open_.all():
+            yield segment_phases(buf[~open_], cfg, engine=engine)
+    if carry is not None:
+        yield segment_phases(carry, cfg, engine=engine)